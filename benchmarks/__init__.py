@@ -0,0 +1,13 @@
+'''Benchmark suite
+
+Benchmarks follow the asv layout: `bench_*` modules with `Time*` classes
+that define `params`, `param_names`, `setup` and `time_*` methods. They use
+the synthetic ephemerides of `benchmarks.synthetic` and run offline. Run
+them from the repository root with
+
+    python -m benchmarks.run [--filter REGEX] [--quick]
+
+which appends the results, tagged with the git commit, to
+`benchmarks/history.jsonl` and compares them with the previous commit.
+
+'''
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""Ejection model and population benchmarks"""
+
+import numpy as np
+
+from dasst.ejection_models.comets import sublimation
+from dasst.populations import PopulationConfig, realise_population
+from dasst.constants import AU
+
+
+class TimeIceTemperature:
+    """`solve_ice_temperature_rodionov_2002` for N solar zenith angles, parameters of 55P"""
+
+    params = ([100, 1000],)
+    param_names = ["N"]
+
+    def setup(self, N):
+        self.cosz = np.cos(np.radians(np.linspace(0, 89, N)))
+
+    def time_solve_ice_temperature(self, N):
+        for cosz in self.cosz:
+            sublimation.solve_ice_temperature_rodionov_2002(
+                0.04, cosz, 2.0, 0.24, 1.0, 4 / 3, 18 * 1.66053906660e-27
+            )
+
+
+class TimeRealisePopulation:
+    """`realise_population` of a normal distribution of N particles"""
+
+    params = ([10_000, 1_000_000],)
+    param_names = ["N"]
+
+    def setup(self, N):
+        mu = np.array([AU, 0, 0, 0, 3.4e4, 0])
+        cov = np.diag([1.5e9, 1.5e9, 1.5e9, 100.0, 100.0, 100.0]) ** 2
+        self.config = PopulationConfig(
+            name="bench",
+            frame="HCRS",
+            mode="batch",
+            source="distribution",
+            dist_type="normal",
+            n_particles=N,
+            mu=mu,
+            cov=cov,
+        )
+
+    def time_realise_population(self, N):
+        realise_population(self.config, np.random.default_rng(0))
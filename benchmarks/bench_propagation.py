@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""Propagation, frame conversion and orbit determination benchmarks"""
+
+import numpy as np
+from astropy.time import TimeDelta
+
+from dasst.propagators import Rebound
+from dasst.orbit_determination.methods import rebound_od
+from dasst.constants import DAY
+
+from .synthetic import EPOCH, massive_settings, massive_states, heliocentric_states, meteor_states
+
+
+class TimePropagate:
+    """`Rebound.propagate` of N particles to T output times over 30 days"""
+
+    params = ([10, 100, 1000], [10, 100])
+    param_names = ["N", "T"]
+
+    def setup(self, N, T):
+        self.states = heliocentric_states(N)
+        self.massive = massive_states()
+        self.t = TimeDelta(np.linspace(0, 30 * DAY, T), format="sec")
+
+    def time_propagate(self, N, T):
+        reb = Rebound(kernel=".", settings=massive_settings())
+        reb.propagate(self.t, self.states, EPOCH, massive_states=self.massive)
+
+
+class TimeFrameConversion:
+    """Per-particle conversion of (6, T, N) HCRS output states to GCRS"""
+
+    params = ([10, 100], [10, 100])
+    param_names = ["N", "T"]
+
+    def setup(self, N, T):
+        self.reb = Rebound(kernel=".", settings=massive_settings(out_frame="GCRS"))
+        t = TimeDelta(np.linspace(0, 30 * DAY, T), format="sec")
+        self.times = EPOCH + t
+        self.states = np.repeat(heliocentric_states(N)[:, None, :], T, axis=1)
+
+    def time_convert_output(self, N, T):
+        self.reb._convert_output_states(self.times, self.states.copy(), "HCRS")
+
+
+class TimeReboundOD:
+    """`rebound_od` of N meteors observed 100 km above the Earth"""
+
+    params = ([1, 10, 50],)
+    param_names = ["N"]
+
+    def setup(self, N):
+        self.states = meteor_states(N)
+        self.massive = massive_states()
+
+    def time_rebound_od(self, N):
+        rebound_od(
+            self.states.copy(),
+            EPOCH,
+            kernel=".",
+            dt=60.0,
+            max_t=2 * DAY,
+            settings=massive_settings(),
+            progress_bar=False,
+            massive_states=self.massive,
+        )
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+"""Pairwise D-criterion benchmarks"""
+
+from dasst.similarity.pairwise import pairwise_threshold, pairwise_nearest
+from dasst.similarity.d_criteria import orbit_invariants
+from dasst.similarity.trajectories import MU_SUN_AU
+from dasst.constants import AU
+
+from .synthetic import orbital_elements, heliocentric_states
+
+
+class TimePairwise:
+    """All pairs below a cutoff and nearest neighbours of N x N orbits, single worker"""
+
+    params = (["D_SH", "D_V"], [1000, 5000])
+    param_names = ["criterion", "N"]
+
+    def setup(self, criterion, N):
+        if criterion == "D_SH":
+            self.orbits = orbital_elements(N)
+        else:
+            self.orbits = orbit_invariants(heliocentric_states(N) / AU, MU_SUN_AU)
+
+    def time_threshold(self, criterion, N):
+        pairwise_threshold(self.orbits, self.orbits, 0.1, criterion=criterion, workers=1)
+
+    def time_nearest(self, criterion, N):
+        pairwise_nearest(self.orbits, self.orbits, k=5, criterion=criterion, workers=1)
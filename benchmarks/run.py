@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+"""
+Benchmark runner
+================
+
+Runs the asv style benchmarks of this package without needing asv, records
+the results in a JSON lines history file and compares them with the most
+recent results of a different commit. The exit status is 1 if any benchmark
+is slower than --threshold times its previous result, e.g.
+
+    python -m benchmarks.run --filter Propagate
+    python -m benchmarks.run --quick --no-history
+
+"""
+
+import re
+import sys
+import json
+import time
+import socket
+import inspect
+import argparse
+import datetime
+import itertools
+import importlib
+import pkgutil
+import platform
+import subprocess
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+import dasst
+
+ROOT = Path(__file__).resolve().parent
+HISTORY = ROOT / "history.jsonl"
+"""Default history file"""
+
+
+def git_commit():
+    """Commit hash of the working tree and if it has uncommitted changes"""
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        commit = git("rev-parse", "HEAD")
+        dirty = bool(git("status", "--porcelain", "--untracked-files=no"))
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def environment():
+    """Fields identifying the machine and software of a run"""
+    import rebound
+
+    commit, dirty = git_commit()
+    return dict(
+        commit=commit,
+        dirty=dirty,
+        timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        host=socket.gethostname(),
+        machine=platform.machine(),
+        python=platform.python_version(),
+        version=dasst.__version__,
+        numpy=np.__version__,
+        rebound=rebound.__version__,
+    )
+
+
+def discover():
+    """(module name, class) of all benchmark classes"""
+    for info in pkgutil.iter_modules([str(ROOT)]):
+        if not info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"{__package__}.{info.name}")
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if name.startswith("Time") and cls.__module__ == module.__name__:
+                yield info.name, cls
+
+
+def parameter_sets(cls, quick=False):
+    """Keyword dictionaries of all parameter combinations of a benchmark class"""
+    params = getattr(cls, "params", ())
+    if params and not isinstance(params[0], (list, tuple)):
+        params = (params,)
+    names = getattr(cls, "param_names", [f"param{i}" for i in range(len(params))])
+    if quick:
+        params = [values[:1] for values in params]
+    for values in itertools.product(*params):
+        yield dict(zip(names, values))
+
+
+def benchmarks(pattern=None, quick=False):
+    """(name, class, method name, params) of all selected benchmarks"""
+    for module, cls in discover():
+        methods = [name for name, _ in inspect.getmembers(cls) if name.startswith("time_")]
+        for params in parameter_sets(cls, quick):
+            for method in methods:
+                args = ", ".join(f"{key}={value}" for key, value in params.items())
+                name = f"{module}.{cls.__name__}.{method}({args})"
+                if pattern is None or re.search(pattern, name):
+                    yield name, cls, method, params
+
+
+def run_benchmark(cls, method, params, repeat, max_time):
+    """Wall times [s] of up to `repeat` runs, stopping once `max_time` is spent"""
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - start < max_time):
+        bench = cls()
+        args = list(params.values())
+        if hasattr(bench, "setup"):
+            bench.setup(*args)
+        t0 = time.perf_counter()
+        getattr(bench, method)(*args)
+        times.append(time.perf_counter() - t0)
+        if hasattr(bench, "teardown"):
+            bench.teardown(*args)
+    return times
+
+
+def read_history(path):
+    if not Path(path).exists():
+        return []
+    with open(path, "r") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def previous_results(history, commit):
+    """Latest result per benchmark name of the most recent other commit"""
+    other = [entry for entry in history if entry["commit"] != commit]
+    if not other:
+        return {}
+    last = other[-1]["commit"]
+    return {entry["name"]: entry for entry in other if entry["commit"] == last}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--filter", default=None, help="Only run benchmarks matching this regex")
+    parser.add_argument(
+        "--quick", action="store_true", help="First parameter values only, one run each"
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Maximum runs per benchmark")
+    parser.add_argument(
+        "--max-time", type=float, default=10.0, help="Time budget [s] per benchmark"
+    )
+    parser.add_argument("--history", default=str(HISTORY), help="JSON lines history file")
+    parser.add_argument("--no-history", action="store_true", help="Do not record the results")
+    parser.add_argument(
+        "--threshold", type=float, default=1.2,
+        help="Slowdown ratio reported as regression, which makes the exit status 1",
+    )
+    parser.add_argument("--list", action="store_true", help="List the selected benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    selected = list(benchmarks(args.filter, args.quick))
+    if args.list:
+        print("\n".join(name for name, *_ in selected))
+        return 0
+
+    env = environment()
+    previous = previous_results(read_history(args.history), env["commit"])
+    repeat = 1 if args.quick else args.repeat
+
+    results, regressions = [], []
+    for name, cls, method, params in selected:
+        times = run_benchmark(cls, method, params, repeat, args.max_time)
+        result = dict(
+            env,
+            name=name,
+            params=params,
+            min=min(times),
+            median=statistics.median(times),
+            mean=statistics.fmean(times),
+            repeats=len(times),
+        )
+        results.append(result)
+
+        line = f"{name:<80} {result['median']:>10.4g} s"
+        if name in previous:
+            ratio = result["median"] / previous[name]["median"]
+            line += f" {ratio:>6.2f}x"
+            if ratio > args.threshold:
+                line += " REGRESSION"
+                regressions.append(name)
+        print(line, flush=True)
+
+    if not args.no_history:
+        with open(args.history, "a") as fh:
+            for result in results:
+                fh.write(json.dumps(result) + "\n")
+
+    if regressions:
+        print(f"{len(regressions)} benchmarks slower than {args.threshold}x the previous commit")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""
+Synthetic ephemerides and inputs
+================================
+
+Deterministic stand-ins for the JPL kernel so the benchmarks run offline:
+the planets of `Rebound.DEFAULT_MASSIVE` on circular, coplanar orbits with
+their real semi-major axes and the Moon on a circular orbit around the
+Earth. The states are passed to the propagators as `massive_states`.
+"""
+
+import numpy as np
+from astropy.time import Time
+
+from dasst.propagators import Rebound
+from dasst.constants import AU
+
+EPOCH = Time("2020-01-01T00:00:00", format="isot", scale="utc")
+"""Epoch of all benchmarks, inside the bundled IERS tables"""
+
+SEMI_MAJOR_AXES = dict(
+    Mercury=0.387,
+    Venus=0.723,
+    Earth=1.0,
+    Mars=1.524,
+    Jupiter=5.203,
+    Saturn=9.537,
+    Uranus=19.19,
+    Neptune=30.07,
+)
+"""Heliocentric orbit radii [AU] of the synthetic planets"""
+
+MOON_DISTANCE = 3.844e8
+"""Geocentric orbit radius [m] of the synthetic Moon"""
+
+G = 6.6743e-11
+
+
+def massive_settings(**settings):
+    """`Rebound` settings using all default massive objects, no progress bar"""
+    base = dict(
+        massive_objects=Rebound.DEFAULT_MASSIVE,
+        massive_masses=Rebound.DEFAULT_MASSES,
+        tqdm=False,
+    )
+    base.update(settings)
+    return base
+
+
+def massive_states():
+    """(6, N_massive) heliocentric states of `Rebound.DEFAULT_MASSIVE`"""
+    masses = dict(zip(Rebound.DEFAULT_MASSIVE, Rebound.DEFAULT_MASSES))
+    phases = np.linspace(0, 2 * np.pi, len(SEMI_MAJOR_AXES), endpoint=False)
+    states = {"Sun": np.zeros(6)}
+    for phase, (name, a) in zip(phases, SEMI_MAJOR_AXES.items()):
+        r = a * AU
+        v = np.sqrt(G * masses["Sun"] / r)
+        states[name] = np.array([
+            r * np.cos(phase), r * np.sin(phase), 0.0,
+            -v * np.sin(phase), v * np.cos(phase), 0.0,
+        ])
+    v_moon = np.sqrt(G * masses["Earth"] / MOON_DISTANCE)
+    states["Moon"] = states["Earth"] + np.array([MOON_DISTANCE, 0, 0, 0, v_moon, 0])
+    return np.stack([states[name] for name in Rebound.DEFAULT_MASSIVE], axis=1)
+
+
+def heliocentric_states(n, seed=0):
+    """(6, n) HCRS states of particles on near-circular orbits between 0.8 and 3 AU"""
+    rng = np.random.default_rng(seed)
+    r = rng.uniform(0.8, 3.0, size=n) * AU
+    phase = rng.uniform(0, 2 * np.pi, size=n)
+    v = np.sqrt(G * Rebound.DEFAULT_MASSES[0] / r) * rng.uniform(0.9, 1.1, size=n)
+    states = np.zeros((6, n))
+    states[0], states[1] = r * np.cos(phase), r * np.sin(phase)
+    states[2] = rng.normal(scale=0.02 * AU, size=n)
+    states[3], states[4] = -v * np.sin(phase), v * np.cos(phase)
+    states[5] = rng.normal(scale=1e3, size=n)
+    return states
+
+
+def meteor_states(n, seed=0):
+    """(6, n) ITRS states of meteoroids 100 km above the Earth moving inwards at 20-70 km/s"""
+    rng = np.random.default_rng(seed)
+    direction = rng.normal(size=(3, n))
+    direction /= np.linalg.norm(direction, axis=0)
+    speed = rng.uniform(20e3, 70e3, size=n)
+    states = np.empty((6, n))
+    states[:3] = direction * 6.471e6
+    states[3:] = -direction * speed
+    return states
+
+
+def orbital_elements(n, seed=0):
+    """(5, n) (a [AU], e, i, omega, Omega [rad]) of random meteoroid orbits"""
+    rng = np.random.default_rng(seed)
+    return np.stack([
+        rng.uniform(0.8, 5.0, size=n),
+        rng.uniform(0.0, 0.95, size=n),
+        rng.uniform(0.0, np.pi, size=n),
+        rng.uniform(0.0, 2 * np.pi, size=n),
+        rng.uniform(0.0, 2 * np.pi, size=n),
+    ])
@@ -6,5 +6,6 @@ from . import orbit_determination
 from . import plotting
 from . import propagators
 from . import sampling
+from . import distributions
 
 from . import time_utils
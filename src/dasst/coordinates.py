@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+"""
+Coordinate helpers
+==================
+
+"""
+
+import numpy as np
+import spacecoords.spherical as sph
+
+
+def radiant_angles(velocity: np.ndarray) -> np.ndarray:
+    """Radiant longitude and latitude [deg] of (3, N) geocentric velocities.
+
+    The radiant is the direction the meteoroids arrive from, i.e. opposite to
+    the velocity. Longitudes are measured from +x towards +y.
+    """
+    radiant = sph.cart_to_sph(-1 * np.asarray(velocity), degrees=True)
+    # ra-dec radiant angles are measured from +x -> +y, not from +y -> +x
+    radiant[0, ...] = 90 - radiant[0, ...]
+    return radiant[:2, ...]
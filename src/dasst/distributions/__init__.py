@@ -3,3 +3,6 @@
 '''
 
 from .kernel_density_estimation import KernelDensityEstimation
+from .kernel_density_estimation import MISE_kernel_optimization
+from .kernel_density_estimation import scott_bandwidth, silverman_bandwidth, BANDWIDTH_RULES
+from .resampling import Resampling, alias_table
@@ -1,12 +1,456 @@
-def MISE_kernel_optimization(kde_dist):
-    #https://link.springer.com/article/10.1007/s10827-009-0180-4
-    #
-    #implement the functions described in the paper and use 
-    #scipy to minimize them
-    #
-    # kde_dist.bandwidth = result
-    return NotImplementedError('TODO')
-
-
-def kernel_density_estimation():
-    pass
+"""Gaussian kernel density estimation
+
+The density of a set of samples is estimated by placing a Gaussian kernel
+with covariance matrix `bandwidth` on each sample. Internally the samples
+are whitened with the Cholesky factor of the bandwidth so the kernel becomes
+an isotropic unit Gaussian, which allows two fast approximations of the
+density:
+
+- `tree`: a KD-tree over the whitened samples, only samples within `cutoff`
+  kernel standard deviations of a query point contribute.
+- `fft`: the samples are linearly binned on a regular grid that is convolved
+  with the kernel using FFT, the density is interpolated at the query points.
+  Only used for low dimensions.
+
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+SUBSAMPLE_SIZE = {"scale": 10000, "full": 1000}
+"""Default number of samples used by `MISE_kernel_optimization` per parametrization"""
+
+PAIR_BLOCK = 2**22
+"""Number of sample pairs processed at once when binning pair distances"""
+
+
+def _as_samples(samples, axis):
+    """(D, N) sample array from samples with the sample index along `axis`"""
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.ndim == 1:
+        return samples.reshape(1, -1) if axis in (-1, 1) else samples.reshape(-1, 1)
+    return np.moveaxis(samples, axis, 1)
+
+
+def _as_weights(weights, num):
+    if weights is None:
+        return np.full((num,), 1.0 / num)
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (num,) or np.any(weights < 0):
+        raise ValueError("Weights must be non-negative with one weight per sample")
+    return weights / np.sum(weights)
+
+
+def _moments(samples, weights):
+    """Weighted sample covariance and effective number of samples"""
+    cov = np.atleast_2d(np.cov(samples, aweights=weights))
+    return cov, 1.0 / np.sum(weights**2)
+
+
+def scott_bandwidth(samples, weights=None, axis=1):
+    """Scott's rule of thumb bandwidth matrix `n**(-2/(d+4))*cov`.
+
+    Weighted samples use the effective number of samples `1/sum(w**2)`.
+    """
+    samples = _as_samples(samples, axis)
+    cov, n_eff = _moments(samples, _as_weights(weights, samples.shape[1]))
+    return cov * n_eff ** (-2.0 / (samples.shape[0] + 4))
+
+
+def silverman_bandwidth(samples, weights=None, axis=1):
+    """Silverman's rule of thumb bandwidth matrix `(n*(d+2)/4)**(-2/(d+4))*cov`."""
+    samples = _as_samples(samples, axis)
+    dim = samples.shape[0]
+    cov, n_eff = _moments(samples, _as_weights(weights, samples.shape[1]))
+    return cov * (n_eff * (dim + 2) / 4.0) ** (-2.0 / (dim + 4))
+
+
+BANDWIDTH_RULES = {
+    "scott": scott_bandwidth,
+    "silverman": silverman_bandwidth,
+}
+"""Rule of thumb bandwidths that can be given by name to `KernelDensityEstimation`"""
+
+
+def _pair_coefficients(weights, i, j):
+    """Coefficients of the 2H and H kernels of the pairs (i, j), i < j, in the LSCV cost"""
+    wij = 2 * weights[i] * weights[j]
+    return wij, wij * (1 / (1 - weights[i]) + 1 / (1 - weights[j]))
+
+
+def _binned_pairs(white, weights, bins):
+    """Pair coefficients histogrammed on log-spaced squared distances.
+
+    Returns the squared distance of each bin and the summed 2H and H kernel
+    coefficients, the first bin holds coincident pairs.
+    """
+    num = white.shape[1]
+    radius = np.max(np.linalg.norm(white - np.mean(white, axis=1, keepdims=True), axis=0))
+    log_min, log_max = -10.0, np.log10(max(4 * radius**2, 1e-9)) + 1e-6
+    edges = np.logspace(log_min, log_max, bins)
+    centers = np.concatenate([[0.0], np.sqrt(edges[:-1] * edges[1:])])
+    step = (log_max - log_min) / (bins - 1)
+
+    norms = np.sum(white**2, axis=0)
+    inverse = 1 / (1 - weights)
+    coef_2h = np.zeros((bins,), dtype=np.float64)
+    coef_h = np.zeros((bins,), dtype=np.float64)
+    rows = max(1, PAIR_BLOCK // num)
+    for start in range(0, num - 1, rows):
+        end = min(start + rows, num - 1)
+        # Squared distances of the rows start:end to all later samples
+        d2 = (
+            norms[start:end, None]
+            + norms[None, start:]
+            - 2 * white[:, start:end].T @ white[:, start:]
+        )
+        upper = np.arange(start, end)[:, None] < np.arange(start, num)[None, :]
+        d2 = d2[upper]
+
+        index = np.zeros(d2.shape, dtype=np.int64)
+        positive = d2 >= edges[0]
+        index[positive] = np.minimum(
+            ((np.log10(d2[positive]) - log_min) / step).astype(np.int64) + 1,
+            bins - 1,
+        )
+        wij = 2 * (weights[start:end, None] * weights[None, start:])[upper]
+        pair_inverse = (inverse[start:end, None] + inverse[None, start:])[upper]
+        coef_2h += np.bincount(index, weights=wij, minlength=bins)
+        coef_h += np.bincount(index, weights=wij * pair_inverse, minlength=bins)
+    return centers, coef_2h, coef_h
+
+
+def _lscv_scale_cost(h, dim, self_term, centers, coef_2h, coef_h):
+    """LSCV cost of the isotropic bandwidths `h` (vectorised) on binned pairs"""
+    h2 = np.asarray(h, dtype=np.float64)[..., None] ** 2
+    k_2h = (4 * np.pi * h2) ** (-0.5 * dim) * np.exp(-centers / (4 * h2))
+    k_h = (2 * np.pi * h2) ** (-0.5 * dim) * np.exp(-centers / (2 * h2))
+    return self_term * (4 * np.pi * h2[..., 0]) ** (-0.5 * dim) + k_2h @ coef_2h - k_h @ coef_h
+
+
+def _lscv_scale(white, weights, bins):
+    from scipy.optimize import minimize_scalar
+
+    dim = white.shape[0]
+    binned = _binned_pairs(white, weights, bins)
+    self_term = np.sum(weights**2)
+    args = (dim, self_term) + binned
+
+    grid = np.logspace(-3, 1, 200)
+    cost = _lscv_scale_cost(grid, *args)
+    best = int(np.argmin(cost))
+    low, high = np.log(grid[max(best - 1, 0)]), np.log(grid[min(best + 1, grid.size - 1)])
+    result = minimize_scalar(
+        lambda log_h: _lscv_scale_cost(np.exp(log_h), *args),
+        bounds=(low, high),
+        method="bounded",
+    )
+    return np.eye(dim) * np.exp(2 * result.x)
+
+
+def _unpack_cholesky(theta, dim):
+    """Lower triangular factor from its off-diagonal entries and log-diagonal"""
+    chol = np.zeros((dim, dim), dtype=np.float64)
+    chol[np.tril_indices(dim)] = theta
+    chol[np.diag_indices(dim)] = np.exp(np.diag(chol))
+    return chol
+
+
+def _diagonal_index(dim):
+    """Positions of the diagonal in the row-major lower triangle"""
+    return np.cumsum(np.arange(1, dim + 1)) - 1
+
+
+def _lscv_full_cost(theta, diffs, self_term, coef_2h, coef_h):
+    """LSCV cost and gradient of the bandwidth `L L^T` parametrised by `theta`"""
+    from scipy.linalg import solve_triangular
+
+    dim = diffs.shape[0]
+    chol = _unpack_cholesky(theta, dim)
+    z = solve_triangular(chol, diffs, lower=True)
+    q = np.sum(z**2, axis=0)
+    norm = (2 * np.pi) ** (-0.5 * dim) * np.exp(-np.sum(theta[_diagonal_index(dim)]))
+    ak_2h = coef_2h * norm * 2 ** (-0.5 * dim) * np.exp(-0.25 * q)
+    bk_h = coef_h * norm * np.exp(-0.5 * q)
+    self_value = self_term * norm * 2 ** (-0.5 * dim)
+    cost = self_value + np.sum(ak_2h) - np.sum(bk_h)
+
+    # d/dL of c|L|^-1 exp(-s q) is L^-T K (2 s z z^T - I) for the kernel K
+    inner = 0.5 * (z * ak_2h) @ z.T - (z * bk_h) @ z.T
+    inner -= np.eye(dim) * (self_value + np.sum(ak_2h) - np.sum(bk_h))
+    grad = solve_triangular(chol, inner, lower=True, trans="T")
+    grad[np.diag_indices(dim)] *= np.diag(chol)
+    return cost, grad[np.tril_indices(dim)]
+
+
+def _lscv_full(white, weights, max_iter):
+    from scipy.optimize import minimize
+
+    dim, num = white.shape
+    i, j = np.triu_indices(num, 1)
+    diffs = white[:, i] - white[:, j]
+    coef_2h, coef_h = _pair_coefficients(weights, i, j)
+    self_term = np.sum(weights**2)
+
+    theta0 = np.zeros((dim * (dim + 1) // 2,), dtype=np.float64)
+    theta0[_diagonal_index(dim)] = np.log(num ** (-1.0 / (dim + 4)))
+    scale = abs(_lscv_full_cost(theta0, diffs, self_term, coef_2h, coef_h)[0])
+
+    def fun(theta):
+        cost, grad = _lscv_full_cost(theta, diffs, self_term, coef_2h, coef_h)
+        return cost / scale, grad / scale
+
+    result = minimize(fun, theta0, jac=True, method="L-BFGS-B", options=dict(maxiter=max_iter))
+    chol = _unpack_cholesky(result.x, dim)
+    return chol @ chol.T
+
+
+def MISE_kernel_optimization(
+    kde_dist,
+    parametrization="full",
+    subsample=None,
+    rng=None,
+    bins=4096,
+    max_iter=200,
+):
+    """Select the bandwidth of a `KernelDensityEstimation` by minimising an
+    estimate of the mean integrated squared error (MISE).
+
+    The cost is the least-squares cross-validation estimate of the MISE up to a
+    constant, i.e. the Gaussian kernel form of the cost function of Shimazaki &
+    Shinomoto (2010), J Comput Neurosci 29:171-182,
+    https://link.springer.com/article/10.1007/s10827-009-0180-4
+
+    The samples are whitened by their covariance and the cost is minimised on
+    a random subsample, the optimal bandwidth is rescaled to the full (effective)
+    number of samples with the asymptotic `n**(-2/(d+4))` law.
+
+    :param KernelDensityEstimation kde_dist: Density estimate to update
+    :param str parametrization: "scale" optimises a scalar multiple of the sample
+        covariance with the cost evaluated on a histogram of pair distances,
+        "full" optimises every element of the bandwidth matrix with exact pair
+        sums and analytic gradients
+    :param int subsample: Number of samples used, defaults to `SUBSAMPLE_SIZE`
+    :param numpy.random.Generator rng: Random number generator used for subsampling
+    :param int bins: Number of pair distance bins of the "scale" parametrization
+    :param int max_iter: Maximum optimiser iterations of the "full" parametrization
+    :return: The selected (D, D) bandwidth, also set on `kde_dist`
+    """
+    if parametrization not in SUBSAMPLE_SIZE:
+        raise ValueError(f'Unknown parametrization {parametrization!r}, use "scale" or "full"')
+    rng = np.random.default_rng() if rng is None else rng
+    subsample = SUBSAMPLE_SIZE[parametrization] if subsample is None else subsample
+    samples, weights = kde_dist.samples, kde_dist.weights
+    dim, num = samples.shape
+
+    cov, n_eff = _moments(samples, weights)
+    whitening = np.linalg.cholesky(cov)
+    if num > subsample:
+        index = np.sort(rng.choice(num, size=subsample, replace=False))
+        samples, weights = samples[:, index], weights[index] / np.sum(weights[index])
+    white = np.linalg.solve(whitening, samples)
+
+    if parametrization == "scale":
+        bandwidth = _lscv_scale(white, weights, bins)
+    else:
+        bandwidth = _lscv_full(white, weights, max_iter)
+
+    m_eff = 1.0 / np.sum(weights**2)
+    bandwidth *= (m_eff / n_eff) ** (2.0 / (dim + 4))
+    bandwidth = whitening @ bandwidth @ whitening.T
+
+    kde_dist.bandwidth = bandwidth
+    return bandwidth
+
+
+def _as_bandwidth(bandwidth, dim):
+    """(D, D) covariance matrix from a scalar, (D,) variances or a matrix"""
+    bandwidth = np.asarray(bandwidth, dtype=np.float64)
+    if bandwidth.ndim == 0:
+        return np.eye(dim) * bandwidth
+    if bandwidth.ndim == 1:
+        return np.diag(bandwidth)
+    if bandwidth.shape != (dim, dim):
+        raise ValueError(f"Bandwidth must be ({dim}, {dim}), got {bandwidth.shape}")
+    return bandwidth
+
+
+class KernelDensityEstimation:
+    """Gaussian kernel density estimate of a set of samples.
+
+    :param numpy.ndarray samples: Samples, the sample index along `axis`
+    :param numpy.ndarray bandwidth: Kernel covariance matrix (D, D), a
+        scalar / (D,) vector for a diagonal matrix, or the name of a rule of
+        thumb in `BANDWIDTH_RULES`, see also `MISE_kernel_optimization`
+    :param int axis: Axis of `samples` that indexes the samples
+    :param numpy.ndarray weights: Optional (N,) sample weights
+    :param float cutoff: Kernel truncation radius in standard deviations for
+        the `tree` and `fft` methods
+    :param str method: Default method of `pdf`, "auto", "direct", "tree" or "fft"
+    :param numpy.random.Generator rng: Random number generator used by `sample`
+    """
+
+    FFT_MAX_DIM = 3
+    FFT_GRID_SIZE = {1: 8192, 2: 1024, 3: 128}
+    CHUNK_SIZE = 65536
+    PAIR_BUDGET = 2**24
+
+    def __init__(
+        self,
+        samples,
+        bandwidth,
+        axis=1,
+        weights=None,
+        cutoff=4.0,
+        method="auto",
+        rng=None,
+    ):
+        self.axis = axis
+        self.samples = _as_samples(samples, axis)
+        self.dim, self.num = self.samples.shape
+        self.weights = _as_weights(weights, self.num)
+
+        self.cutoff = cutoff
+        self.method = method
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.bandwidth = bandwidth
+
+    @property
+    def bandwidth(self):
+        return self._bandwidth
+
+    @bandwidth.setter
+    def bandwidth(self, value):
+        if isinstance(value, str):
+            value = BANDWIDTH_RULES[value](self.samples, self.weights)
+        self._bandwidth = _as_bandwidth(value, self.dim)
+        self._chol = np.linalg.cholesky(self._bandwidth)
+        self._norm = 1.0 / ((2 * np.pi) ** (self.dim * 0.5) * np.prod(np.diag(self._chol)))
+        self._white = self._whiten(self.samples)
+        self._tree = None
+        self._grid = None
+
+    def _whiten(self, x):
+        from scipy.linalg import solve_triangular
+
+        return solve_triangular(self._chol, x, lower=True)
+
+    def _points(self, x):
+        """Query points as a (D, M) array and a function restoring the input shape"""
+        x = np.asarray(x, dtype=np.float64)
+        if self.dim == 1 and (x.ndim == 0 or x.ndim == 1):
+            shape = x.shape
+            return x.reshape(1, -1), lambda p: p.reshape(shape)
+        x = np.moveaxis(x, self.axis, 1) if x.ndim > 1 else x.reshape(-1, 1)
+        return x, lambda p: p
+
+    def _select_method(self, num_query):
+        if self.method != "auto":
+            return self.method
+        if self.num * num_query <= 1e7:
+            return "direct"
+        if self.dim <= 2:
+            return "fft"
+        return "tree"
+
+    def pdf(self, x, method=None):
+        """Evaluate the density at points `x`, with the points along `axis`.
+
+        For one-dimensional densities `x` can be a flat array of points.
+        """
+        points, restore = self._points(x)
+        if points.shape[0] != self.dim:
+            raise ValueError(f"Points must have dimension {self.dim}, got {points.shape[0]}")
+        method = method or self._select_method(points.shape[1])
+        white = self._whiten(points)
+
+        if method == "direct":
+            values = self._pdf_direct(white)
+        elif method == "tree":
+            values = self._pdf_tree(white)
+        elif method == "fft":
+            values = self._pdf_fft(white)
+        else:
+            raise ValueError(f"Unknown method {method!r}")
+        return restore(values * self._norm)
+
+    def _pdf_direct(self, white):
+        values = np.empty((white.shape[1],), dtype=np.float64)
+        block = max(1, self.CHUNK_SIZE * 64 // max(self.num, 1))
+        for start in range(0, white.shape[1], block):
+            end = min(start + block, white.shape[1])
+            d2 = np.sum((white[:, start:end, None] - self._white[:, None, :]) ** 2, axis=0)
+            values[start:end] = np.exp(-0.5 * d2) @ self.weights
+        return values
+
+    def _pdf_tree(self, white):
+        if self._tree is None:
+            self._tree = cKDTree(self._white.T)
+        num = white.shape[1]
+
+        # Size the query blocks from the neighbour count of a few query points
+        # so the number of kernel evaluations held in memory stays bounded
+        probe = white[:, :: max(1, num // 256)].T
+        neighbours = np.mean(self._tree.query_ball_point(probe, self.cutoff, return_length=True))
+        block = int(np.clip(self.PAIR_BUDGET // max(2 * neighbours, 1), 1, self.CHUNK_SIZE))
+
+        values = np.empty((num,), dtype=np.float64)
+        for start in range(0, num, block):
+            end = min(start + block, num)
+            query = cKDTree(white[:, start:end].T)
+            pairs = query.sparse_distance_matrix(
+                self._tree,
+                self.cutoff,
+                output_type="ndarray",
+            )
+            contrib = np.exp(-0.5 * pairs["v"] ** 2) * self.weights[pairs["j"]]
+            values[start:end] = np.bincount(pairs["i"], weights=contrib, minlength=end - start)
+        return values
+
+    def _build_grid(self):
+        from scipy.signal import fftconvolve
+
+        if self.dim > self.FFT_MAX_DIM:
+            raise ValueError(f"FFT method only supports up to {self.FFT_MAX_DIM} dimensions")
+        size = self.FFT_GRID_SIZE[self.dim]
+        low = self._white.min(axis=1) - self.cutoff
+        high = self._white.max(axis=1) + self.cutoff
+        # At most 10 grid points per kernel standard deviation
+        step = np.maximum((high - low) / (size - 1), 0.1)
+        shape = tuple(np.ceil((high - low) / step).astype(int) + 1)
+
+        # Linear binning: each sample is split over the 2^D surrounding nodes
+        pos = (self._white - low[:, None]) / step[:, None]
+        base = np.floor(pos).astype(np.int64)
+        frac = pos - base
+        grid = np.zeros(shape, dtype=np.float64)
+        for corner in range(2**self.dim):
+            offset = np.array([(corner >> d) & 1 for d in range(self.dim)])
+            w = self.weights.copy()
+            for d in range(self.dim):
+                w *= frac[d] if offset[d] else 1 - frac[d]
+            index = base + offset[:, None]
+            for d in range(self.dim):
+                np.clip(index[d], 0, shape[d] - 1, out=index[d])
+            np.add.at(grid, tuple(index), w)
+
+        half = [int(np.ceil(self.cutoff / s)) for s in step]
+        axes = np.meshgrid(*[np.arange(-h, h + 1) * s for h, s in zip(half, step)], indexing="ij")
+        kernel = np.exp(-0.5 * sum(a**2 for a in axes))
+        self._grid = (fftconvolve(grid, kernel, mode="same"), low, step)
+
+    def _pdf_fft(self, white):
+        from scipy.ndimage import map_coordinates
+
+        if self._grid is None:
+            self._build_grid()
+        grid, low, step = self._grid
+        coords = (white - low[:, None]) / step[:, None]
+        values = map_coordinates(grid, coords, order=1, mode="constant", cval=0.0)
+        return np.maximum(values, 0.0)
+
+    def sample(self, n):
+        """Draw `n` samples from the density, returned with samples along `axis`."""
+        index = self.rng.choice(self.num, size=n, p=self.weights)
+        noise = self._chol @ self.rng.standard_normal((self.dim, n))
+        return np.moveaxis(self.samples[:, index] + noise, 1, self.axis)
@@ -0,0 +1,132 @@
+"""Weighted resampling of a set of samples
+
+Draws are made with the alias method: after an O(N) table construction
+every draw costs O(1) regardless of how skewed the weights are. Large
+resamplings can be produced in chunks where every chunk is drawn from its
+own RNG stream (see `dasst.populations.chunk_seed`), so the output is
+reproducible and any chunk can be generated independently, e.g. by a
+different worker, without materialising the full index array.
+
+"""
+
+import numpy as np
+
+from ..populations import chunk_seed
+
+
+def alias_table(weights):
+    """Alias method table (probability, alias) of a set of non-negative weights.
+
+    A draw picks a uniform column `i` and returns `i` with probability
+    `probability[i]`, otherwise `alias[i]`. The construction pairs all
+    underfull columns with overfull columns in vectorised rounds: every
+    underfull column takes its missing mass from the overfull column whose
+    share of the cumulative excess it starts in.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    num = weights.size
+    total = np.sum(weights)
+    if num == 0 or not np.isfinite(total) or total <= 0 or np.any(weights < 0):
+        raise ValueError("Weights must be non-negative, finite and not all zero")
+
+    probability = weights * (num / total)
+    alias = np.arange(num, dtype=np.int64)
+
+    small = np.flatnonzero(probability < 1.0)
+    large = np.flatnonzero(probability > 1.0)
+    while small.size > 0 and large.size > 0:
+        deficit = 1.0 - probability[small]
+        excess = np.cumsum(probability[large] - 1.0)
+        start = np.cumsum(deficit) - deficit
+        donor = np.minimum(np.searchsorted(excess, start, side="right"), large.size - 1)
+        alias[small] = large[donor]
+
+        taken = np.bincount(donor, weights=deficit, minlength=large.size)
+        probability[large] -= taken
+
+        small = large[probability[large] < 1.0]
+        large = large[probability[large] > 1.0]
+
+    # Round-off leftovers are full columns
+    probability[small] = 1.0
+    probability[large] = 1.0
+    return probability, alias
+
+
+class Resampling:
+    """Distribution given by resampling (with replacement) a set of samples.
+
+    :param numpy.ndarray samples: Samples, the sample index along `axis`
+    :param int axis: Axis of `samples` that indexes the samples
+    :param numpy.ndarray weights: Optional (N,) sample weights, e.g. the
+        number of meteoroids each simulated particle represents
+    :param int|numpy.random.SeedSequence seed: Seed of the RNG streams
+    :param int chunk_size: Number of resamples per chunk of `chunks`
+    """
+
+    CHUNK_SIZE = 100_000
+
+    def __init__(self, samples, axis=1, weights=None, seed=None, chunk_size=None):
+        samples = np.asarray(samples)
+        if samples.ndim == 1:
+            samples = samples.reshape(1, -1) if axis in (-1, 1) else samples.reshape(-1, 1)
+        self.axis = axis
+        self.samples = np.moveaxis(samples, axis, 1)
+        self.dim, self.num = self.samples.shape
+
+        if weights is None:
+            self.weights = None
+            self._probability = self._alias = None
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            if weights.shape != (self.num,):
+                raise ValueError(f"Weights must have shape ({self.num},), got {weights.shape}")
+            self.weights = weights / np.sum(weights)
+            self._probability, self._alias = alias_table(weights)
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.chunk_size = int(chunk_size or self.CHUNK_SIZE)
+        if self.chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {self.chunk_size}")
+
+    def sample_index(self, n, rng=None):
+        """Indices of `n` resampled samples."""
+        rng = self.rng if rng is None else rng
+        if self._alias is None:
+            return rng.integers(0, self.num, size=n)
+        column = rng.integers(0, self.num, size=n)
+        keep = rng.random(n) < self._probability[column]
+        return np.where(keep, column, self._alias[column])
+
+    def _take(self, index):
+        return np.moveaxis(self.samples[:, index], 1, self.axis)
+
+    def sample(self, n, rng=None):
+        """Draw `n` resamples, returned with samples along `axis`."""
+        return self._take(self.sample_index(n, rng=rng))
+
+    def n_chunks(self, n):
+        """Number of chunks of a resampling of size `n`"""
+        return -(-int(n) // self.chunk_size)
+
+    def chunk(self, n, index):
+        """Chunk number `index` of a resampling of size `n`.
+
+        Every chunk is drawn from its own stream derived from `seed`, so the
+        result does not depend on which other chunks were drawn before.
+        """
+        if index < 0 or index >= self.n_chunks(n):
+            raise IndexError(f"Chunk index {index} out of range [0, {self.n_chunks(n)})")
+        start = index * self.chunk_size
+        size = min(start + self.chunk_size, int(n)) - start
+        rng = np.random.default_rng(chunk_seed(self.seed, index))
+        return self.sample(size, rng=rng)
+
+    def chunks(self, n, start=0, stop=None):
+        """Iterate over the chunks with index in [start, stop) of a resampling of size `n`."""
+        stop = self.n_chunks(n) if stop is None else min(stop, self.n_chunks(n))
+        for index in range(start, stop):
+            yield self.chunk(n, index)
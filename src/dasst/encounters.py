@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+
+"""
+Orbit intersection and node crossings
+=====================================
+
+Vectorised minimum orbit intersection distance (MOID) between arrays of orbit
+pairs and a detector for crossings of the orbital plane of a massive body
+(e.g. the Earth) in propagated trajectories.
+
+The MOID is found by evaluating the squared distance between the two orbits
+on a grid of true anomalies, taking the best local minima of the grid as
+starting points and refining them with damped Newton iterations using the
+analytic first and second derivatives of the orbit curves. All pairs and
+starting points are refined together on arrays.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyorb
+
+
+MU_SUN = pyorb.G * pyorb.M_sol
+"""Standard gravitational parameter of the Sun in m^3/s^2"""
+
+DEFAULT_EPOCH_BLOCK = 1024
+"""Default number of epochs processed per block by `node_crossings`"""
+
+
+def _perifocal(i, omega, Omega) -> Tuple[np.ndarray, np.ndarray]:
+    """Unit vectors towards the pericentre (P) and 90 degrees ahead of it (Q)"""
+    cO, sO = np.cos(Omega), np.sin(Omega)
+    cw, sw = np.cos(omega), np.sin(omega)
+    ci, si = np.cos(i), np.sin(i)
+    P = np.stack([cO * cw - sO * sw * ci, sO * cw + cO * sw * ci, sw * si])
+    Q = np.stack([-cO * sw - sO * cw * ci, -sO * sw + cO * cw * ci, cw * si])
+    return P, Q
+
+
+def _curve(p, e, P, Q, f):
+    """Position on the orbit and its first two derivatives w.r.t. true anomaly"""
+    cf, sf = np.cos(f), np.sin(f)
+    k = 1 + e * cf
+    r = p / k
+    x, y = r * cf, r * sf
+    dx = -p * sf / k**2
+    dy = p * (e + cf) / k**2
+    ddx = -p * (cf * k + 2 * e * sf**2) / k**3
+    ddy = p * sf * (2 * e**2 + e * cf - 1) / k**3
+    R = x * P + y * Q
+    dR = dx * P + dy * Q
+    ddR = ddx * P + ddy * Q
+    return R, dR, ddR
+
+
+def _anomaly_limit(e) -> np.ndarray:
+    """Largest usable true anomaly, slightly inside the asymptote of open orbits"""
+    with np.errstate(invalid="ignore"):
+        return np.where(e < 1, np.pi, np.arccos(-1 / np.maximum(e, 1)) * (1 - 1e-3))
+
+
+def _moid_block(ea, eb, n_grid, n_starts, max_iter, tol):
+    a_a, e_a, i_a, w_a, O_a = ea
+    a_b, e_b, i_b, w_b, O_b = eb
+    p_a = a_a * (1 - e_a**2)
+    p_b = a_b * (1 - e_b**2)
+    P_a, Q_a = _perifocal(i_a, w_a, O_a)
+    P_b, Q_b = _perifocal(i_b, w_b, O_b)
+    lim_a = _anomaly_limit(e_a)
+    lim_b = _anomaly_limit(e_b)
+
+    # Coarse grid of squared distances, (N, G, G)
+    grid = np.linspace(-1, 1, n_grid, endpoint=False) + 1.0 / n_grid
+    f_a = lim_a[:, None] * grid[None, :]
+    f_b = lim_b[:, None] * grid[None, :]
+    R_a = _curve(p_a[:, None], e_a[:, None], P_a[:, :, None], Q_a[:, :, None], f_a)[0]
+    R_b = _curve(p_b[:, None], e_b[:, None], P_b[:, :, None], Q_b[:, :, None], f_b)[0]
+    d2 = np.sum((R_a[:, :, :, None] - R_b[:, :, None, :]) ** 2, axis=0)
+
+    # Local minima on the (periodic) grid are the starting points
+    is_min = np.ones(d2.shape, dtype=bool)
+    for shift_a in (-1, 0, 1):
+        for shift_b in (-1, 0, 1):
+            if shift_a == 0 and shift_b == 0:
+                continue
+            is_min &= d2 <= np.roll(d2, (shift_a, shift_b), axis=(1, 2))
+    score = np.where(is_min, d2, np.inf).reshape(d2.shape[0], -1)
+    n_starts = min(n_starts, score.shape[1])
+    start = np.argpartition(score, n_starts - 1, axis=1)[:, :n_starts]
+    # Pairs without enough local minima fall back to the grid minimum
+    missing = ~np.isfinite(np.take_along_axis(score, start, axis=1))
+    start = np.where(missing, np.argmin(d2.reshape(d2.shape[0], -1), axis=1)[:, None], start)
+
+    num = d2.shape[0]
+    rows = np.arange(num)[:, None]
+    x_a = f_a[rows, start // n_grid]
+    x_b = f_b[rows, start % n_grid]
+
+    # Damped Newton refinement of all (pair, start) combinations at once
+    def expand(arr):
+        return np.broadcast_to(arr[..., None], arr.shape + (n_starts,))
+
+    args_a = (expand(p_a), expand(e_a), expand(P_a), expand(Q_a))
+    args_b = (expand(p_b), expand(e_b), expand(P_b), expand(Q_b))
+    closed_a, closed_b = expand(e_a < 1), expand(e_b < 1)
+    lim_a_, lim_b_ = expand(lim_a), expand(lim_b)
+
+    def advance(x, step, closed, lim):
+        # Closed orbits wrap around, open orbits stay inside the asymptotes
+        x = x + step
+        return np.where(closed, np.mod(x + np.pi, 2 * np.pi) - np.pi, np.clip(x, -lim, lim))
+
+    def evaluate(x_a, x_b):
+        Ra, dRa, ddRa = _curve(*args_a, x_a)
+        Rb, dRb, ddRb = _curve(*args_b, x_b)
+        delta = Ra - Rb
+        F = np.sum(delta**2, axis=0)
+        g = np.stack([2 * np.sum(delta * dRa, axis=0), -2 * np.sum(delta * dRb, axis=0)])
+        H11 = 2 * (np.sum(dRa**2, axis=0) + np.sum(delta * ddRa, axis=0))
+        H22 = 2 * (np.sum(dRb**2, axis=0) - np.sum(delta * ddRb, axis=0))
+        H12 = -2 * np.sum(dRa * dRb, axis=0)
+        return F, g, H11, H22, H12
+
+    F, g, H11, H22, H12 = evaluate(x_a, x_b)
+    lam = np.full(F.shape, 1e-3)
+    for _ in range(max_iter):
+        scale = np.abs(H11) + np.abs(H22) + 1e-300
+        A11 = H11 + lam * scale
+        A22 = H22 + lam * scale
+        det = A11 * A22 - H12**2
+        definite = (A11 > 0) & (det > 0)
+        det = np.where(definite, det, 1.0)
+        step_a = np.where(definite, -(A22 * g[0] - H12 * g[1]) / det, 0.0)
+        step_b = np.where(definite, -(A11 * g[1] - H12 * g[0]) / det, 0.0)
+        step_a = np.clip(step_a, -0.5, 0.5)
+        step_b = np.clip(step_b, -0.5, 0.5)
+
+        new_a = advance(x_a, step_a, closed_a, lim_a_)
+        new_b = advance(x_b, step_b, closed_b, lim_b_)
+        F_new, g_new, H11_new, H22_new, H12_new = evaluate(new_a, new_b)
+        accept = definite & (F_new <= F)
+
+        x_a = np.where(accept, new_a, x_a)
+        x_b = np.where(accept, new_b, x_b)
+        F = np.where(accept, F_new, F)
+        g = np.where(accept, g_new, g)
+        H11 = np.where(accept, H11_new, H11)
+        H22 = np.where(accept, H22_new, H22)
+        H12 = np.where(accept, H12_new, H12)
+        lam = np.where(accept, lam * 0.3, np.maximum(lam * 10, 1e-3))
+
+        moved = np.maximum(np.abs(step_a), np.abs(step_b))
+        if np.all(~accept | (moved < tol)):
+            break
+
+    best = np.argmin(F, axis=1)
+    pick = (np.arange(num), best)
+    return np.sqrt(F[pick]), x_a[pick], x_b[pick]
+
+
+def moid(
+    elements_a: np.ndarray,
+    elements_b: np.ndarray,
+    n_grid: int = 36,
+    n_starts: int = 4,
+    max_iter: int = 50,
+    tol: float = 1e-12,
+    chunk_size: int = 2048,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Minimum orbit intersection distance between pairs of orbits.
+
+    :param elements_a: (5, N) elements (a, e, i, omega, Omega), angles in radians
+    :param elements_b: (5, N) elements of the second orbits, or (5,) for one
+        orbit compared to all orbits in `elements_a`
+    :param n_grid: Number of true anomaly grid points per orbit
+    :param n_starts: Number of grid minima refined per pair
+    :param max_iter: Maximum number of Newton iterations
+    :param tol: Anomaly step [rad] below which the refinement has converged
+    :param chunk_size: Number of pairs evaluated at a time
+    :return: (N,) MOID in the length unit of the semi-major axes and the
+        (N,) true anomalies [rad] of the closest points on orbit A and B
+    """
+    ea = np.asarray(elements_a, dtype=np.float64)
+    if ea.ndim == 1:
+        ea = ea.reshape(-1, 1)
+    eb = np.asarray(elements_b, dtype=np.float64)
+    if eb.ndim == 1:
+        eb = eb.reshape(-1, 1)
+    num = max(ea.shape[1], eb.shape[1])
+    ea = np.broadcast_to(ea[:5], (5, num))
+    eb = np.broadcast_to(eb[:5], (5, num))
+
+    distance = np.empty((num,), dtype=np.float64)
+    f_a = np.empty((num,), dtype=np.float64)
+    f_b = np.empty((num,), dtype=np.float64)
+    for start in range(0, num, chunk_size):
+        end = min(start + chunk_size, num)
+        distance[start:end], f_a[start:end], f_b[start:end] = _moid_block(
+            ea[:, start:end], eb[:, start:end], n_grid, n_starts, max_iter, tol,
+        )
+    return distance, f_a, f_b
+
+
+def hermite_interpolate(s, dt, x0, x1, v0, v1):
+    """Cubic Hermite interpolation of positions and its time derivative.
+
+    :param s: Fraction of the interval [0, 1]
+    :param dt: Length of the interval in seconds
+    :param x0, x1: Positions at the start and end of the interval
+    :param v0, v1: Velocities at the start and end of the interval
+    :return: Interpolated positions and velocities
+    """
+    s2, s3 = s**2, s**3
+    h00 = 2 * s3 - 3 * s2 + 1
+    h10 = s3 - 2 * s2 + s
+    h01 = -2 * s3 + 3 * s2
+    h11 = s3 - s2
+    x = h00 * x0 + h10 * dt * v0 + h01 * x1 + h11 * dt * v1
+    d00 = 6 * s2 - 6 * s
+    d10 = 3 * s2 - 4 * s + 1
+    d01 = -6 * s2 + 6 * s
+    d11 = 3 * s2 - 2 * s
+    v = (d00 * x0 + d01 * x1) / dt + d10 * v0 + d11 * v1
+    return x, v
+
+
+class NodeCrossingDetector:
+    """Detects crossings of the orbital plane of a body in streamed trajectories.
+
+    States are fed block by block with `update`, only the last epoch of the
+    previous block is kept between calls. A crossing is found when the signed
+    distance of a particle to the instantaneous orbital plane of the body
+    changes sign between two epochs, the crossing time is then refined on a
+    cubic Hermite interpolation of both trajectories.
+
+    For each crossing the epoch, the distance to the body, the geocentric
+    velocity and the MOID between the osculating orbits of the particle and
+    the body are recorded.
+
+    :param mu: Standard gravitational parameter of the central body in m^3/s^2,
+        the states must be centred on it
+    :param moid_kwargs: Keyword arguments passed to `moid`
+    """
+
+    def __init__(self, mu: float = MU_SUN, **moid_kwargs):
+        self.mu = mu
+        self.moid_kwargs = moid_kwargs
+        self._last = None
+        self._crossings: List[Dict[str, np.ndarray]] = []
+
+    def update(self, t: np.ndarray, states: np.ndarray, body_states: np.ndarray) -> None:
+        """Process the next block of epochs.
+
+        :param t: (T,) times of the epochs in seconds
+        :param states: (6, T, N) particle states in m and m/s
+        :param body_states: (6, T) states of the body in the same frame
+        """
+        t = np.asarray(t, dtype=np.float64)
+        states = np.asarray(states, dtype=np.float64)
+        body_states = np.asarray(body_states, dtype=np.float64)
+        if self._last is not None:
+            t0, s0, b0 = self._last
+            t = np.concatenate([[t0], t])
+            states = np.concatenate([s0[:, None, :], states], axis=1)
+            body_states = np.concatenate([b0[:, None], body_states], axis=1)
+        if t.size > 0:
+            self._last = (t[-1], states[:, -1, :].copy(), body_states[:, -1].copy())
+        if t.size < 2:
+            return
+
+        normal = np.cross(body_states[:3], body_states[3:], axis=0)
+        normal /= np.linalg.norm(normal, axis=0)
+        with np.errstate(invalid="ignore"):
+            z = np.einsum("it,itn->tn", normal, states[:3])
+            crossing = np.isfinite(z[:-1]) & np.isfinite(z[1:]) & ((z[:-1] < 0) != (z[1:] < 0))
+        ti, pi = np.nonzero(crossing)
+        if ti.size == 0:
+            return
+        self._crossings.append(self._refine(t, states, body_states, normal, ti, pi))
+
+    def _refine(self, t, states, body_states, normal, ti, pi) -> Dict[str, np.ndarray]:
+        dt = t[ti + 1] - t[ti]
+        x0, x1 = states[:3, ti, pi], states[:3, ti + 1, pi]
+        v0, v1 = states[3:, ti, pi], states[3:, ti + 1, pi]
+        n = normal[:, ti] + normal[:, ti + 1]
+        n /= np.linalg.norm(n, axis=0)
+
+        # Bisection on the interpolated signed distance to the plane
+        lo = np.zeros(ti.shape)
+        hi = np.ones(ti.shape)
+        z_lo = np.sum(n * x0, axis=0)
+        for _ in range(50):
+            mid = 0.5 * (lo + hi)
+            x, _ = hermite_interpolate(mid, dt, x0, x1, v0, v1)
+            z_mid = np.sum(n * x, axis=0)
+            lower = (z_mid < 0) == (z_lo < 0)
+            lo = np.where(lower, mid, lo)
+            z_lo = np.where(lower, z_mid, z_lo)
+            hi = np.where(lower, hi, mid)
+        s = 0.5 * (lo + hi)
+
+        x, v = hermite_interpolate(s, dt, x0, x1, v0, v1)
+        bx, bv = hermite_interpolate(
+            s, dt, body_states[:3, ti], body_states[:3, ti + 1],
+            body_states[3:, ti], body_states[3:, ti + 1],
+        )
+        state = np.concatenate([x, v], axis=0)
+        body_state = np.concatenate([bx, bv], axis=0)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            kep = pyorb.cart_to_kep(state, mu=self.mu, degrees=False)
+            body_kep = pyorb.cart_to_kep(body_state, mu=self.mu, degrees=False)
+        distance_moid, _, _ = moid(kep[:5], body_kep[:5], **self.moid_kwargs)
+
+        return dict(
+            index=pi.astype(np.int64),
+            t=t[ti] + s * dt,
+            ascending=np.sum(n * v, axis=0) > 0,
+            moid=distance_moid,
+            distance=np.linalg.norm(x - bx, axis=0),
+            velocity=v - bv,
+            state=state,
+            body_state=body_state,
+        )
+
+    def result(self) -> Dict[str, np.ndarray]:
+        """All crossings found so far, sorted by particle index and time.
+
+        :return: Dictionary with the particle `index`, crossing time `t` [s],
+            `ascending` node flag, `moid` [m], `distance` to the body [m],
+            (3, K) `velocity` relative to the body [m/s] and the (6, K)
+            interpolated `state` and `body_state`
+        """
+        if not self._crossings:
+            return dict(
+                index=np.empty((0,), dtype=np.int64),
+                t=np.empty((0,)),
+                ascending=np.empty((0,), dtype=bool),
+                moid=np.empty((0,)),
+                distance=np.empty((0,)),
+                velocity=np.empty((3, 0)),
+                state=np.empty((6, 0)),
+                body_state=np.empty((6, 0)),
+            )
+        out = {
+            key: np.concatenate([c[key] for c in self._crossings], axis=-1)
+            for key in self._crossings[0]
+        }
+        order = np.lexsort((out["t"], out["index"]))
+        return {key: val[..., order] for key, val in out.items()}
+
+
+def _blocks(num: int, size: int) -> Iterator[Tuple[int, int]]:
+    for start in range(0, num, size):
+        yield start, min(start + size, num)
+
+
+def node_crossings(
+    t: np.ndarray,
+    states: np.ndarray,
+    body_states: np.ndarray,
+    epoch_block: int = DEFAULT_EPOCH_BLOCK,
+    mu: float = MU_SUN,
+    **moid_kwargs,
+) -> Dict[str, Any]:
+    """Crossings of the orbital plane of a body in (6, T, N) trajectories.
+
+    The trajectories are read in blocks of `epoch_block` epochs, so memory
+    mapped state arrays are never loaded in full. See `NodeCrossingDetector`
+    for the returned fields.
+
+    :param t: (T,) times in seconds
+    :param states: (6, T, N) particle states centred on the central body
+    :param body_states: (6, T) states of the body, e.g. the Earth
+    """
+    t = np.asarray(t, dtype=np.float64)
+    detector = NodeCrossingDetector(mu=mu, **moid_kwargs)
+    for start, end in _blocks(t.size, epoch_block):
+        detector.update(t[start:end], states[:, start:end, :], body_states[:, start:end])
+    return detector.result()
+
+
+def body_index(name: str, massive_objects: Optional[List[str]] = None) -> int:
+    """Index of a massive body in the massive states of a simulation"""
+    if massive_objects is None:
+        from .propagators import Rebound
+        massive_objects = Rebound.DEFAULT_MASSIVE
+    names = [obj.lower() for obj in massive_objects]
+    if name.lower() not in names:
+        raise ValueError(f"{name} is not one of the massive objects {massive_objects}")
+    return names.index(name.lower())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""Particle events logged during propagation (collisions, escapes, ...)"""
+
+from __future__ import annotations
+import json
+from pathlib import Path
+from dataclasses import dataclass, asdict, fields
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .profiling import record_execution_time
+
+
+@dataclass
+class ParticleEvent:
+    """
+    A single event that happened to a test particle during integration.
+
+    For encounter events the position and velocity are relative to the
+    encountered body and `distance` is the closest-approach distance.
+    """
+    sim_time_sec: float
+    epoch_isot: str
+    event: str
+    reason: str
+    particle_hash: int
+    other_hash: Optional[int] = None
+    other_name: Optional[str] = None
+    x: Optional[float] = None
+    y: Optional[float] = None
+    z: Optional[float] = None
+    vx: Optional[float] = None
+    vy: Optional[float] = None
+    vz: Optional[float] = None
+    distance: Optional[float] = None
+
+
+@record_execution_time("events.write_jsonl")
+def write_events_jsonl(events: Iterable[ParticleEvent], path: str | Path) -> None:
+    """Write events to a JSON lines file, one event per line."""
+    with open(path, "w") as fh:
+        for event in events:
+            fh.write(json.dumps(asdict(event)) + "\n")
+
+
+def read_events_jsonl(path: str | Path) -> List[ParticleEvent]:
+    """Read events written by `write_events_jsonl`."""
+    events = []
+    with open(path, "r") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                events.append(ParticleEvent(**json.loads(line)))
+    return events
+
+
+def event_table(events: Iterable[ParticleEvent]) -> Dict[str, np.ndarray]:
+    """Columns of all events as arrays, missing values are NaN / -1 / empty strings."""
+    events = list(events)
+    table = {}
+    for field in fields(ParticleEvent):
+        values = [getattr(ev, field.name) for ev in events]
+        if field.name in ("particle_hash", "other_hash"):
+            table[field.name] = np.array([-1 if v is None else v for v in values], dtype=np.int64)
+        elif field.name in ("epoch_isot", "event", "reason", "other_name"):
+            table[field.name] = np.array(["" if v is None else v for v in values], dtype=str)
+        else:
+            table[field.name] = np.array(
+                [np.nan if v is None else v for v in values], dtype=np.float64
+            )
+    return table
+
+
+def events_from_table(table: Dict[str, np.ndarray]) -> List[ParticleEvent]:
+    """Events from the columns of `event_table`, missing values become None."""
+    events = []
+    for row in range(len(table["event"])):
+        values = {}
+        for field in fields(ParticleEvent):
+            value = table[field.name][row].item()
+            if value == "" or value == -1 and field.name == "other_hash":
+                value = None
+            elif isinstance(value, float) and np.isnan(value):
+                value = None
+            values[field.name] = value
+        events.append(ParticleEvent(**values))
+    return events
+
+
+def encounter_table(events: Iterable[ParticleEvent]) -> Dict[str, np.ndarray]:
+    """Columns of all encounter events, e.g. as logged by the `encounter`
+    setting of `Rebound`, as arrays."""
+    encounters = [ev for ev in events if ev.event == "encounter"]
+    state = np.array(
+        [[ev.x, ev.y, ev.z, ev.vx, ev.vy, ev.vz] for ev in encounters], dtype=np.float64
+    ).reshape(-1, 6)
+    return dict(
+        particle_hash=np.array([ev.particle_hash for ev in encounters], dtype=np.int64),
+        sim_time_sec=np.array([ev.sim_time_sec for ev in encounters], dtype=np.float64),
+        epoch_isot=np.array([ev.epoch_isot for ev in encounters], dtype=str),
+        body=np.array([ev.other_name for ev in encounters], dtype=str),
+        distance=np.array([ev.distance for ev in encounters], dtype=np.float64),
+        state=state.T.copy(),
+    )
+
+
+def iter_encounter_tables(
+    path: str | Path, chunk_size: int = 100_000
+) -> Iterator[Dict[str, np.ndarray]]:
+    """Encounter tables of at most `chunk_size` rows read from a JSON lines
+    event log, without loading the whole log."""
+    chunk: List[ParticleEvent] = []
+    with open(path, "r") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            event = ParticleEvent(**json.loads(line))
+            if event.event != "encounter":
+                continue
+            chunk.append(event)
+            if len(chunk) >= chunk_size:
+                yield encounter_table(chunk)
+                chunk = []
+    if chunk:
+        yield encounter_table(chunk)
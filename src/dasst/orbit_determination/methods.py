@@ -12,12 +12,12 @@ import numpy as np
 from astropy.time import TimeDelta
 import astropy.coordinates as coords
 import spacecoords.celestial as cel
-import spacecoords.spherical as sph
 from tqdm import tqdm
 
 import pyorb
 
 from ..propagators import Rebound
+from ..coordinates import radiant_angles
 
 logger = logging.getLogger(__name__)
 
@@ -45,8 +45,13 @@ def propagate_pre_encounter(
     dt=10.0,
     max_t=10 * 24 * 3600.0,
     settings=None,
+    massive_states=None,
 ):
-    """Propagates a state from the states backwards in time until the termination_check is true."""
+    """Propagates a state from the states backwards in time until the termination_check is true.
+
+    Initial (6, N_massive) `massive_states` in the internal HCRS frame can be
+    given to skip the ephemeris kernel lookup, see `dasst.sampling.DynamicsCache`.
+    """
     t = TimeDelta(-np.arange(0, max_t, dt, dtype=np.float64), format="sec")
 
     if termination_check:
@@ -65,17 +70,17 @@ def propagate_pre_encounter(
         time_step=dt,  # s
         termination_check=True if termination_check else False,
     )
-    if settings is not None:
-        settings.update(reb_settings)
-    else:
-        settings = reb_settings
+    settings = {} if settings is None else dict(settings)
+    settings.update(reb_settings)
 
     prop = PropCls(
         kernel=kernel,
         settings=settings,
     )
 
-    particle_states, massive_states = prop.propagate(t, states, epoch)
+    particle_states, massive_states = prop.propagate(
+        t, states, epoch, massive_states=massive_states
+    )
 
     t = t[: particle_states.shape[1]]
 
@@ -93,8 +98,13 @@ def rebound_od(
     max_t=10 * 24 * 3600.0,
     settings=None,
     progress_bar=True,
+    massive_states=None,
 ):
-    """Determine the orbit using rebound, states in ITRS"""
+    """Determine the orbit using rebound, states in ITRS.
+
+    Initial (6, N_massive) `massive_states` in the internal HCRS frame can be
+    given instead of reading them from the kernel, see `propagate_pre_encounter`.
+    """
     logger.debug(f"Using JPL kernel: {kernel}")
 
     if len(states.shape) == 1:
@@ -119,6 +129,7 @@ def rebound_od(
         dt=dt,
         max_t=max_t,
         settings=settings,
+        massive_states=massive_states,
     )
     if len(particle_states.shape) == 2:
         particle_states.shape = particle_states.shape + (1,)
@@ -144,9 +155,7 @@ def rebound_od(
             out_frame=frame_name,
         )
         results["radiant_obs_states_" + frame_name] = p_states_radiant
-        radiant = sph.cart_to_sph(-1 * p_states_radiant[3:, :], degrees=True)
-        # ra-dec radiant angles are measured from +x -> +y, not from +y -> +x
-        radiant[0, :] = 90 - radiant[0, :]
+        radiant = radiant_angles(p_states_radiant[3:, :])
 
         p_zat_states_radiant = cel.convert(
             epoch + t[-1],
@@ -155,15 +164,13 @@ def rebound_od(
             out_frame=frame_name,
         )
         results["radiant_orbit_states_" + frame_name] = p_zat_states_radiant
-        radiant_zat = sph.cart_to_sph(-1 * p_zat_states_radiant[3:, :], degrees=True)
-        # ra-dec radiant angles are measured from +x -> +y, not from +y -> +x
-        radiant_zat[0, :] = 90 - radiant_zat[0, :]
+        radiant_zat = radiant_angles(p_zat_states_radiant[3:, :])
 
         frame_cls = getattr(coords, frame_name)
         sun_radiant = sun_radiant.transform_to(frame_cls())
 
-        results["radiant_obs_" + frame_name] = radiant[:2, :]
-        results["radiant_orbit_" + frame_name] = radiant_zat[:2, :]
+        results["radiant_obs_" + frame_name] = radiant
+        results["radiant_orbit_" + frame_name] = radiant_zat
         results["radiant_sun_" + frame_name] = np.empty((2,), dtype=np.float64)
         if hasattr(sun_radiant, "lon"):
             results["radiant_sun_" + frame_name][0] = sun_radiant.lon.deg
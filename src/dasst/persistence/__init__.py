@@ -0,0 +1,34 @@
+'''Persistence of simulation results
+
+Append-only binary record files with an offset index, pluggable
+converters between objects and bytes and chunked array compression codecs.
+
+'''
+
+from .converters import (
+    Converter,
+    PickleConverter,
+    NumpyConverter,
+    ChainConverter,
+    DictConverter,
+    PERSISTENT_OBJECTS,
+    register_converter,
+    find_converter,
+    get_converter,
+)
+from .codecs import (
+    Codec,
+    ChunkedArray,
+    ChunkedArrayConverter,
+    COMPRESSORS,
+    CHUNK_BYTES,
+)
+from .storage import BinaryStorage, FileSystemBinary, GZipBinary, ChunkedBinary
+from .results import (
+    persistable_result,
+    restore_result,
+    save_results,
+    load_results,
+    save_events,
+    iter_events,
+)
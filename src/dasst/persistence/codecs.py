@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+"""
+Chunk compression codecs
+========================
+
+Arrays saved as `ChunkedArray` are split along their last axis (particles
+for (6, T, N) trajectories) into chunks of about `CHUNK_BYTES` bytes and
+every chunk is compressed on its own, so chunks are compressed and
+decompressed concurrently in a thread pool (zlib and lzma release the GIL).
+
+A `Codec` optionally
+
+* delta encodes the chunk along an axis, e.g. time, on the integer view of
+  the values so that it is lossless also for floats,
+* byte shuffles the values, i.e. stores byte 0 of all values, then byte 1, ...,
+  which puts the slowly varying sign and exponent bytes of smooth data next
+  to each other,
+
+before compressing with one of the `COMPRESSORS`. The codec parameters are
+stored with the array so it can be loaded without knowing them.
+"""
+
+from __future__ import annotations
+import ast
+import lzma
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .converters import Converter, LENGTH, register_converter
+
+
+CHUNK_BYTES = 1 << 22
+"""Default target size of uncompressed chunks"""
+
+COMPRESSORS: Dict[str, Tuple[Callable[[bytes, Optional[int]], bytes], Callable[[bytes], bytes]]] = {
+    "none": (lambda data, level: bytes(data), bytes),
+    "zlib": (
+        lambda data, level: zlib.compress(data, 6 if level is None else level),
+        zlib.decompress,
+    ),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+"""Compress and decompress functions by name"""
+
+
+def shuffle(array: np.ndarray) -> bytes:
+    """Bytes of `array` grouped by their position within the items"""
+    data = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+    return data.reshape(-1, array.dtype.itemsize).T.tobytes()
+
+
+def unshuffle(data: bytes, dtype: np.dtype) -> np.ndarray:
+    """Flat array from bytes produced by `shuffle`"""
+    dtype = np.dtype(dtype)
+    data = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, -1)
+    return np.ascontiguousarray(data.T).view(dtype).reshape(-1)
+
+
+def _integer_view(dtype: np.dtype) -> Optional[np.dtype]:
+    if dtype.kind not in "iuf" or dtype.itemsize not in (1, 2, 4, 8):
+        return None
+    return np.dtype(f"u{dtype.itemsize}").newbyteorder(dtype.byteorder)
+
+
+def delta_encode(array: np.ndarray, axis: int) -> np.ndarray:
+    """Differences along `axis` of the unsigned integer view of `array`, exactly invertible"""
+    ints = np.ascontiguousarray(array).view(_integer_view(array.dtype))
+    return np.diff(ints, axis=axis, prepend=np.zeros_like(np.take(ints, [0], axis=axis)))
+
+
+def delta_decode(array: np.ndarray, axis: int, dtype: np.dtype) -> np.ndarray:
+    """Inverse of `delta_encode`"""
+    return np.cumsum(array, axis=axis, dtype=array.dtype).view(dtype)
+
+
+@dataclass
+class Codec:
+    """Encoding of array chunks.
+
+    :param compression: Name of the compressor in `COMPRESSORS`
+    :param level: Compression level (zlib level or lzma preset), None for the default
+    :param shuffle: Byte shuffle the values before compressing
+    :param delta_axis: Delta encode along this axis, e.g. 1 for the time axis of
+        (6, T, N) states, ignored for arrays that are not integer or float
+    """
+    compression: str = "zlib"
+    level: Optional[int] = None
+    shuffle: bool = True
+    delta_axis: Optional[int] = None
+
+    def __post_init__(self):
+        if self.compression not in COMPRESSORS:
+            raise ValueError(
+                f"Unknown compression {self.compression!r}, use one of {list(COMPRESSORS)}"
+            )
+
+    def _delta(self, dtype: np.dtype, shape: Tuple[int, ...]) -> bool:
+        if self.delta_axis is None or _integer_view(dtype) is None:
+            return False
+        return -len(shape) <= self.delta_axis < len(shape) and shape[self.delta_axis] > 0
+
+    def encode(self, array: np.ndarray) -> bytes:
+        """Compressed bytes of an array chunk"""
+        if self._delta(array.dtype, array.shape):
+            array = delta_encode(array, self.delta_axis)
+        data = shuffle(array) if self.shuffle else np.ascontiguousarray(array).tobytes()
+        return COMPRESSORS[self.compression][0](data, self.level)
+
+    def decode(self, data: bytes, dtype: np.dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        """Array chunk from the bytes of `encode`"""
+        dtype = np.dtype(dtype)
+        stored = _integer_view(dtype) if self._delta(dtype, shape) else dtype
+        data = COMPRESSORS[self.compression][1](data)
+        if self.shuffle:
+            array = unshuffle(data, stored).reshape(shape)
+        else:
+            array = np.frombuffer(data, dtype=stored).reshape(shape)
+        if stored != dtype:
+            array = delta_decode(array, self.delta_axis, dtype)
+        return array
+
+
+class ChunkedArray:
+    """Marks an array to be saved in independently compressed chunks.
+
+    :param array: Numeric array
+    :param codec: Chunk codec, zlib with byte shuffling by default
+    :param chunk_bytes: Target uncompressed size of the chunks
+    :param workers: Compression threads, None for the executor default
+    """
+
+    def __init__(
+        self,
+        array: np.ndarray,
+        codec: Optional[Codec] = None,
+        chunk_bytes: int = CHUNK_BYTES,
+        workers: Optional[int] = None,
+    ) -> None:
+        self.array = np.asarray(array)
+        if self.array.dtype.hasobject:
+            raise TypeError("Object arrays cannot be saved in compressed chunks")
+        self.codec = Codec() if codec is None else codec
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+
+    def chunk_bounds(self) -> List[Tuple[int, int]]:
+        """(start, stop) of the chunks along the last axis"""
+        if self.array.ndim == 0:
+            return [(0, 1)]
+        size = self.array.shape[-1]
+        column = self.array.dtype.itemsize * int(np.prod(self.array.shape[:-1], dtype=np.int64))
+        step = max(1, self.chunk_bytes // max(column, 1))
+        return [(start, min(start + step, size)) for start in range(0, max(size, 1), step)]
+
+
+def _map(function: Callable, items: List[Any], workers: Optional[int]) -> List[Any]:
+    if len(items) < 2 or workers == 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, items))
+
+
+class ChunkedArrayConverter(Converter):
+    """`ChunkedArray` as a header followed by the compressed chunks, loads as a numpy array.
+
+    :param workers: Decompression threads, None for the executor default
+    """
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        self.workers = workers
+
+    def as_buffers(self, obj: ChunkedArray) -> List[Any]:
+        array = obj.array
+        bounds = obj.chunk_bounds()
+        if array.ndim == 0:
+            chunks = [array]
+        else:
+            chunks = [array[..., start:stop] for start, stop in bounds]
+        data = _map(obj.codec.encode, chunks, obj.workers)
+        header = repr(dict(
+            descr=np.lib.format.dtype_to_descr(array.dtype),
+            shape=array.shape,
+            codec=asdict(obj.codec),
+            chunks=[(start, stop, len(part)) for (start, stop), part in zip(bounds, data)],
+        )).encode()
+        return [LENGTH.pack(len(header)), header] + data
+
+    def as_bytes(self, obj: ChunkedArray) -> bytes:
+        return b"".join(bytes(buf) for buf in self.as_buffers(obj))
+
+    def from_bytes(self, bytes_data: bytes) -> np.ndarray:
+        view = memoryview(bytes_data)
+        (size,) = LENGTH.unpack_from(view, 0)
+        pos = LENGTH.size
+        header = ast.literal_eval(bytes(view[pos:pos + size]).decode())
+        pos += size
+        dtype = np.lib.format.descr_to_dtype(header["descr"])
+        shape = tuple(header["shape"])
+        codec = Codec(**header["codec"])
+
+        parts = []
+        for start, stop, length in header["chunks"]:
+            chunk_shape = shape[:-1] + (stop - start,) if shape else ()
+            parts.append((view[pos:pos + length], chunk_shape))
+            pos += length
+        chunks = _map(lambda part: codec.decode(part[0], dtype, part[1]), parts, self.workers)
+
+        if not shape:
+            return chunks[0].reshape(())
+        array = np.empty(shape, dtype=dtype)
+        for (start, stop, _), chunk in zip(header["chunks"], chunks):
+            array[..., start:stop] = chunk
+        return array
+
+
+register_converter(ChunkedArray, ChunkedArrayConverter)
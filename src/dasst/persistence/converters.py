@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+Converters between objects and bytes
+====================================
+
+A `Converter` turns an object into bytes and back. Converters are
+registered per type in `PERSISTENT_OBJECTS` with `register_converter`, an
+object is converted by the converter registered for the first type in its
+method resolution order, so `object` (pickle) is the fallback for every type.
+
+Converters may return any bytes-like object and may return the data as a list
+of buffers with `as_buffers`, which lets `NumpyConverter` write arrays
+without copying them. When loading, converters receive a writable
+`memoryview`, `NumpyConverter` returns arrays that are views of it.
+"""
+
+from __future__ import annotations
+import ast
+import pickle
+import struct
+from typing import Any, Dict, List, Sequence, Tuple, Type
+
+import numpy as np
+
+
+LENGTH = struct.Struct("<Q")
+"""Length prefix of the packed objects of `ChainConverter`"""
+
+
+class Converter:
+    """Converts one type of object to bytes and back"""
+
+    def as_bytes(self, obj: Any) -> bytes:
+        raise NotImplementedError()
+
+    def from_bytes(self, bytes_data: bytes) -> Any:
+        raise NotImplementedError()
+
+    def as_buffers(self, obj: Any) -> List[Any]:
+        """The bytes of `obj` as a list of bytes-like buffers"""
+        return [self.as_bytes(obj)]
+
+
+class PickleConverter(Converter):
+    """Any picklable object, using the highest pickle protocol"""
+
+    def as_bytes(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def from_bytes(self, bytes_data: bytes) -> Any:
+        return pickle.loads(bytes_data)
+
+
+class NumpyConverter(Converter):
+    """Numpy arrays as a small header followed by the raw array memory.
+
+    Object arrays are pickled. Loaded arrays are views of the loaded bytes,
+    no copy is made.
+    """
+
+    HEADER = struct.Struct("<BBBI")
+    """Pickled flag, Fortran order flag, number of dimensions, dtype length"""
+
+    def as_buffers(self, obj: np.ndarray) -> List[Any]:
+        array = np.asarray(obj)
+        if array.dtype.hasobject:
+            data = pickle.dumps(array, protocol=pickle.HIGHEST_PROTOCOL)
+            return [self.HEADER.pack(1, 0, 0, 0), data]
+
+        fortran = array.flags.f_contiguous and not array.flags.c_contiguous
+        order = "F" if fortran else "C"
+        if not (array.flags.c_contiguous or fortran):
+            array = np.ascontiguousarray(array)
+        descr = repr(np.lib.format.dtype_to_descr(array.dtype)).encode()
+        header = self.HEADER.pack(0, int(fortran), array.ndim, len(descr))
+        shape = struct.pack(f"<{array.ndim}Q", *array.shape)
+        data = array.reshape(-1, order=order).view(np.uint8)
+        return [header, descr, shape, memoryview(data)]
+
+    def as_bytes(self, obj: np.ndarray) -> bytes:
+        return b"".join(bytes(buf) for buf in self.as_buffers(obj))
+
+    def from_bytes(self, bytes_data: bytes) -> np.ndarray:
+        view = memoryview(bytes_data)
+        pickled, fortran, ndim, descr_len = self.HEADER.unpack_from(view, 0)
+        pos = self.HEADER.size
+        if pickled:
+            return pickle.loads(view[pos:])
+
+        descr = ast.literal_eval(bytes(view[pos:pos + descr_len]).decode())
+        dtype = np.lib.format.descr_to_dtype(descr)
+        pos += descr_len
+        shape = struct.unpack_from(f"<{ndim}Q", view, pos)
+        pos += 8 * ndim
+        count = int(np.prod(shape, dtype=np.int64))
+        array = np.frombuffer(view, dtype=dtype, count=count, offset=pos)
+        return array.reshape(shape, order="F" if fortran else "C")
+
+
+class ChainConverter(Converter):
+    """Packs a sequence of objects, each with its own converter, into one byte stream.
+
+    :param converters: Converters of the objects used by `as_bytes` and `from_bytes`
+    """
+
+    def __init__(self, converters: Sequence[Converter] | None = None) -> None:
+        self.converters = converters
+
+    def pack_buffers(self, objects: Sequence[Any], converters: Sequence[Converter]) -> List[Any]:
+        if len(objects) != len(converters):
+            raise ValueError(f"Got {len(objects)} objects but {len(converters)} converters")
+        buffers = []
+        for obj, converter in zip(objects, converters):
+            parts = converter.as_buffers(obj)
+            buffers.append(LENGTH.pack(sum(memoryview(part).nbytes for part in parts)))
+            buffers += parts
+        return buffers
+
+    def pack_bytes_stream(self, objects: Sequence[Any], converters: Sequence[Converter]) -> bytes:
+        """Bytes of `objects`, converted with the respective `converters`"""
+        return b"".join(bytes(buf) for buf in self.pack_buffers(objects, converters))
+
+    def unpack_bytes_stream(self, converters: Sequence[Converter], bytes_data: bytes) -> List[Any]:
+        """Objects packed by `pack_bytes_stream` with the same converters"""
+        view = memoryview(bytes_data)
+        objects, pos = [], 0
+        for converter in converters:
+            (size,) = LENGTH.unpack_from(view, pos)
+            pos += LENGTH.size
+            objects.append(converter.from_bytes(view[pos:pos + size]))
+            pos += size
+        return objects
+
+    def as_buffers(self, obj: Sequence[Any]) -> List[Any]:
+        return self.pack_buffers(obj, self.converters)
+
+    def as_bytes(self, obj: Sequence[Any]) -> bytes:
+        return self.pack_bytes_stream(obj, self.converters)
+
+    def from_bytes(self, bytes_data: bytes) -> List[Any]:
+        return self.unpack_bytes_stream(self.converters, bytes_data)
+
+
+class DictConverter(Converter):
+    """Dictionaries with every value converted by its registered converter,
+    e.g. numpy arrays in a result dictionary are stored without pickling.
+    Subclasses of dict are loaded as plain dictionaries."""
+
+    def as_buffers(self, obj: Dict[Any, Any]) -> List[Any]:
+        items = [(key, find_converter(value)) for key, value in obj.items()]
+        layout = [(key, name) for key, (name, _) in items]
+        converters = [PickleConverter()] + [converter for _, (_, converter) in items]
+        return ChainConverter().pack_buffers([layout] + list(obj.values()), converters)
+
+    def as_bytes(self, obj: Dict[Any, Any]) -> bytes:
+        return b"".join(bytes(buf) for buf in self.as_buffers(obj))
+
+    def from_bytes(self, bytes_data: bytes) -> Dict[Any, Any]:
+        view = memoryview(bytes_data)
+        (size,) = LENGTH.unpack_from(view, 0)
+        layout = pickle.loads(view[LENGTH.size:LENGTH.size + size])
+        converters = [PickleConverter()] + [get_converter(name) for _, name in layout]
+        values = ChainConverter().unpack_bytes_stream(converters, view)[1:]
+        return {key: value for (key, _), value in zip(layout, values)}
+
+
+PERSISTENT_OBJECTS: Dict[type, Type[Converter]] = {}
+"""Registered converter class of each persistable type"""
+
+_TYPE_KEYS: Dict[str, type] = {}
+
+
+def type_key(cls: type) -> str:
+    """Name a registered type is stored under"""
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def register_converter(cls: type, converter: Type[Converter]) -> None:
+    """Use `converter` (a `Converter` subclass) for `cls` and its subclasses."""
+    PERSISTENT_OBJECTS[cls] = converter
+    _TYPE_KEYS[type_key(cls)] = cls
+
+
+def find_converter(obj: Any) -> Tuple[str, Converter]:
+    """Type key and converter instance registered for the type of `obj`"""
+    for cls in type(obj).__mro__:
+        if cls in PERSISTENT_OBJECTS:
+            return type_key(cls), PERSISTENT_OBJECTS[cls]()
+    raise TypeError(f"No converter registered for {type(obj)}")
+
+
+def get_converter(key: str) -> Converter:
+    """Converter instance of a stored type key"""
+    if key not in _TYPE_KEYS:
+        raise KeyError(f"No converter registered for stored type {key!r}")
+    return PERSISTENT_OBJECTS[_TYPE_KEYS[key]]()
+
+
+register_converter(object, PickleConverter)
+register_converter(np.ndarray, NumpyConverter)
+register_converter(dict, DictConverter)
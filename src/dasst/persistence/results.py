@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+Incremental persistence of simulation results
+=============================================
+
+Results of `Simulation.propagate`, `Simulation.run` and the chunks of
+`Simulation.run_chunks` are saved as one record each, so a long run can be
+written chunk by chunk as it progresses and read back selectively. The
+live `rebound` propagator is dropped and particle events are stored as an
+event table (see `dasst.events.event_table`) instead of pickled objects.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from ..events import ParticleEvent, event_table, events_from_table
+from .storage import BinaryStorage
+
+
+DEFAULT_EVENTS_CHUNK = 10_000
+"""Default number of events per record of `save_events`"""
+
+
+def persistable_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a simulation result without the live propagator, events as an event table"""
+    out = {key: value for key, value in result.items() if key != "rebound"}
+    if out.get("particle_events") is not None:
+        out["particle_events"] = event_table(out["particle_events"])
+    return out
+
+
+def restore_result(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Result saved by `save_results` with the events as `ParticleEvent` objects again"""
+    if isinstance(record.get("particle_events"), dict):
+        record["particle_events"] = events_from_table(record["particle_events"])
+    return record
+
+
+def save_results(
+    storage: BinaryStorage, results: Iterable[Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """Save every result to `storage` as it is produced and pass it on, e.g.
+
+    .. code-block:: python
+
+        for chunk in save_results(storage, sim.run_chunks(populations)):
+            ...
+
+    """
+    for result in results:
+        storage.save(persistable_result(result))
+        yield result
+
+
+def load_results(
+    storage: BinaryStorage, start: int = 0, stop: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """Iterate over the results saved in records [start, stop)"""
+    for record in storage.iter_records(start, stop):
+        yield restore_result(record)
+
+
+def save_events(
+    storage: BinaryStorage,
+    events: Iterable[ParticleEvent],
+    chunk_size: int = DEFAULT_EVENTS_CHUNK,
+) -> List[int]:
+    """Append events as event tables of at most `chunk_size` events, returns the record indices"""
+    indices, chunk = [], []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) >= chunk_size:
+            indices.append(storage.save(event_table(chunk)))
+            chunk = []
+    if chunk:
+        indices.append(storage.save(event_table(chunk)))
+    return indices
+
+
+def iter_events(
+    storage: BinaryStorage, start: int = 0, stop: Optional[int] = None
+) -> Iterator[ParticleEvent]:
+    """Iterate over the events saved by `save_events` in records [start, stop)"""
+    for table in storage.iter_records(start, stop):
+        yield from events_from_table(table)
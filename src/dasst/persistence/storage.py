@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+"""
+Append-only record files
+========================
+
+Every `save` appends one record to the data file and its byte offset to an
+index file next to it (`<path>.idx`, little-endian uint64 offsets), so any
+record can be read with one seek regardless of how many records there are.
+A record stores the type key of the converter used (see
+`dasst.persistence.converters`) followed by the converted bytes.
+
+`GZipBinary` compresses every record as its own gzip member. The file is
+still a valid (multi-member) gzip file and records can be read individually.
+`ChunkedBinary` instead compresses the numeric arrays of a record in chunks
+with a `Codec` (see `dasst.persistence.codecs`) using a thread pool, which
+is faster and compresses trajectories better.
+If the index is missing or does not match the data file, e.g. after an
+interrupted write, it is rebuilt by scanning the data file and an incomplete
+last record is discarded.
+"""
+
+from __future__ import annotations
+import os
+import gzip
+import zlib
+import struct
+import logging
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .converters import find_converter, get_converter
+from .codecs import Codec, ChunkedArray, CHUNK_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"DSTB"
+"""First bytes of every (uncompressed) record"""
+
+RECORD_HEADER = struct.Struct("<4sHQ")
+"""Magic, length of the type key and length of the converted bytes"""
+
+INDEX_SUFFIX = ".idx"
+"""Suffix of the offset index file"""
+
+
+class BinaryStorage:
+    """Append-only file of converted objects with an offset index.
+
+    :param path: Path of the data file
+    :param append: Keep existing records, otherwise the file is truncated
+    """
+
+    def __init__(self, path: str | Path, append: bool = True) -> None:
+        self.path = Path(path)
+        self.index_path = Path(str(self.path) + INDEX_SUFFIX)
+        if not append or not self.path.exists():
+            self.path.write_bytes(b"")
+            self.index_path.write_bytes(b"")
+            self._offsets: List[int] = []
+        else:
+            self._offsets = self._read_index()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({str(self.path)!r}, records={len(self)})"
+
+    def _encode(self, buffers: Sequence[Any]) -> List[Any]:
+        """Stored form of the buffers of a record"""
+        return list(buffers)
+
+    def _decode(self, data: bytearray) -> bytearray:
+        """Record bytes from their stored form"""
+        return data
+
+    def _scan(self, fh) -> List[Tuple[int, int]]:
+        """(offset, end) of the complete records in the data file"""
+        records = []
+        size = os.fstat(fh.fileno()).st_size
+        offset = 0
+        while offset + RECORD_HEADER.size <= size:
+            fh.seek(offset)
+            magic, key_len, data_len = RECORD_HEADER.unpack(fh.read(RECORD_HEADER.size))
+            end = offset + RECORD_HEADER.size + key_len + data_len
+            if magic != MAGIC or end > size:
+                break
+            records.append((offset, end))
+            offset = end
+        return records
+
+    def _read_index(self) -> List[int]:
+        size = self.path.stat().st_size
+        offsets = []
+        if self.index_path.exists():
+            offsets = np.fromfile(self.index_path, dtype="<u8").tolist()
+        if self._index_valid(offsets, size):
+            return offsets
+
+        logger.warning(f"Rebuilding the record index of {self.path}")
+        with open(self.path, "rb") as fh:
+            records = self._scan(fh)
+        end = records[-1][1] if records else 0
+        if end < size:
+            logger.warning(f"Discarding {size - end} bytes of an incomplete record in {self.path}")
+            os.truncate(self.path, end)
+        offsets = [start for start, _ in records]
+        np.asarray(offsets, dtype="<u8").tofile(self.index_path)
+        return offsets
+
+    def _index_valid(self, offsets: List[int], size: int) -> bool:
+        if not offsets:
+            return size == 0
+        if offsets[0] != 0 or any(b <= a for a, b in zip(offsets[:-1], offsets[1:])):
+            return False
+        if offsets[-1] >= size:
+            return False
+        with open(self.path, "rb") as fh:
+            fh.seek(offsets[-1])
+            return self._scan_last(fh, offsets[-1], size)
+
+    def _scan_last(self, fh, offset: int, size: int) -> bool:
+        """True if the record at `offset` ends exactly at the end of the file"""
+        header = fh.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return False
+        magic, key_len, data_len = RECORD_HEADER.unpack(header)
+        return magic == MAGIC and offset + RECORD_HEADER.size + key_len + data_len == size
+
+    def save(self, obj: Any) -> int:
+        """Append `obj` as a new record, returns its record index"""
+        key, converter = find_converter(obj)
+        key = key.encode()
+        buffers = converter.as_buffers(obj)
+        length = sum(memoryview(buf).nbytes for buf in buffers)
+        buffers = [RECORD_HEADER.pack(MAGIC, len(key), length), key] + buffers
+
+        with open(self.path, "ab") as fh:
+            offset = fh.tell()
+            for buf in self._encode(buffers):
+                fh.write(buf)
+        with open(self.index_path, "ab") as fh:
+            fh.write(struct.pack("<Q", offset))
+        self._offsets.append(offset)
+        logger.debug(f"{self.path}: saved record {len(self._offsets) - 1} ({key.decode()})")
+        return len(self._offsets) - 1
+
+    def _record(self, fh, index: int, size: int) -> Any:
+        start = self._offsets[index]
+        end = self._offsets[index + 1] if index + 1 < len(self._offsets) else size
+        data = bytearray(end - start)
+        fh.seek(start)
+        fh.readinto(data)
+        view = memoryview(self._decode(data))
+        magic, key_len, data_len = RECORD_HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise IOError(f"Record {index} of {self.path} is corrupt")
+        pos = RECORD_HEADER.size
+        key = bytes(view[pos:pos + key_len]).decode()
+        pos += key_len
+        return get_converter(key).from_bytes(view[pos:pos + data_len])
+
+    def _check_index(self, index: int) -> int:
+        num = len(self._offsets)
+        if index < -num or index >= num:
+            raise IndexError(f"Record index {index} out of range for {num} records")
+        return index % num
+
+    def load(self, index: int | Sequence[int] = -1) -> Any:
+        """Load one record, or a list of records for a sequence of indices.
+
+        The default loads the last saved record.
+        """
+        many = not isinstance(index, (int, np.integer))
+        indices = [self._check_index(int(i)) for i in (index if many else [index])]
+        with open(self.path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            objects = [self._record(fh, i, size) for i in indices]
+        return objects if many else objects[0]
+
+    def iter_records(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Any]:
+        """Iterate over the records with index in [start, stop)"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        with open(self.path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            for index in range(start, stop):
+                yield self._record(fh, index, size)
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.iter_records()
+
+
+class FileSystemBinary(BinaryStorage):
+    """Uncompressed record file, see `BinaryStorage`"""
+
+
+class GZipBinary(BinaryStorage):
+    """Record file where every record is a separate gzip member.
+
+    :param level: Compression level 0-9
+    """
+
+    def __init__(self, path: str | Path, level: int = 6, append: bool = True) -> None:
+        self.level = level
+        super().__init__(path, append=append)
+
+    def _encode(self, buffers: Sequence[Any]) -> List[Any]:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        out = [compressor.compress(buf) for buf in buffers]
+        out.append(compressor.flush())
+        return out
+
+    def _decode(self, data: bytearray) -> bytearray:
+        return bytearray(gzip.decompress(data))
+
+    def _scan(self, fh) -> List[Tuple[int, int]]:
+        records = []
+        fh.seek(0)
+        offset, consumed, pending = 0, 0, b""
+        decompressor = zlib.decompressobj(31)
+        while True:
+            chunk = pending or fh.read(1 << 20)
+            pending = b""
+            if not chunk:
+                break
+            try:
+                decompressor.decompress(chunk)
+            except zlib.error:
+                break
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                end = offset + consumed + len(chunk) - len(pending)
+                records.append((offset, end))
+                offset, consumed = end, 0
+                decompressor = zlib.decompressobj(31)
+            else:
+                consumed += len(chunk)
+        return records
+
+    def _scan_last(self, fh, offset: int, size: int) -> bool:
+        decompressor = zlib.decompressobj(31)
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            try:
+                decompressor.decompress(chunk)
+            except zlib.error:
+                return False
+            if decompressor.eof:
+                return not decompressor.unused_data and fh.read(1) == b""
+        return False
+
+
+class ChunkedBinary(BinaryStorage):
+    """Record file where numeric arrays, also as values of dictionaries,
+    are saved as `ChunkedArray` with the given codec.
+
+    :param codec: Chunk codec, e.g. `Codec("lzma", delta_axis=1)` for (6, T, N) states
+    :param chunk_bytes: Target uncompressed size of the chunks
+    :param workers: Compression threads, None for the executor default
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        codec: Optional[Codec] = None,
+        chunk_bytes: int = CHUNK_BYTES,
+        workers: Optional[int] = None,
+        append: bool = True,
+    ) -> None:
+        self.codec = Codec() if codec is None else codec
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        super().__init__(path, append=append)
+
+    def _wrap(self, obj: Any) -> Any:
+        if isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+            return ChunkedArray(obj, self.codec, chunk_bytes=self.chunk_bytes, workers=self.workers)
+        if isinstance(obj, dict):
+            return {key: self._wrap(value) for key, value in obj.items()}
+        return obj
+
+    def save(self, obj: Any) -> int:
+        return super().save(self._wrap(obj))
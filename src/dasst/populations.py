@@ -1,12 +1,19 @@
 #!/usr/bin/env python
 
 from __future__ import annotations
+import json
 import tomllib
 import numpy as np
 from pathlib import Path
 from dataclasses import dataclass
 from dasst.types import NDArray_6xN
-from typing import Dict, Any, Optional, Literal, Tuple
+from typing import Dict, Any, Optional, Literal, Tuple, Iterator, List
+
+DEFAULT_CHUNK_SIZE = 100_000
+"""Default number of particles per chunk when iterating over a population"""
+
+POPULATION_MANIFEST = "manifest.json"
+"""Name of the manifest file of a population directory"""
 
 
 @dataclass
@@ -29,7 +36,7 @@ class PopulationConfig:
     mu: Optional[np.ndarray] = None # shape (6,)
     cov: Optional[np.ndarray] = None # shape (6,6)
 
-    # File based, path to .npy 
+    # File based, path to .npy or to a population directory with a manifest
     states_file: Optional[str] = None 
 
     # Stream mode birth-time handling
@@ -37,6 +44,9 @@ class PopulationConfig:
     birth_times: Optional[np.ndarray] = None # Array or birth times?
     birth_times_file: Optional[str] = None # Or given by a file?
 
+    # Number of particles generated/read at a time by PopulationSource
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+
     @classmethod
     def from_toml(cls, path: str | Path) -> "PopulationConfig":
         with open(path, "rb") as fh:
@@ -61,6 +71,7 @@ class PopulationConfig:
             frame=frame,
             mode=mode,
             source=source,
+            chunk_size=int(pop_cfg.get("chunk_size", DEFAULT_CHUNK_SIZE)),
         )
 
         # We generate the particles based on our probability function
@@ -85,6 +96,12 @@ class PopulationConfig:
             cfg.states_file = pop_cfg["states_file"]
             cfg.birth_time  = float(pop_cfg.get("birth_time", 0.0))
 
+            # Population directories may carry their frame in the manifest
+            if "frame" not in pop_cfg:
+                files_frame = PopulationFiles(cfg.states_file).frame
+                if files_frame is not None:
+                    cfg.frame = files_frame
+
         cfg.birth_time = float(pop_cfg.get("birth_time", 0.0))
 
         if "birth_times" in pop_cfg:
@@ -95,7 +112,204 @@ class PopulationConfig:
             
         return cfg
 
-   
+
+def shard_bounds(n: int, rank: int, n_shards: int) -> Tuple[int, int]:
+    '''
+    Index range [start, end) of shard `rank` when splitting `n` items into
+    `n_shards` contiguous shards of (almost) equal size.
+    '''
+    if n_shards < 1 or rank < 0 or rank >= n_shards:
+        raise ValueError(f"Invalid shard {rank} of {n_shards}")
+    size, rest = divmod(n, n_shards)
+    start = rank * size + min(rank, rest)
+    end = start + size + (1 if rank < rest else 0)
+    return start, end
+
+
+class PopulationFiles:
+    '''
+    Memory-mapped particle states stored on disk, either as a single (6, N)
+    `.npy` file or as a directory of `.npy` parts described by a manifest.
+
+    The directory manifest (`manifest.json`) has the format
+
+        {
+            "frame": "HCRS",
+            "dtype": "float64",
+            "parts": [
+                {"states": "states_000.npy", "birth_times": "birth_times_000.npy", "count": 1000},
+                ...
+            ]
+        }
+
+    where `frame` and the per-part `birth_times` are optional. Files are only
+    opened as memory maps and reads that fall inside a single part are
+    zero-copy views, so every process can open the population and read only
+    its own shard.
+    '''
+
+    def __init__(
+        self,
+        path: str | Path,
+        birth_times_path: Optional[str | Path] = None,
+    ) -> None:
+        path = Path(path)
+        if path.is_dir():
+            path = path / POPULATION_MANIFEST
+
+        self.path = path
+        self.frame: Optional[str] = None
+
+        if path.suffix == ".json":
+            with open(path, "r") as fh:
+                manifest = json.load(fh)
+            root = path.parent
+            self.frame = manifest.get("frame")
+            dtype = np.dtype(manifest.get("dtype", "float64"))
+            parts = manifest.get("parts", [])
+            if not parts:
+                raise ValueError(f"Population manifest {path} lists no parts.")
+
+            self._states = []
+            self._birth_times = []
+            counts = []
+            for part in parts:
+                states = np.load(root / part["states"], mmap_mode="r")
+                count = int(part.get("count", states.shape[-1]))
+                if states.ndim != 2 or states.shape != (6, count):
+                    raise ValueError(
+                        f"Part {part['states']!r} must be (6, {count}), got {states.shape}"
+                    )
+                if states.dtype != dtype:
+                    raise ValueError(
+                        f"Part {part['states']!r} has dtype {states.dtype}, "
+                        f"manifest says {dtype}"
+                    )
+                self._states.append(states)
+                counts.append(count)
+
+                if "birth_times" in part:
+                    birth_times = np.load(root / part["birth_times"], mmap_mode="r")
+                    if birth_times.shape != (count,):
+                        raise ValueError(
+                            f"Part {part['birth_times']!r} must be ({count},), "
+                            f"got {birth_times.shape}"
+                        )
+                    self._birth_times.append(birth_times)
+
+            if self._birth_times and len(self._birth_times) != len(self._states):
+                raise ValueError("Either all or no parts of a population can have birth_times.")
+        else:
+            states = np.load(path, mmap_mode="r")  # expecting (6, N)
+            if states.ndim != 2 or states.shape[0] != 6:
+                raise ValueError(f"States must be (6, N), got {states.shape}")
+            self._states = [states]
+            self._birth_times = []
+            counts = [states.shape[1]]
+
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        if birth_times_path is not None:
+            birth_times = np.load(birth_times_path, mmap_mode="r")
+            if birth_times.ndim != 1:
+                raise ValueError(f"birth_times must be (N,), got {birth_times.shape}")
+            # Split into the same parts as the states to keep reads zero-copy
+            self._birth_times = [
+                birth_times[start:end] for start, end in zip(self.offsets[:-1], self.offsets[1:])
+            ]
+            if birth_times.shape != (self.n_particles,):
+                raise ValueError(
+                    f"birth_times must have shape ({self.n_particles},), "
+                    f"got {birth_times.shape}"
+                )
+
+    @property
+    def n_particles(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def n_parts(self) -> int:
+        return len(self._states)
+
+    @property
+    def has_birth_times(self) -> bool:
+        return len(self._birth_times) > 0
+
+    def __len__(self) -> int:
+        return self.n_particles
+
+    def _read(self, arrays, start: int, end: int) -> np.ndarray:
+        start = max(int(start), 0)
+        end = min(int(end), self.n_particles)
+        if end <= start:
+            return arrays[0][..., 0:0]
+
+        first = int(np.searchsorted(self.offsets, start, side="right")) - 1
+        last = int(np.searchsorted(self.offsets, end, side="left")) - 1
+        blocks = [
+            arrays[k][..., max(start - self.offsets[k], 0):end - self.offsets[k]]
+            for k in range(first, last + 1)
+        ]
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.concatenate(blocks, axis=-1)
+
+    def read_states(self, start: int, end: int) -> NDArray_6xN:
+        '''States of particles [start, end), a view if inside a single part.'''
+        return self._read(self._states, start, end)
+
+    def read_birth_times(self, start: int, end: int) -> Optional[np.ndarray]:
+        '''Birth times of particles [start, end) or None if the files have none.'''
+        if not self.has_birth_times:
+            return None
+        return self._read(self._birth_times, start, end)
+
+    def shard(self, rank: int, n_shards: int) -> Tuple[NDArray_6xN, Optional[np.ndarray]]:
+        '''States and birth times of shard `rank` out of `n_shards`.'''
+        start, end = shard_bounds(self.n_particles, rank, n_shards)
+        return self.read_states(start, end), self.read_birth_times(start, end)
+
+
+def save_population_directory(
+    path: str | Path,
+    states: NDArray_6xN,
+    birth_times: Optional[np.ndarray] = None,
+    frame: Optional[str] = None,
+    part_size: int = DEFAULT_CHUNK_SIZE,
+) -> Path:
+    '''
+    Write (6, N) states (and optional (N,) birth times) as a population
+    directory of `.npy` parts with a manifest, see `PopulationFiles`.
+    '''
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    states = np.asarray(states)
+    if states.ndim != 2 or states.shape[0] != 6:
+        raise ValueError(f"States must be (6, N), got {states.shape}")
+    n = states.shape[1]
+    if birth_times is not None:
+        birth_times = np.asarray(birth_times, dtype=float)
+        if birth_times.shape != (n,):
+            raise ValueError(f"birth_times must have shape ({n},), got {birth_times.shape}")
+
+    parts = []
+    for index, start in enumerate(range(0, max(n, 1), part_size)):
+        end = min(start + part_size, n)
+        part = dict(states=f"states_{index:03d}.npy", count=end - start)
+        np.save(path / part["states"], np.ascontiguousarray(states[:, start:end]))
+        if birth_times is not None:
+            part["birth_times"] = f"birth_times_{index:03d}.npy"
+            np.save(path / part["birth_times"], birth_times[start:end])
+        parts.append(part)
+
+    manifest: Dict[str, Any] = dict(dtype=str(states.dtype), parts=parts)
+    if frame is not None:
+        manifest["frame"] = frame
+    with open(path / POPULATION_MANIFEST, "w") as fh:
+        json.dump(manifest, fh, indent=2)
+    return path
+
+
 def realise_population(
     pop_cfg: PopulationConfig,
     rng: np.random.Generator,
@@ -117,6 +331,7 @@ def realise_population(
     if pop_cfg.mode not in ("batch", "stream"):
         raise ValueError(f"Unknown population mode {pop_cfg.mode!r}")
     
+    files_birth_times = None
     if pop_cfg.source == "distribution":
         if pop_cfg.dist_type == "normal":
             mu  = pop_cfg.mu
@@ -131,14 +346,17 @@ def realise_population(
     elif pop_cfg.source == "file":
         if pop_cfg.states_file is None:
             raise ValueError("states_file must be set for source='file'")
-        states = np.load(pop_cfg.states_file)  # expecting (6, N)
-        if states.shape[0] != 6:
-            raise ValueError(f"States must be (6, N), got {states.shape}")
+        files = PopulationFiles(pop_cfg.states_file, pop_cfg.birth_times_file)
+        states = files.read_states(0, len(files))  # (6, N)
+        files_birth_times = files.read_birth_times(0, len(files))
     
     n = states.shape[1] 
 
-    if pop_cfg.birth_times_file is not None:
-        birth_times = np.load(pop_cfg.birth_times_file).astype(float)
+    if files_birth_times is not None:
+        birth_times = np.asarray(files_birth_times, dtype=float)
+
+    elif pop_cfg.birth_times_file is not None:
+        birth_times = np.load(pop_cfg.birth_times_file, mmap_mode="r").astype(float)
     
     elif pop_cfg.birth_times is not None:
         birth_times = np.asarray(pop_cfg.birth_times)
@@ -170,3 +388,274 @@ def realise_population(
         birth_time=pop_cfg.birth_time,
     )
     return states, birth_times, meta
+
+
+def chunk_seed(seed: np.random.SeedSequence, index: int) -> np.random.SeedSequence:
+    '''
+    Seed sequence of chunk number `index` of a population.
+
+    This is identical to `seed.spawn(index + 1)[index]` on a fresh SeedSequence,
+    but does not depend on how many children have been spawned before, so any
+    chunk can be regenerated independently (e.g. by a different worker).
+    '''
+    return np.random.SeedSequence(
+        entropy=seed.entropy,
+        spawn_key=tuple(seed.spawn_key) + (int(index),),
+        pool_size=seed.pool_size,
+    )
+
+
+class PopulationSource:
+    '''
+    Lazy, chunked view of the particles of a population.
+
+    Instead of materialising all N states at once (see `realise_population`)
+    the population is produced as an iterator of `(states, birth_times)` blocks
+    of shape (6, chunk) and (chunk,). Distribution sources draw every chunk
+    from its own RNG stream derived from `seed` so the realised population is
+    reproducible and independent of the order chunks are requested in. File
+    sources are memory-mapped and sliced, so no copy of the full file is made.
+    '''
+
+    def __init__(
+        self,
+        pop_cfg: PopulationConfig,
+        seed: Optional[int | np.random.SeedSequence] = None,
+        chunk_size: Optional[int] = None,
+    ) -> None:
+        if pop_cfg.source not in ("distribution", "file"):
+            raise ValueError(f"Unknown source {pop_cfg.source!r}")
+
+        if pop_cfg.mode not in ("batch", "stream"):
+            raise ValueError(f"Unknown population mode {pop_cfg.mode!r}")
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+
+        self.config = pop_cfg
+        self.seed = seed
+        self.chunk_size = int(chunk_size or pop_cfg.chunk_size)
+        if self.chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got {self.chunk_size}")
+
+        self.files: Optional[PopulationFiles] = None
+        self._birth_times = None
+        if pop_cfg.source == "distribution":
+            if pop_cfg.dist_type != "normal":
+                raise ValueError(f"Unsupported dist_type {pop_cfg.dist_type!r}")
+            if pop_cfg.mu is None or pop_cfg.cov is None or pop_cfg.n_particles is None:
+                raise ValueError("PopulationConfig missing mu/cov/n_particles.")
+            self.n_particles = int(pop_cfg.n_particles)
+            if pop_cfg.birth_times_file is not None:
+                self._birth_times = np.load(pop_cfg.birth_times_file, mmap_mode="r")
+        else:
+            if pop_cfg.states_file is None:
+                raise ValueError("states_file must be set for source='file'")
+            self.files = PopulationFiles(pop_cfg.states_file, pop_cfg.birth_times_file)
+            self.n_particles = self.files.n_particles
+
+        n = self.n_particles
+        if self._birth_times is None and pop_cfg.birth_times is not None:
+            if self.files is None or not self.files.has_birth_times:
+                self._birth_times = np.asarray(pop_cfg.birth_times, dtype=float)
+
+        if self._birth_times is not None and self._birth_times.shape != (n,):
+            raise ValueError(
+                f"birth_times must have shape ({n},), got {self._birth_times.shape}"
+            )
+
+    def __len__(self) -> int:
+        return self.n_particles
+
+    @property
+    def n_chunks(self) -> int:
+        return -(-self.n_particles // self.chunk_size)
+
+    def chunk_bounds(self, index: int) -> Tuple[int, int]:
+        '''Global particle index range [start, end) of chunk number `index`.'''
+        if index < 0 or index >= self.n_chunks:
+            raise IndexError(f"Chunk index {index} out of range [0, {self.n_chunks})")
+        start = index * self.chunk_size
+        return start, min(start + self.chunk_size, self.n_particles)
+
+    def shard_chunks(self, rank: int, n_shards: int) -> range:
+        '''Chunk indices assigned to process `rank` out of `n_shards`.'''
+        return range(*shard_bounds(self.n_chunks, rank, n_shards))
+
+    def _chunk_states(self, index: int) -> NDArray_6xN:
+        start, end = self.chunk_bounds(index)
+        if self.files is not None:
+            return self.files.read_states(start, end)
+
+        rng = np.random.default_rng(chunk_seed(self.seed, index))
+        samples = rng.multivariate_normal(
+            mean=self.config.mu, cov=self.config.cov, size=end - start
+        )  # (chunk,6)
+        return samples.T
+
+    def _chunk_birth_times(self, index: int) -> np.ndarray:
+        start, end = self.chunk_bounds(index)
+        if self.files is not None and self.files.has_birth_times:
+            birth_times = self.files.read_birth_times(start, end)
+            first = self.files.read_birth_times(0, 1)[0]
+        elif self._birth_times is not None:
+            birth_times = self._birth_times[start:end]
+            first = self._birth_times[0]
+        else:
+            return np.full(end - start, float(self.config.birth_time), dtype=float)
+        birth_times = np.asarray(birth_times, dtype=float)
+
+        if not np.all(np.isfinite(birth_times)):
+            raise ValueError("birth_times must be all finite.")
+
+        if self.config.mode == "batch":
+            if not np.allclose(birth_times, float(first)):
+                raise ValueError(
+                    "Batch mode needs to have all particles with the same birth time."
+                )
+        return birth_times
+
+    def chunk(self, index: int) -> Tuple[NDArray_6xN, np.ndarray]:
+        '''Realise chunk number `index` as (6, chunk) states and (chunk,) birth times.'''
+        return self._chunk_states(index), self._chunk_birth_times(index)
+
+    def chunks(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[Tuple[NDArray_6xN, np.ndarray]]:
+        '''Iterate over the chunks with index in [start, stop).'''
+        stop = self.n_chunks if stop is None else min(stop, self.n_chunks)
+        for index in range(start, stop):
+            yield self.chunk(index)
+
+    def __iter__(self) -> Iterator[Tuple[NDArray_6xN, np.ndarray]]:
+        return self.chunks()
+
+    def meta(self) -> Dict[str, Any]:
+        return dict(
+            name=self.config.name,
+            frame=self.config.frame,
+            birth_time=self.config.birth_time,
+            n_particles=self.n_particles,
+            chunk_size=self.chunk_size,
+        )
+
+
+class PopulationIndex:
+    '''
+    Compact mapping between particle hashes and the populations they belong to.
+
+    Instead of one dictionary per particle the index is stored as NumPy arrays
+    of hash, population id and local index (position inside its population),
+    ordered by global index. Population names are kept in a small table that
+    the population ids refer to. Lookups accept any number of hashes at once
+    and are done with `np.searchsorted`.
+    '''
+
+    def __init__(
+        self,
+        hashes: np.ndarray,
+        population_ids: np.ndarray,
+        local_index: np.ndarray,
+        names: List[str],
+    ) -> None:
+        self.hashes = np.asarray(hashes, dtype=np.int64)
+        self.population_ids = np.asarray(population_ids, dtype=np.int32)
+        self.local_index = np.asarray(local_index, dtype=np.int64)
+        self.names = list(names)
+
+        n = self.hashes.shape[0]
+        if self.population_ids.shape != (n,) or self.local_index.shape != (n,):
+            raise ValueError("hashes, population_ids and local_index must have equal shape.")
+
+        if n > 1 and np.all(self.hashes[1:] > self.hashes[:-1]):
+            self._sorter = None
+        else:
+            self._sorter = np.argsort(self.hashes, kind="stable")
+            sorted_hashes = self.hashes[self._sorter]
+            if n > 1 and np.any(sorted_hashes[1:] == sorted_hashes[:-1]):
+                raise ValueError("Particle hashes must be unique.")
+
+    @classmethod
+    def from_sizes(
+        cls,
+        names: List[str],
+        sizes: List[int],
+        hashes: np.ndarray,
+    ) -> "PopulationIndex":
+        '''Index of populations stored one after the other in global order.'''
+        sizes = np.asarray(sizes, dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        population_ids = np.repeat(np.arange(len(names), dtype=np.int32), sizes)
+        local_index = np.arange(int(sizes.sum()), dtype=np.int64) - np.repeat(starts, sizes)
+        return cls(hashes, population_ids, local_index, names)
+
+    def __len__(self) -> int:
+        return self.hashes.shape[0]
+
+    def population_id(self, name: str) -> int:
+        return self.names.index(name)
+
+    def find(self, hashes: np.ndarray) -> np.ndarray:
+        '''Global index of each hash, -1 for hashes not in the index.'''
+        hashes = np.asarray(hashes, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(hashes.shape, -1, dtype=np.int64)
+
+        pos = np.searchsorted(self.hashes, hashes, sorter=self._sorter)
+        pos = np.clip(pos, 0, len(self) - 1)
+        if self._sorter is not None:
+            pos = self._sorter[pos]
+        return np.where(self.hashes[pos] == hashes, pos, -1).astype(np.int64)
+
+    def lookup(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Population id, local index and global index of each hash. Unknown hashes
+        get -1 in all three outputs.
+        '''
+        global_index = self.find(hashes)
+        if len(self) == 0:
+            return global_index.astype(np.int32), global_index.copy(), global_index
+        found = global_index >= 0
+        population_ids = np.where(found, self.population_ids[global_index], -1)
+        local_index = np.where(found, self.local_index[global_index], -1)
+        return population_ids.astype(np.int32), local_index, global_index
+
+    def population_names(self, hashes: np.ndarray) -> np.ndarray:
+        '''Population name of each hash, None for unknown hashes.'''
+        population_ids, _, _ = self.lookup(hashes)
+        table = np.array(self.names + [None], dtype=object)
+        return table[population_ids]
+
+    def members(self, name: str) -> np.ndarray:
+        '''Global indices of the particles in a population.'''
+        return np.flatnonzero(self.population_ids == self.population_id(name))
+
+    def join_events(self, events: List[Any]) -> Dict[str, np.ndarray]:
+        '''
+        Join particle events (anything with a `particle_hash`) to their
+        populations. Returns columns aligned with the list of events.
+        '''
+        hashes = np.fromiter(
+            (event.particle_hash for event in events), dtype=np.int64, count=len(events)
+        )
+        population_ids, local_index, global_index = self.lookup(hashes)
+        return dict(
+            particle_hash=hashes,
+            population_id=population_ids,
+            local_index=local_index,
+            global_index=global_index,
+        )
+
+    def __contains__(self, particle_hash: int) -> bool:
+        return bool(self.find(np.array([particle_hash]))[0] >= 0)
+
+    def __getitem__(self, particle_hash: int) -> Dict[str, Any]:
+        '''Single hash lookup with the same fields as the former per-particle dicts.'''
+        population_ids, local_index, global_index = self.lookup(np.array([particle_hash]))
+        if global_index[0] < 0:
+            raise KeyError(particle_hash)
+        return dict(
+            population=self.names[population_ids[0]],
+            local_index=int(local_index[0]),
+            global_index=int(global_index[0]),
+        )
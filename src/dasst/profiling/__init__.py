@@ -0,0 +1,45 @@
+'''Profiling and debugging tools
+
+Execution time records of instrumented functions and code blocks, memory
+allocation profiles, logger configuration and debugging decorators. The
+propagation stages of `dasst.propagators.Rebound` and `dasst.simulation`
+are instrumented, see `EXECUTION_TIMES`, `Rebound.metrics` and the
+`profile` and `metrics` entries of the `Simulation.run` results.
+
+'''
+
+from .timing import (
+    TimeRecord,
+    EXECUTION_TIMES,
+    set_profiling,
+    profiling_enabled,
+    reset_execution_times,
+    add_execution_time,
+    record_execution_time,
+    execution_timer,
+    collect_execution_times,
+    format_time_record,
+)
+from .memory import (
+    MEMORY_SNAPSHOTS,
+    ProfileMemory,
+    record_memory_usage,
+    format_snapshot,
+    format_bytes,
+)
+from .loggers import (
+    LEVELS,
+    LOGGERS,
+    register_logger,
+    set_loggers,
+    function_log_call,
+)
+from .metrics import (
+    STAGES,
+    RunMetrics,
+    run_metrics,
+    peak_rss,
+    write_metrics_jsonl,
+    read_metrics_jsonl,
+)
+from . import debugger
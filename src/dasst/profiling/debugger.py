@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""Decorators for debugging failing functions"""
+
+from __future__ import annotations
+import pdb
+import sys
+import logging
+import functools
+import traceback
+from typing import Any, Callable, Optional, Type
+
+from .loggers import get_level
+
+
+def try_wrapper(
+    logger: Optional[logging.Logger] = None,
+    level: str | int = logging.ERROR,
+    exceptions: Type[BaseException] | tuple = Exception,
+    default: Any = None,
+) -> Callable[[Callable], Callable]:
+    """Decorator logging `exceptions` raised by the function with their
+    traceback and returning `default` instead of raising.
+
+    :param logger: Logger to use, the `dasst` logger by default
+    """
+    logger = logging.getLogger("dasst") if logger is None else logger
+    level = get_level(level)
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except exceptions:
+                logger.log(level, f"{func.__qualname__} failed:\n{traceback.format_exc()}")
+                return default
+        return wrapper
+    return decorator
+
+
+def pdb_try_wrapper(*exceptions: Type[BaseException]) -> Callable[[Callable], Callable]:
+    """Decorator starting a post-mortem `pdb` session when the function raises
+    one of `exceptions` (any `Exception` if none are given), the exception is
+    raised again when the session ends."""
+    exceptions = exceptions or (Exception,)
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except exceptions:
+                traceback.print_exc()
+                pdb.post_mortem(sys.exc_info()[2])
+                raise
+        return wrapper
+    return decorator
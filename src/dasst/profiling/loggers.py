@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""
+Loggers
+=======
+
+Loggers created with `register_logger` share one configuration, which
+`set_loggers` changes for all of them at once together with the `dasst`
+package logger. `function_log_call` logs calls of a function with a message
+formatted from its arguments.
+"""
+
+from __future__ import annotations
+import re
+import time
+import inspect
+import logging
+import functools
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+ALWAYS = 100
+"""Level of messages that are logged regardless of the configured level"""
+
+logging.addLevelName(ALWAYS, "ALWAYS")
+
+LEVELS: Dict[str, int] = dict(
+    always=ALWAYS,
+    critical=logging.CRITICAL,
+    error=logging.ERROR,
+    warning=logging.WARNING,
+    info=logging.INFO,
+    debug=logging.DEBUG,
+)
+"""Level names accepted by `set_loggers`, `register_logger` and `function_log_call`"""
+
+LOG_FORMAT = "%(asctime)s %(levelname)-8s %(name)s: %(message)s"
+
+LOGGERS: Dict[str, logging.Logger] = {}
+"""All registered loggers by name"""
+
+_SETTINGS: Dict[str, Any] = dict(level=logging.INFO, logfile=None)
+
+
+def get_level(level: str | int) -> int:
+    """Numeric level of a level name in `LEVELS` or a number"""
+    if isinstance(level, str):
+        if level.lower() not in LEVELS:
+            raise ValueError(f"Unknown log level {level!r}, use one of {list(LEVELS)}")
+        return LEVELS[level.lower()]
+    return int(level)
+
+
+def _configure(logger: logging.Logger, level: int) -> None:
+    for handler in [h for h in logger.handlers if getattr(h, "_dasst_handler", False)]:
+        logger.removeHandler(handler)
+        handler.close()
+
+    handlers = [logging.StreamHandler()]
+    if _SETTINGS["logfile"] is not None:
+        handlers.append(logging.FileHandler(_SETTINGS["logfile"]))
+    for handler in handlers:
+        handler._dasst_handler = True
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def register_logger(name: str, level: Optional[str | int] = None) -> logging.Logger:
+    """Logger `name` configured by `set_loggers`, with its own level if given"""
+    logger = logging.getLogger(name)
+    LOGGERS[name] = logger
+    _configure(logger, _SETTINGS["level"] if level is None else get_level(level))
+    return logger
+
+
+def set_loggers(
+    level: str | int = "info",
+    logfile: Optional[str | Path] = None,
+    package: bool = True,
+) -> None:
+    """Configure all registered loggers.
+
+    :param level: Level name or number
+    :param logfile: Also log to this file
+    :param package: Also configure the `dasst` package logger
+    """
+    _SETTINGS["level"] = get_level(level)
+    _SETTINGS["logfile"] = logfile
+    if package and "dasst" not in LOGGERS:
+        LOGGERS["dasst"] = logging.getLogger("dasst")
+    for logger in LOGGERS.values():
+        _configure(logger, _SETTINGS["level"])
+
+
+_FIELD = re.compile(r"\{([^{}]+)\}")
+
+
+def _message_formatter(message: str, func: Callable) -> Callable[..., str]:
+    """Formats `{name}`, `{index}` and `{index|name}` fields of `message` from call arguments"""
+    signature = inspect.signature(func)
+
+    def lookup(args, arguments, field):
+        for alternative in field.split("|"):
+            alternative = alternative.strip()
+            if alternative.isdigit() and int(alternative) < len(args):
+                return str(args[int(alternative)])
+            if alternative in arguments:
+                return str(arguments[alternative])
+        return "{" + field + "}"
+
+    def formatter(*args, **kwargs) -> str:
+        try:
+            bound = signature.bind(*args, **kwargs)
+        except TypeError:
+            return message
+        bound.apply_defaults()
+        return _FIELD.sub(
+            lambda match: lookup(bound.args, bound.arguments, match.group(1)), message
+        )
+
+    return formatter
+
+
+def function_log_call(
+    message: str,
+    logger: Optional[logging.Logger] = None,
+    level: str | int = "info",
+) -> Callable[[Callable], Callable]:
+    """Decorator logging `message` when the function is called and when it returns.
+
+    Fields in braces are replaced by arguments of the call, `{0}` by the first
+    positional argument, `{num}` by the argument `num` and `{0|num}` by
+    whichever is given.
+
+    :param logger: Logger to use, the `dasst` logger by default
+    :param level: Level name or number, "always" logs regardless of the logger level
+    """
+    logger = logging.getLogger("dasst") if logger is None else logger
+    level = get_level(level)
+
+    def decorator(func: Callable) -> Callable:
+        formatter = _message_formatter(message, func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not logger.isEnabledFor(level):
+                return func(*args, **kwargs)
+            text = formatter(*args, **kwargs)
+            logger.log(level, f"{text}: started")
+            start = time.perf_counter()
+            ret = func(*args, **kwargs)
+            logger.log(level, f"{text}: done in {time.perf_counter() - start:.3f} s")
+            return ret
+        return wrapper
+    return decorator
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+Memory usage profiling
+======================
+
+Memory allocations are traced with `tracemalloc`, which is only running
+while a profiled function or `ProfileMemory` object is being profiled since
+tracing slows down every allocation. A profile is the list of
+`tracemalloc.StatisticDiff` between the start and the end of profiling,
+i.e. the memory allocated (and not yet freed) per source line, plus the
+peak traced memory in bytes.
+"""
+
+from __future__ import annotations
+import functools
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import timing
+
+
+MEMORY_SNAPSHOTS: Dict[str, List[Tuple[List[tracemalloc.StatisticDiff], int]]] = {}
+"""(allocation differences, peak bytes) of every recorded call per name"""
+
+_TRACE_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+def _start_tracing(frames: int = 1) -> Tuple[bool, tracemalloc.Snapshot]:
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    tracemalloc.reset_peak()
+    return started, tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+
+
+def _stop_tracing(
+    started: bool, before: tracemalloc.Snapshot, key_type: str = "lineno"
+) -> Tuple[List[tracemalloc.StatisticDiff], int]:
+    after = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+    _, peak = tracemalloc.get_traced_memory()
+    if started:
+        tracemalloc.stop()
+    return after.compare_to(before, key_type), peak
+
+
+def record_memory_usage(name: str, key_type: str = "lineno") -> Callable[[Callable], Callable]:
+    """Decorator recording the memory allocated by every call under `name` in `MEMORY_SNAPSHOTS`"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not timing.profiling_enabled():
+                return func(*args, **kwargs)
+            started, before = _start_tracing()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                snapshot = _stop_tracing(started, before, key_type)
+                MEMORY_SNAPSHOTS.setdefault(name, []).append(snapshot)
+        return wrapper
+    return decorator
+
+
+class ProfileMemory:
+    """Mixin adding memory profiling of everything done between
+    `start_profiling` and `stop_profiling` to a class."""
+
+    def start_profiling(self, frames: int = 1) -> None:
+        """Start tracing memory allocations, `frames` is the traceback depth stored"""
+        self._memory_profile = _start_tracing(frames)
+
+    def stop_profiling(self, key_type: str = "lineno") -> List[tracemalloc.StatisticDiff]:
+        """Stop tracing, returns the allocation differences, the peak is in `memory_peak`"""
+        started, before = self._memory_profile
+        diff, self.memory_peak = _stop_tracing(started, before, key_type)
+        del self._memory_profile
+        return diff
+
+
+def format_bytes(size: float, sign: bool = False) -> str:
+    """Human readable size in binary units"""
+    prefix = "+" if sign and size >= 0 else ""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024 or unit == "GiB":
+            return prefix + (f"{int(size)} B" if unit == "B" else f"{size:.1f} {unit}")
+        size /= 1024
+
+
+def format_snapshot(
+    snapshot: tracemalloc.Snapshot | Sequence[tracemalloc.Statistic | tracemalloc.StatisticDiff],
+    limit: Optional[int] = 10,
+) -> str:
+    """The largest allocations of a snapshot or a profile, one source line per row"""
+    if isinstance(snapshot, tracemalloc.Snapshot):
+        snapshot = snapshot.statistics("lineno")
+    stats = list(snapshot)
+    diff = bool(stats) and isinstance(stats[0], tracemalloc.StatisticDiff)
+    if diff:
+        stats.sort(key=lambda stat: abs(stat.size_diff), reverse=True)
+
+    lines = []
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        change = f" ({format_bytes(stat.size_diff, sign=True):>10})" if diff else ""
+        size = format_bytes(stat.size)
+        lines.append(f"{frame.filename}:{frame.lineno}: {size:>10}{change}, {stat.count} blocks")
+
+    rest = stats[limit:] if limit is not None else []
+    if rest:
+        lines.append(f"{len(rest)} other lines: {format_bytes(sum(stat.size for stat in rest))}")
+    total = sum(stat.size_diff if diff else stat.size for stat in stats)
+    lines.append(f"Total {'change' if diff else 'size'}: {format_bytes(total, sign=diff)}")
+    return "\n".join(lines)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+"""
+Run metrics
+===========
+
+`RunMetrics` summarises one propagation: the wall time spent in each stage
+(see `STAGES`), the integration throughput and the peak resident memory of
+the process. The stage times come from the execution time records of the
+instrumented functions, so they are zero while profiling is disabled.
+
+Metrics are appended to JSON lines files with `write_metrics_jsonl`, one
+run per line together with the host and package version, so runs can be
+compared across versions and machines.
+"""
+
+from __future__ import annotations
+import sys
+import json
+import socket
+import datetime
+import importlib.metadata
+from pathlib import Path
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from .timing import TimeRecord
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+STAGES: Dict[str, List[str]] = dict(
+    population_setup=["simulation.realise_population"],
+    ephemeris_setup=["rebound.setup_sim"],
+    input_conversion=["rebound.convert_input"],
+    integrate=["rebound.integrate"],
+    state_extraction=["rebound.put_simulation_state"],
+    output_conversion=["rebound.convert_output", "rebound.dense_output"],
+    event_logging=["rebound.log_event"],
+    event_writing=["events.write_jsonl"],
+)
+"""Execution time record names summed into each stage"""
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of the process in bytes, None if not available on the platform"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+def _version() -> str:
+    try:
+        return importlib.metadata.version("pydasst")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+@dataclass
+class RunMetrics:
+    """Timing breakdown and throughput of one propagation.
+
+    `particle_steps_per_second` is the number of test particles times the
+    number of integrator steps per second of wall time.
+    """
+    wall_time: float
+    stages: Dict[str, float]
+    n_particles: int
+    n_outputs: int
+    integrator_steps: int
+    particle_steps_per_second: float
+    peak_rss: Optional[int]
+    timestamp: str = ""
+    host: str = ""
+    version: str = ""
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def format(self) -> str:
+        """Human readable table of the stage breakdown"""
+        lines = [f"wall time: {self.wall_time:.3f} s"]
+        for stage, seconds in self.stages.items():
+            share = 100 * seconds / self.wall_time if self.wall_time > 0 else 0.0
+            lines.append(f"  {stage:<20} {seconds:>10.3f} s {share:>6.1f} %")
+        lines.append(
+            f"{self.n_particles} particles, {self.integrator_steps} steps, "
+            f"{self.particle_steps_per_second:.4g} particle-steps/s"
+        )
+        if self.peak_rss is not None:
+            lines.append(f"peak RSS: {self.peak_rss / 2**20:.1f} MiB")
+        return "\n".join(lines)
+
+
+def run_metrics(
+    records: Dict[str, TimeRecord],
+    wall_time: float,
+    n_particles: int,
+    n_outputs: int,
+    integrator_steps: int,
+    **meta,
+) -> RunMetrics:
+    """Metrics of a run from the execution time records collected during it,
+    see `dasst.profiling.collect_execution_times`. Keyword arguments are stored in `meta`."""
+    stages = {
+        stage: sum((records[name].total for name in names if name in records), 0.0)
+        for stage, names in STAGES.items()
+    }
+    return RunMetrics(
+        wall_time=wall_time,
+        stages=stages,
+        n_particles=int(n_particles),
+        n_outputs=int(n_outputs),
+        integrator_steps=int(integrator_steps),
+        particle_steps_per_second=(
+            n_particles * integrator_steps / wall_time if wall_time > 0 else 0.0
+        ),
+        peak_rss=peak_rss(),
+        timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        host=socket.gethostname(),
+        version=_version(),
+        meta=meta,
+    )
+
+
+def write_metrics_jsonl(metrics: RunMetrics | Iterable[RunMetrics], path: str | Path) -> None:
+    """Append metrics to a JSON lines file, one run per line."""
+    if isinstance(metrics, RunMetrics):
+        metrics = [metrics]
+    with open(path, "a") as fh:
+        for item in metrics:
+            fh.write(json.dumps(item.as_dict(), default=str) + "\n")
+
+
+def read_metrics_jsonl(path: str | Path) -> List[RunMetrics]:
+    """Read metrics written by `write_metrics_jsonl`."""
+    metrics = []
+    with open(path, "r") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                metrics.append(RunMetrics(**json.loads(line)))
+    return metrics
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""
+Execution time records
+======================
+
+Instrumented functions and code blocks add their wall time to a
+`TimeRecord` per name in `EXECUTION_TIMES`. Records are aggregates (number
+of calls, total, min and max) so instrumenting a function called every
+integration step does not grow memory. Within `collect_execution_times`
+the times are also collected into a separate dictionary, which is how a
+single run gets its own summary.
+
+When profiling is disabled with `set_profiling(False)` instrumented
+functions only pay for one flag check.
+"""
+
+from __future__ import annotations
+import time
+import functools
+from dataclasses import dataclass, asdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+@dataclass
+class TimeRecord:
+    """Aggregated wall times [s] of one instrumented function or block"""
+    calls: int = 0
+    total: float = 0.0
+    min: float = float("inf")
+    max: float = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        if elapsed < self.min:
+            self.min = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), mean=self.mean)
+
+
+EXECUTION_TIMES: Dict[str, TimeRecord] = {}
+"""Execution time records of all instrumented names since import or `reset_execution_times`"""
+
+_COLLECTORS: List[Dict[str, TimeRecord]] = []
+_ENABLED = True
+
+
+def set_profiling(enabled: bool) -> None:
+    """Enable or disable recording of execution times and memory usage"""
+    global _ENABLED
+    _ENABLED = bool(enabled)
+
+
+def profiling_enabled() -> bool:
+    return _ENABLED
+
+
+def reset_execution_times() -> None:
+    EXECUTION_TIMES.clear()
+
+
+def add_execution_time(name: str, elapsed: float) -> None:
+    """Add a measured wall time [s] to the records of `name`"""
+    if not _ENABLED:
+        return
+    for records in [EXECUTION_TIMES] + _COLLECTORS:
+        record = records.get(name)
+        if record is None:
+            record = records[name] = TimeRecord()
+        record.add(elapsed)
+
+
+def record_execution_time(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording the execution time of every call under `name`"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add_execution_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class execution_timer:
+    """Context manager recording the execution time of a code block under `name`, e.g.
+
+    .. code-block:: python
+
+        with execution_timer("rebound.integrate"):
+            sim.integrate(t)
+
+    """
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = None
+
+    def __enter__(self) -> "execution_timer":
+        if _ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.start is not None:
+            add_execution_time(self.name, time.perf_counter() - self.start)
+            self.start = None
+
+
+@contextmanager
+def collect_execution_times() -> Iterator[Dict[str, TimeRecord]]:
+    """Collect the execution times recorded inside the block into the yielded dictionary"""
+    records: Dict[str, TimeRecord] = {}
+    _COLLECTORS.append(records)
+    try:
+        yield records
+    finally:
+        del _COLLECTORS[next(i for i, other in enumerate(_COLLECTORS) if other is records)]
+
+
+def format_time_record(
+    records: Optional[Dict[str, TimeRecord]] = None,
+    sort: str = "total",
+) -> str:
+    """Table of execution time records, `EXECUTION_TIMES` by default.
+
+    :param sort: Record field to sort by in descending order, or "name"
+    """
+    records = EXECUTION_TIMES if records is None else records
+    if sort == "name":
+        items = sorted(records.items())
+    else:
+        items = sorted(records.items(), key=lambda item: getattr(item[1], sort), reverse=True)
+
+    width = max([len(name) for name in records] + [4])
+    columns = ["total [s]", "mean [s]", "min [s]", "max [s]"]
+    header = f"{'name':<{width}} {'calls':>10} " + " ".join(f"{col:>12}" for col in columns)
+    lines = [header, "-" * len(header)]
+    for name, rec in items:
+        lines.append(
+            f"{name:<{width}} {rec.calls:>10d} {rec.total:>12.4e} {rec.mean:>12.4e} "
+            f"{rec.min if rec.calls else 0.0:>12.4e} {rec.max:>12.4e}"
+        )
+    return "\n".join(lines)
@@ -2,12 +2,17 @@
 
 """Wrapper for the REBOUND propagator into SORTS format."""
 
+import time
 import pathlib
 import numpy as np
 from tqdm import tqdm
 from astropy.time import Time, TimeDelta
 import spacecoords.celestial as cel
 from ..events import ParticleEvent, write_events_jsonl
+from ..encounters import hermite_interpolate
+from ..profiling import record_execution_time, execution_timer, add_execution_time
+from ..profiling import collect_execution_times
+from ..profiling.metrics import RunMetrics, run_metrics, write_metrics_jsonl
 
 try:
     import rebound
@@ -65,6 +70,15 @@ class Rebound:
         massive_radii=None,  # list[float]
         default_particle_radius=0.0,  # meters
         event_log_path=None,
+        # Append the `RunMetrics` of every propagation to this JSON lines file
+        metrics_log_path=None,
+        # Extra output while any test particle is close to a massive body:
+        # dict(body="Earth", distance=meters, time_step=seconds)
+        dense_output=None,
+        # Log the closest approach of test particles that pass within a
+        # radius of a massive body as encounter events:
+        # dict(body="Earth", radius=meters)
+        encounter=None,
     )
 
     MASSIVE_HASH_INIT = 1
@@ -106,18 +120,39 @@ class Rebound:
         self.massive_from_hash: dict[int, str] = {}
         self.current_epoch: Time | None = None
         self._collision_callback = None
+        self.dense_output: dict | None = None
+        self._dense_records: list[tuple[float, np.ndarray, np.ndarray]] = []
+        self._slot_hashes = np.empty((0,), dtype=np.int64)
+        self._slot_sorter = np.empty((0,), dtype=np.int64)
+        self._encounter_heartbeat = None
+        self._encounter_previous: tuple[float, np.ndarray, np.ndarray] | None = None
+        self._backwards_integration = False
+        self._integrator_steps = 0
+        self.metrics: RunMetrics | None = None
 
     def _reset_tracking(self, epoch: Time) -> None:
         self.events = []
         self.slot_from_hash = {}
         self.massive_from_hash = {}
         self.current_epoch = epoch
+        self.dense_output = None
+        self._dense_records = []
+        self._encounter_previous = None
+
+    def _index_slots(self) -> None:
+        """Build sorted hash arrays so slots can be found for many hashes at once"""
+        self._slot_hashes = np.fromiter(self.slot_from_hash.keys(), dtype=np.int64)
+        slots = np.fromiter(self.slot_from_hash.values(), dtype=np.int64)
+        order = np.argsort(self._slot_hashes)
+        self._slot_hashes = self._slot_hashes[order]
+        self._slot_sorter = slots[order]
 
     def _event_epoch_convert(self, sim_time_sec: float) -> str:
         if self.current_epoch is None:
             return ""
         return (self.current_epoch + TimeDelta(sim_time_sec, format="sec")).isot
 
+    @record_execution_time("rebound.log_event")
     def _log_event(
         self,
         *,
@@ -130,6 +165,10 @@ class Rebound:
         x: float | None = None,
         y: float | None = None,
         z: float | None = None,
+        vx: float | None = None,
+        vy: float | None = None,
+        vz: float | None = None,
+        distance: float | None = None,
     ) -> None:
         self.events.append(
             ParticleEvent(
@@ -143,6 +182,10 @@ class Rebound:
                 x=x,
                 y=y,
                 z=z,
+                vx=vx,
+                vy=vy,
+                vz=vz,
+                distance=distance,
             )
         )
 
@@ -248,6 +291,90 @@ class Rebound:
         self._collision_callback = collision_resolve
         return collision_resolve
 
+    def _make_encounter_heartbeat(self):
+        """
+        Heartbeat that checks test particle distances to the `encounter` body
+        after every integrator step. When the radial velocity relative to the
+        body changes sign from negative to positive a closest approach
+        happened during the last step: its time and relative state are
+        refined on a cubic Hermite interpolation between the two steps and
+        logged as an encounter event if the distance is within the radius.
+        """
+        enc = self.settings["encounter"]
+        body_ind = self.planet_index(enc.get("body", "Earth"))
+        body_name = self.settings["massive_objects"][body_ind]
+        radius = float(enc["radius"])
+        N_massive = self.N_massive
+
+        def heartbeat(sim_pointer):
+            sim = sim_pointer.contents
+            if sim.N <= N_massive:
+                return
+            now = float(sim.t)
+            data = np.empty((sim.N, 6), dtype=np.float64)
+            hashes = np.empty((sim.N,), dtype=np.uint32)
+            sim.serialize_particle_data(xyzvxvyvz=data, hash=hashes)
+            rel = (data[N_massive:, :] - data[body_ind, :]).T
+            hashes = hashes[N_massive:].astype(np.int64)
+
+            previous = self._encounter_previous
+            self._encounter_previous = (now, hashes, rel)
+            if previous is None or now <= previous[0]:
+                return
+            t0, hashes0, rel0 = previous
+
+            # Align the previous step to the current particles by hash
+            if not np.array_equal(hashes0, hashes):
+                order = np.argsort(hashes0)
+                pos = np.clip(np.searchsorted(hashes0, hashes, sorter=order), 0, hashes0.size - 1)
+                prev_ind = order[pos]
+                found = hashes0[prev_ind] == hashes
+                rel0 = rel0[:, prev_ind]
+            else:
+                found = np.ones(hashes.shape, dtype=bool)
+
+            rdot0 = np.einsum("ij,ij->j", rel0[:3], rel0[3:])
+            rdot1 = np.einsum("ij,ij->j", rel[:3], rel[3:])
+            candidates = np.nonzero(found & (rdot0 < 0) & (rdot1 >= 0))[0]
+            if candidates.size == 0:
+                return
+
+            dt = now - t0
+            x0, v0 = rel0[:3, candidates], rel0[3:, candidates]
+            x1, v1 = rel[:3, candidates], rel[3:, candidates]
+            lo = np.zeros(candidates.shape)
+            hi = np.ones(candidates.shape)
+            for _ in range(40):
+                mid = 0.5 * (lo + hi)
+                x, v = hermite_interpolate(mid, dt, x0, x1, v0, v1)
+                approaching = np.einsum("ij,ij->j", x, v) < 0
+                lo = np.where(approaching, mid, lo)
+                hi = np.where(approaching, hi, mid)
+            s = 0.5 * (lo + hi)
+            x, v = hermite_interpolate(s, dt, x0, x1, v0, v1)
+            distance = np.linalg.norm(x, axis=0)
+
+            sign = -1.0 if self._backwards_integration else 1.0
+            for k in np.nonzero(distance < radius)[0]:
+                self._log_event(
+                    sim_time_sec=sign * (t0 + s[k] * dt),
+                    event="encounter",
+                    reason=f"close_approach_{body_name}",
+                    particle_hash=int(hashes[candidates[k]]),
+                    other_hash=self.MASSIVE_HASH_INIT + body_ind,
+                    other_name=body_name,
+                    x=float(x[0, k]),
+                    y=float(x[1, k]),
+                    z=float(x[2, k]),
+                    vx=sign * float(v[0, k]),
+                    vy=sign * float(v[1, k]),
+                    vz=sign * float(v[2, k]),
+                    distance=float(distance[k]),
+                )
+
+        self._encounter_heartbeat = heartbeat
+        return heartbeat
+
     def __str__(self):
         from rebound import __version__, __build__
 
@@ -268,6 +395,7 @@ class Rebound:
             name.lower().strip()
         )
 
+    @record_execution_time("rebound.setup_sim")
     def _setup_sim(self, epoch, init_massive_states=None):
         kernel_dir = pathlib.Path(self.kernel_path)
         if init_massive_states is None:
@@ -336,6 +464,28 @@ class Rebound:
         if self.settings.get("exit_max_distance") is not None:
             self.sim.exit_max_distance = float(self.settings["exit_max_distance"])
 
+        if self.settings.get("encounter"):
+            self.sim.heartbeat = self._make_encounter_heartbeat()
+
+    def massive_states_at(self, epoch: Time) -> np.ndarray:
+        """
+        (6, N_massive) heliocentric states of the massive bodies at `epoch`
+        read from the ephemeris kernel. They can be passed as `massive_states`
+        to `propagate` to skip the kernel lookup in repeated propagations.
+        """
+        self._setup_sim(epoch)
+        massive, _ = self._get_simulation_states(0)
+        self.sim = None
+        self.massive_from_hash = {}
+        return massive
+
+    def _reverse_velocities(self) -> None:
+        """Reverse all velocities, backwards propagation integrates forward in time"""
+        data = np.empty((self.sim.N, 6), dtype=np.float64)
+        self.sim.serialize_particle_data(xyzvxvyvz=data)
+        data[:, 3:] = -data[:, 3:]
+        self.sim.set_serialized_particle_data(xyzvxvyvz=data)
+
     def _find_escaped_hash(self) -> list[int]:
 
         r_max = self.sim.exit_max_distance
@@ -403,34 +553,168 @@ class Rebound:
         sun_state = self._get_helio_state()
         return state_helio + sun_state
 
+    @record_execution_time("rebound.convert_input")
+    def _convert_initial_states(self, states, epoch, in_frames=None):
+        """
+        Convert (6, N) initial states into the internal simulation frame.
+
+        Particles can be given in different frames through `in_frames`, one
+        frame name per particle (defaults to the `in_frame` setting for all).
+        Particles are grouped per input frame and each group is converted
+        with a single vectorised call.
+        """
+        n = states.shape[1]
+        if in_frames is None:
+            groups = {self.settings["in_frame"]: slice(None)}
+        else:
+            in_frames = np.asarray(in_frames)
+            if in_frames.shape != (n,):
+                raise ValueError(
+                    f"in_frames must have shape ({n},), got {in_frames.shape}"
+                )
+            groups = {
+                str(frame): np.flatnonzero(in_frames == frame)
+                for frame in np.unique(in_frames)
+            }
+
+        states_internal = np.empty((6, n), dtype=np.float64)
+        for frame, index in groups.items():
+            if cel.is_geocentric(frame):
+                states_geo = cel.convert(
+                    epoch,
+                    states[:, index],
+                    in_frame=frame,
+                    out_frame=self.geo_internal_frame,
+                )
+                earth_state = self._get_earth_state()
+                states_internal[:, index] = states_geo + earth_state[:, None]
+            else:
+                states_internal[:, index] = cel.convert(
+                    epoch,
+                    states[:, index],
+                    in_frame=frame,
+                    out_frame=self.internal_frame,
+                )
+        return states_internal
+
+    @staticmethod
+    def _merge_dense_output(first, second):
+        if first is None or second is None:
+            return first if second is None else second
+        t_sec = np.concatenate([first["t"].sec, second["t"].sec])
+        order = np.argsort(t_sec)
+        return dict(
+            t=TimeDelta(t_sec[order], format="sec"),
+            states=np.concatenate([first["states"], second["states"]], axis=1)[:, order, :],
+            massive_states=np.concatenate(
+                [first["massive_states"], second["massive_states"]], axis=1
+            )[:, order, :],
+        )
+
     def termination_check(self, t, step_index, massive_states, particle_states):
         raise NotImplementedError(
             "Users need to implement this method to use termination checks"
         )
 
+    @record_execution_time("rebound.put_simulation_state")
     def _put_simulation_state(self, massive_states, particle_states, ti):
-        if massive_states is not None:
-            for p_n in range(self.N_massive):
-                particle = self.sim.particles[p_n]
-                massive_states[0, ti, p_n] = particle.x
-                massive_states[1, ti, p_n] = particle.y
-                massive_states[2, ti, p_n] = particle.z
-                massive_states[3, ti, p_n] = particle.vx
-                massive_states[4, ti, p_n] = particle.vy
-                massive_states[5, ti, p_n] = particle.vz
-        if particle_states is not None:
-            for i in range(self.N_massive, len(self.sim.particles)):
-                p = self.sim.particles[i]
-                h = int(p.hash.value)
-                slot = self.slot_from_hash[h]
-                particle_states[0, ti, slot] = p.x
-                particle_states[1, ti, slot] = p.y
-                particle_states[2, ti, slot] = p.z
-                particle_states[3, ti, slot] = p.vx
-                particle_states[4, ti, slot] = p.vy
-                particle_states[5, ti, slot] = p.vz
+        massive, particles = self._get_simulation_states(particle_states.shape[2])
+        massive_states[:, ti, :] = massive
+        particle_states[:, ti, :] = particles
         return massive_states, particle_states
 
+    def _get_simulation_states(self, n_slots):
+        """
+        Current (6, N_massive) massive states and (6, n_slots) test particle
+        states ordered by slot, read with a single serialisation call.
+        Test particles no longer (or not yet) in the simulation are NaN.
+        """
+        data = np.empty((self.sim.N, 6), dtype=np.float64)
+        hashes = np.empty((self.sim.N,), dtype=np.uint32)
+        self.sim.serialize_particle_data(xyzvxvyvz=data, hash=hashes)
+
+        massive = data[: self.N_massive, :].T.copy()
+        particles = np.full((6, n_slots), np.nan, dtype=np.float64)
+        if self.sim.N > self.N_massive:
+            test_hashes = hashes[self.N_massive:].astype(np.int64)
+            pos = np.searchsorted(self._slot_hashes, test_hashes)
+            particles[:, self._slot_sorter[pos]] = data[self.N_massive:, :].T
+        return massive, particles
+
+    def _dense_output_active(self, body_ind, distance):
+        """True if any test particle is within `distance` of massive body `body_ind`"""
+        if self.sim.N <= self.N_massive:
+            return False
+        xyz = np.empty((self.sim.N, 3), dtype=np.float64)
+        self.sim.serialize_particle_data(xyz=xyz)
+        diff = xyz[self.N_massive:, :] - xyz[body_ind, :]
+        return bool(np.any(np.einsum("ij,ij->i", diff, diff) < distance**2))
+
+    def _record_dense_state(self, n_slots):
+        massive, particles = self._get_simulation_states(n_slots)
+        self._dense_records.append((float(self.sim.t), massive, particles))
+
+    def _integrate_dense(self, t_end, n_slots):
+        """
+        Integrate towards `t_end` and, while any test particle is within the
+        `dense_output` distance of the chosen body, record extra states every
+        `dense_output` time step. Proximity is checked at the start of each
+        interval and at every dense step, so the distance should include a
+        margin for how far particles move during one regular output step.
+        """
+        dense = self.settings["dense_output"]
+        body_ind = self.planet_index(dense.get("body", "Earth"))
+        distance = float(dense["distance"])
+        dt = float(dense["time_step"])
+
+        t_next = float(self.sim.t) + dt
+        while t_next < t_end and self._dense_output_active(body_ind, distance):
+            self.sim.integrate(t_next)
+            self._record_dense_state(n_slots)
+            t_next += dt
+
+    @record_execution_time("rebound.dense_output")
+    def _collect_dense_output(self, epoch, backwards_integration, out_frame_internal):
+        """Convert the recorded dense states to the output frame"""
+        if not self._dense_records:
+            return None
+        t_sec = np.array([rec[0] for rec in self._dense_records], dtype=np.float64)
+        massive = np.stack([rec[1] for rec in self._dense_records], axis=1)
+        particles = np.stack([rec[2] for rec in self._dense_records], axis=1)
+
+        if cel.is_geocentric(self.settings["out_frame"]):
+            center = massive[:, :, self._earth_ind]
+        else:
+            center = massive[:, :, self._sun_ind]
+        particles -= center[:, :, None]
+        massive -= center[:, :, None]
+
+        if backwards_integration:
+            t_sec = -t_sec
+            particles[3:, ...] = -particles[3:, ...]
+            massive[3:, ...] = -massive[3:, ...]
+
+        t = TimeDelta(t_sec, format="sec")
+        times = epoch + t
+        particles = self._convert_output_states(times, particles, out_frame_internal)
+        massive = self._convert_output_states(times, massive, out_frame_internal)
+        return dict(t=t, states=particles, massive_states=massive)
+
+    def _convert_output_states(self, times, states, int_frame_):
+        """Convert (6, T, N) states from the internal frame to the output frame"""
+        # In stream mode, states before birth are NaN by design.
+        for ni in range(states.shape[2]):
+            valid = np.all(np.isfinite(states[:, :, ni]), axis=0)
+
+            if np.any(valid):
+                states[:, valid, ni] = cel.convert(
+                    times[valid],
+                    states[:, valid, ni],
+                    in_frame=int_frame_,
+                    out_frame=self.settings["out_frame"],
+                )
+        return states
+
     def _get_helio_state(self):
         sun_state = np.zeros((6,), dtype=np.float64)
         sun = self.sim.particles[self._sun_ind]
@@ -454,7 +738,30 @@ class Rebound:
         return earth_state
 
     def propagate(self, t, state0, epoch, **kwargs):
-        """Propagate a state"""
+        """Propagate a state.
+
+        The timing breakdown and throughput of the propagation are stored in
+        `metrics` (see `dasst.profiling.metrics.RunMetrics`).
+        """
+        self._integrator_steps = 0
+        with collect_execution_times() as records:
+            start = time.perf_counter()
+            states, massive_states = self._propagate(t, state0, epoch, **kwargs)
+            wall_time = time.perf_counter() - start
+
+        self.metrics = run_metrics(
+            records,
+            wall_time,
+            n_particles=state0.shape[1] if state0.ndim > 1 else 1,
+            n_outputs=massive_states.shape[1],
+            integrator_steps=self._integrator_steps,
+            integrator=self.settings["integrator"],
+        )
+        if self.settings.get("metrics_log_path"):
+            write_metrics_jsonl(self.metrics, self.settings["metrics_log_path"])
+        return states, massive_states
+
+    def _propagate(self, t, state0, epoch, **kwargs):
         times = epoch + t
         self._reset_tracking(epoch)
 
@@ -522,8 +829,14 @@ class Rebound:
             if N_testparticle == 1:
                 states.shape = states.shape[:2]
 
-            ret_backward = self.propagate(t[t.sec < 0], state0, epoch, **kwargs)
-            ret_forward = self.propagate(t[t.sec >= 0], state0, epoch, **kwargs)
+            ret_backward = self._propagate(t[t.sec < 0], state0, epoch, **kwargs)
+            dense_backward = self.dense_output
+            events_backward = self.events
+            ret_forward = self._propagate(t[t.sec >= 0], state0, epoch, **kwargs)
+            self.dense_output = self._merge_dense_output(dense_backward, self.dense_output)
+            self.events = events_backward + self.events
+            if self.settings.get("event_log_path"):
+                write_events_jsonl(self.events, self.settings["event_log_path"])
 
             massive_states = np.empty((6, len(t), self.N_massive), dtype=np.float64)
 
@@ -543,6 +856,7 @@ class Rebound:
             t = -t
         else:
             backwards_integration = False
+        self._backwards_integration = backwards_integration
 
         t_restore = np.argsort(t_order)
         t = t[t_order]
@@ -590,24 +904,9 @@ class Rebound:
 
         # Batch mode
         if not stream_mode:
-            if cel.is_geocentric(self.settings["in_frame"]):
-                earth_state = self._get_earth_state()
-
-                state0_cart_internal = cel.convert(
-                    epoch,
-                    state0_cart,
-                    in_frame=self.settings["in_frame"],
-                    out_frame=self.geo_internal_frame,
-                )
-
-                state0_cart_internal = state0_cart + earth_state[:, None]
-            else:
-                state0_cart_internal = cel.convert(
-                    epoch,
-                    state0_cart,
-                    in_frame=self.settings["in_frame"],
-                    out_frame=self.internal_frame,
-                )
+            state0_cart_internal = self._convert_initial_states(
+                state0_cart, epoch, in_frames=kwargs.get("in_frames", None)
+            )
 
             for ni in range(N_testparticle):
                 h = int(particle_hashes[ni])
@@ -621,6 +920,9 @@ class Rebound:
                     hash_value=h,
                     radius=particle_radii[ni],
                 )
+            self._index_slots()
+            if backwards_integration:
+                self._reverse_velocities()
             self.sim.move_to_com()
 
         # Stream mode
@@ -638,9 +940,18 @@ class Rebound:
         if self.settings["tqdm"]:
             pbar = tqdm(total=len(events), desc="Integrating")
 
-        for ind, (event_t, event_type) in enumerate(zip(events, event_types)):
+        dense_output = self.settings.get("dense_output") is not None
+
+        # Plain floats, indexing astropy times in the loop is slow
+        events_sec = np.asarray(events.sec, dtype=np.float64)
+
+        loop_start = time.perf_counter()
+        for ind, (event_t, event_type) in enumerate(zip(events_sec, event_types)):
             try:
-                self.sim.integrate(event_t.sec)
+                with execution_timer("rebound.integrate"):
+                    if dense_output:
+                        self._integrate_dense(event_t, N_testparticle)
+                    self.sim.integrate(event_t)
             # rebound.Collision is handled by the callback, only escape raises
             except rebound.Escape:
                 escaped_hashes = self._find_escaped_hash()
@@ -662,7 +973,7 @@ class Rebound:
                     )
 
                     self.sim.remove(hash=rebound.hash(h))
-                self.sim.integrate(event_t.sec)
+                self.sim.integrate(event_t)
             if event_type == event_map["output"]:
                 ti = output_time_index[ind]
                 massive_states, states = self._put_simulation_state(
@@ -670,13 +981,11 @@ class Rebound:
                 )
 
                 if cel.is_geocentric(self.settings["out_frame"]):
-                    earth_state = self._get_earth_state()
-                    states[:, ti, :] -= earth_state[:, None]
-                    massive_states[:, ti, :] -= earth_state[:, None]
+                    center = massive_states[:, ti, self._earth_ind].copy()
                 else:
-                    sun_state = self._get_helio_state()
-                    states[:, ti, :] -= sun_state[:, None]
-                    massive_states[:, ti, :] -= sun_state[:, None]
+                    center = massive_states[:, ti, self._sun_ind].copy()
+                states[:, ti, :] -= center[:, None]
+                massive_states[:, ti, :] -= center[:, None]
             elif event_type == event_map["particle_birth"]:
                 pass
                 # TODO: add state here
@@ -684,6 +993,9 @@ class Rebound:
             if self.settings["tqdm"]:
                 pbar.update(1)
 
+            if event_type != event_map["output"]:
+                continue
+
             check_interval = ti % self.settings["termination_check_interval"] == 0
             if self.settings["termination_check"] and check_interval:
                 if backwards_integration:
@@ -694,6 +1006,9 @@ class Rebound:
                     end_ind = ti + 1
                     break
 
+        add_execution_time("rebound.integrate_loop", time.perf_counter() - loop_start)
+        self._integrator_steps += int(self.sim.steps_done)
+
         if self.settings["tqdm"]:
             pbar.close()
 
@@ -722,36 +1037,29 @@ class Rebound:
                     )
         """
 
-        # In stream mode, states before birth are NaN by design.
-        for ni in range(N_testparticle):
-            valid = np.all(np.isfinite(states[:, :, ni]), axis=0)
+        with execution_timer("rebound.convert_output"):
+            states = self._convert_output_states(times, states, int_frame_)
 
-            if np.any(valid):
-                states[:, valid, ni] = cel.convert(
+            states = states[:, t_restore, :]
+            if N_testparticle == 1:
+                states.shape = states.shape[:2]
+
+            if backwards_integration:
+                massive_states[3:, :, :] = -massive_states[3:, :, :]
+            massive_states = massive_states[:, 0:end_ind, :]
+
+            for ni in range(self.N_massive):
+                massive_states[:, :, ni] = cel.convert(
                     times,
-                    states[:, valid, ni],
+                    massive_states[:, :, ni],
                     in_frame=int_frame_,
                     out_frame=self.settings["out_frame"],
                 )
 
-        states = states[:, t_restore, :]
-        if N_testparticle == 1:
-            states.shape = states.shape[:2]
-
-        if backwards_integration:
-            massive_states[3:, :, :] = -massive_states[3:, :, :]
-        massive_states = massive_states[:, 0:end_ind, :]
-
-        for ni in range(self.N_massive):
-            massive_states[:, :, ni] = cel.convert(
-                times,
-                massive_states[:, :, ni],
-                in_frame=int_frame_,
-                out_frame=self.settings["out_frame"],
-            )
-
         massive_states = massive_states[:, t_restore, :]
 
+        self.dense_output = self._collect_dense_output(epoch, backwards_integration, int_frame_)
+
         if self.settings.get("event_log_path"):
             write_events_jsonl(self.events, self.settings["event_log_path"])
 
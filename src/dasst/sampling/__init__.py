@@ -1 +1,19 @@
-#todo add mcmc and similar sampling methods? - or maybe leave those to metecho
+'''Samplers of test particle initial states
+
+Sequential (ensemble MCMC) and parallel (direct Monte Carlo) samplers share
+the `Sampler` interface and evaluate likelihoods on whole batches of states,
+e.g. by propagating the batch with `SimulationLikelihood`.
+
+'''
+
+from .base import Sampler, SamplerResult
+from .mcmc import EnsembleMCMC
+from .dmc import DirectMonteCarlo
+from .likelihoods import (
+    PropagationLikelihood,
+    SimulationLikelihood,
+    ReboundLikelihood,
+    MinimumDistance,
+    PreEncounterLikelihood,
+)
+from .cache import LRUCache, DynamicsCache, state_keys
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+"""
+Common sampler interface
+========================
+
+Samplers generate test particle initial states (or any other parameter
+vectors) as (D, n) batches. Log-likelihoods are always evaluated on whole
+batches, so a likelihood that propagates particles integrates the full batch
+in one simulation. With `workers > 1` every batch is split over a process (or
+thread) pool and the parts are evaluated concurrently, each worker running
+its own simulation. Process workers receive the log-likelihood once when they
+start, so state kept by it between calls (e.g. caches) persists per worker.
+
+A log-likelihood is any picklable callable mapping a (D, n) batch to (n,)
+values, a log-prior has the same signature. States with a non-finite
+log-prior are never passed to the log-likelihood.
+"""
+
+from __future__ import annotations
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class SamplerResult:
+    """Output of a sampler run.
+
+    MCMC chains have (D, S, W) samples for S steps of W walkers and (S, W)
+    log values, direct Monte Carlo has (D, N) samples, (N,) log values and
+    normalised importance `weights`.
+    """
+    samples: np.ndarray
+    log_likelihood: np.ndarray
+    log_prior: np.ndarray
+    weights: Optional[np.ndarray] = None
+    acceptance: Optional[np.ndarray] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def log_posterior(self) -> np.ndarray:
+        return self.log_likelihood + self.log_prior
+
+    def flat(self, burn: int = 0, thin: int = 1) -> np.ndarray:
+        """(D, M) samples, chains are cut by `burn` steps, thinned and flattened"""
+        if self.samples.ndim == 2:
+            return self.samples
+        chain = self.samples[:, burn::thin, :]
+        return chain.reshape(chain.shape[0], -1)
+
+
+_WORKER_LIKELIHOOD: Optional[Callable] = None
+"""Log-likelihood installed in a process pool worker by `Sampler.pool`"""
+
+
+def _install_likelihood(log_likelihood: Callable) -> None:
+    global _WORKER_LIKELIHOOD
+    _WORKER_LIKELIHOOD = log_likelihood
+
+
+def _evaluate_installed(states: np.ndarray) -> np.ndarray:
+    return _evaluate(_WORKER_LIKELIHOOD, states)
+
+
+def _evaluate(log_likelihood: Callable, states: np.ndarray) -> np.ndarray:
+    values = np.asarray(log_likelihood(states), dtype=np.float64)
+    if values.shape != (states.shape[1],):
+        raise ValueError(
+            f"Log-likelihood must return shape ({states.shape[1]},), got {values.shape}"
+        )
+    return values
+
+
+class Sampler:
+    """Base class of the batch samplers.
+
+    :param log_likelihood: Callable mapping (D, n) states to (n,) log-likelihoods
+    :param log_prior: Optional callable mapping (D, n) states to (n,) log-priors
+    :param workers: Number of pool workers each batch is split over, 1
+        evaluates in the calling process
+    :param processes: Use a process pool instead of a thread pool
+    :param seed: Seed of the sampler random number generator
+    """
+
+    def __init__(
+        self,
+        log_likelihood: Callable[[np.ndarray], np.ndarray],
+        log_prior: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+        workers: Optional[int] = 1,
+        processes: bool = True,
+        seed: Optional[int | np.random.SeedSequence] = None,
+    ) -> None:
+        self.log_likelihood = log_likelihood
+        self.log_prior = log_prior
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.rng = np.random.default_rng(seed)
+        self._installed_pool = None
+
+    @contextmanager
+    def pool(self) -> Iterator[Any]:
+        """Executor used for the likelihood evaluations, None for a single worker.
+
+        Process workers get the log-likelihood once when they start and only
+        the states are sent with each task.
+        """
+        if self.workers <= 1:
+            yield None
+            return
+        if not self.processes:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                yield pool
+            return
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_install_likelihood,
+            initargs=(self.log_likelihood,),
+        ) as pool:
+            self._installed_pool = pool
+            try:
+                yield pool
+            finally:
+                self._installed_pool = None
+
+    def evaluate(self, states: np.ndarray, pool: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Log-prior and log-likelihood of a (D, n) batch of states.
+
+        :param pool: Executor from `pool`, the batch is split in one part per worker
+        """
+        states = np.asarray(states, dtype=np.float64)
+        num = states.shape[1]
+        if self.log_prior is None:
+            log_prior = np.zeros((num,), dtype=np.float64)
+        else:
+            log_prior = np.asarray(self.log_prior(states), dtype=np.float64)
+        log_likelihood = np.full((num,), -np.inf, dtype=np.float64)
+
+        valid = np.flatnonzero(np.isfinite(log_prior))
+        if valid.size == 0:
+            return log_prior, log_likelihood
+
+        if pool is None:
+            log_likelihood[valid] = _evaluate(self.log_likelihood, states[:, valid])
+            return log_prior, log_likelihood
+
+        parts = [part for part in np.array_split(valid, self.workers) if part.size > 0]
+        if pool is self._installed_pool:
+            futures = [pool.submit(_evaluate_installed, states[:, part]) for part in parts]
+        else:
+            futures = [
+                pool.submit(_evaluate, self.log_likelihood, states[:, part]) for part in parts
+            ]
+        for part, future in zip(parts, futures):
+            log_likelihood[part] = future.result()
+        return log_prior, log_likelihood
+
+    def run(self, *args, **kwargs) -> SamplerResult:
+        raise NotImplementedError()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+Caches for repeated propagations
+================================
+
+Samplers evaluate the likelihood of many proposals at the same epoch, so the
+ephemeris lookup of the massive bodies is the same for every batch and
+repeated proposals (rejected MCMC moves, duplicated resamples) would be
+propagated again. `DynamicsCache` keeps the initial massive body states per
+epoch and `LRUCache` with `state_keys` memoises per-particle results, where a
+`resolution` lets nearby proposals share an entry.
+"""
+
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+from astropy.time import Time
+
+from ..propagators import Rebound
+
+
+DEFAULT_CACHE_SIZE = 100_000
+"""Default maximum number of memoised particles"""
+
+
+class LRUCache:
+    """Mapping that evicts the least recently used entry beyond `max_size` entries.
+
+    Access is guarded by a lock so threads of a pool can share one cache.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        if max_size < 1:
+            raise ValueError(f"Cache size must be positive, got {max_size}")
+        self.max_size = int(max_size)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Value of `key` marked as most recently used, counts hits and misses"""
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return dict(size=len(self._data), hits=self.hits, misses=self.misses)
+
+
+def state_keys(states: np.ndarray, resolution: Optional[float | np.ndarray] = None) -> List[bytes]:
+    """Cache keys of the columns of a (6, n) state array.
+
+    :param resolution: Optional scalar or (6,) grid spacing, states are
+        rounded to the grid so all states within a cell share a key
+    """
+    states = np.asarray(states, dtype=np.float64)
+    if resolution is not None:
+        resolution = np.broadcast_to(np.asarray(resolution, dtype=np.float64), (states.shape[0],))
+        states = np.round(states / resolution[:, None]).astype(np.int64)
+    columns = np.ascontiguousarray(states.T)
+    return [row.tobytes() for row in columns]
+
+
+class DynamicsCache:
+    """Initial massive body states of a `Rebound` configuration per epoch.
+
+    The states are read from the ephemeris kernel the first time an epoch is
+    requested and reused afterwards, pass them as `massive_states` to
+    `Rebound.propagate` or `propagate_pre_encounter`.
+
+    :param kernel: Ephemeris kernel path of `Rebound`
+    :param settings: `Rebound` settings, only the massive bodies matter
+    :param max_size: Number of epochs kept
+    """
+
+    def __init__(
+        self,
+        kernel: str,
+        settings: Optional[Dict[str, Any]] = None,
+        max_size: int = 16,
+    ) -> None:
+        self.kernel = kernel
+        self.settings = settings
+        self._states = LRUCache(max_size)
+
+    def massive_states(self, epoch: Time) -> np.ndarray:
+        """(6, N_massive) heliocentric massive body states at `epoch`"""
+        key = (epoch.tdb.jd1, epoch.tdb.jd2)
+        states = self._states.get(key)
+        if states is None:
+            states = Rebound(kernel=self.kernel, settings=self.settings).massive_states_at(epoch)
+            self._states[key] = states
+        return states
+
+    def add(self, epoch: Time, states: np.ndarray) -> None:
+        """Use known (6, N_massive) massive states at `epoch` instead of the kernel"""
+        self._states[(epoch.tdb.jd1, epoch.tdb.jd2)] = np.asarray(states, dtype=np.float64)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Direct Monte Carlo
+==================
+
+Draws independent batches of states from a proposal distribution and weighs
+them by their likelihood. The proposal is any object with a `sample(n)`
+method returning (D, n) states, e.g. `dasst.distributions.KernelDensityEstimation`
+or `dasst.distributions.Resampling`. Without a prior the proposal is the
+prior and the weights are the normalised likelihoods, with a prior the
+proposal also needs a `pdf` and the weights are posterior importance weights.
+"""
+
+from __future__ import annotations
+from typing import Any, Optional
+
+import numpy as np
+
+from .base import Sampler, SamplerResult
+
+
+DEFAULT_BATCH_SIZE = 10_000
+"""Default number of states proposed per batch"""
+
+
+class DirectMonteCarlo(Sampler):
+    """Direct Monte Carlo sampler with batched proposals.
+
+    See `Sampler` for the likelihood, prior and pool arguments.
+
+    :param proposal: Distribution with `sample(n)` returning (D, n) states
+    :param batch_size: Number of states proposed and evaluated at once
+    """
+
+    def __init__(
+        self, log_likelihood, proposal: Any, *args, batch_size: int = DEFAULT_BATCH_SIZE, **kwargs
+    ) -> None:
+        super().__init__(log_likelihood, *args, **kwargs)
+        if self.log_prior is not None and not hasattr(proposal, "pdf"):
+            raise ValueError("A proposal with a `pdf` is needed to importance sample a prior")
+        self.proposal = proposal
+        self.batch_size = int(batch_size)
+
+    def run(self, n: int, pool: Optional[object] = None) -> SamplerResult:
+        """Propose and evaluate `n` states.
+
+        :param pool: Optional executor to reuse, otherwise one is created from
+            the sampler settings for the run
+        :return: (D, n) samples with normalised weights, the effective sample
+            size is in `meta`
+        """
+        if pool is None and self.workers > 1:
+            with self.pool() as pool:
+                return self.run(n, pool=pool)
+
+        samples, log_prior, log_likelihood, log_weight = [], [], [], []
+        for start in range(0, n, self.batch_size):
+            size = min(self.batch_size, n - start)
+            states = np.asarray(self.proposal.sample(size), dtype=np.float64)
+            if states.ndim == 1:
+                states = states.reshape(1, -1)
+            prior, likelihood = self.evaluate(states, pool=pool)
+
+            weight = likelihood + prior
+            if self.log_prior is not None:
+                with np.errstate(divide="ignore"):
+                    weight = weight - np.log(self.proposal.pdf(states))
+            samples.append(states)
+            log_prior.append(prior)
+            log_likelihood.append(likelihood)
+            log_weight.append(weight)
+
+        log_weight = np.concatenate(log_weight)
+        finite = np.isfinite(log_weight)
+        weights = np.zeros(log_weight.shape, dtype=np.float64)
+        if np.any(finite):
+            weights[finite] = np.exp(log_weight[finite] - np.max(log_weight[finite]))
+            weights /= np.sum(weights)
+
+        return SamplerResult(
+            samples=np.concatenate(samples, axis=1),
+            log_likelihood=np.concatenate(log_likelihood),
+            log_prior=np.concatenate(log_prior),
+            weights=weights,
+            meta=dict(
+                sampler="DirectMonteCarlo",
+                effective_sample_size=1.0 / np.sum(weights**2) if np.any(finite) else 0.0,
+            ),
+        )
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+"""
+Propagation likelihoods
+=======================
+
+Log-likelihoods of (6, n) batches of test particle initial states that
+integrate the whole batch in one simulation and reduce the propagation
+result with a `statistic`. The statistic receives a result dictionary with
+at least `t`, `epoch`, `particles_states` (6, T, n), `massive_states`
+(6, T, N_massive) and `rebound`, the same keys as `Simulation.propagate`,
+and returns the (n,) log-likelihoods.
+
+All classes are plain picklable objects so they can be evaluated in a
+process pool, a new simulation is set up for every batch.
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pyorb
+from astropy.time import Time, TimeDelta
+
+from ..propagators import Rebound
+from ..encounters import body_index
+from ..orbit_determination.methods import propagate_pre_encounter, distance_termination
+from ..similarity.d_criteria import D_SH_elements, D_V_invariants
+from ..similarity.trajectories import _features, MU_SUN_AU
+from .cache import LRUCache, DynamicsCache, state_keys, DEFAULT_CACHE_SIZE
+
+
+class MinimumDistance:
+    """Gaussian log-likelihood of the closest approach to a massive body.
+
+    :param body: Name of the massive body
+    :param scale: Distance [m] at which the log-likelihood is -1/2
+    """
+
+    def __init__(self, body: str = "Earth", scale: float = 1e9) -> None:
+        self.body = body
+        self.scale = scale
+
+    def __call__(self, result: Dict[str, Any]) -> np.ndarray:
+        massive_objects = result["rebound"].settings["massive_objects"]
+        index = body_index(self.body, massive_objects)
+        relative = result["particles_states"][:3] - result["massive_states"][:3, :, index, None]
+        distance = np.min(np.linalg.norm(relative, axis=0), axis=0)
+        return -0.5 * (distance / self.scale) ** 2
+
+
+class PropagationLikelihood:
+    """Log-likelihood evaluated on the propagation of a batch of states.
+
+    :param statistic: Callable mapping a propagation result to (n,) log-likelihoods
+    """
+
+    def __init__(self, statistic: Callable[[Dict[str, Any]], np.ndarray]) -> None:
+        self.statistic = statistic
+
+    def propagate(self, states: np.ndarray) -> Dict[str, Any]:
+        raise NotImplementedError()
+
+    def __call__(self, states: np.ndarray) -> np.ndarray:
+        states = np.asarray(states, dtype=np.float64)
+        if states.shape[0] != 6:
+            raise ValueError(f"Particle states must have shape (6, n), got {states.shape}")
+        result = self.propagate(states)
+        if result["particles_states"].ndim == 2:
+            result["particles_states"] = result["particles_states"][:, :, None]
+        return np.asarray(self.statistic(result), dtype=np.float64)
+
+
+class SimulationLikelihood(PropagationLikelihood):
+    """Propagates batches with `Simulation.propagate` using its configuration.
+
+    :param simulation: The `dasst.simulation.Simulation`
+    :param frame: Input frame of the states, defaults to the simulation input frame
+    :param use_rebound: Passed on to `Simulation.propagate`
+    """
+
+    def __init__(
+        self,
+        simulation: Any,
+        statistic: Callable[[Dict[str, Any]], np.ndarray],
+        frame: Optional[str] = None,
+        use_rebound: bool = True,
+    ) -> None:
+        super().__init__(statistic)
+        self.simulation = simulation
+        self.frame = frame or simulation.config.in_frame
+        self.use_rebound = use_rebound
+
+    def propagate(self, states: np.ndarray) -> Dict[str, Any]:
+        return self.simulation.propagate(states, frame=self.frame, use_rebound=self.use_rebound)
+
+
+class ReboundLikelihood(PropagationLikelihood):
+    """Propagates batches with a `Rebound` propagator created from settings.
+
+    :param t: Relative output times
+    :param epoch: Epoch of the initial states
+    :param kernel: Ephemeris kernel path of `Rebound`
+    :param settings: `Rebound` settings
+    :param propagate_kwargs: Extra keyword arguments of `Rebound.propagate`,
+        e.g. `massive_states`
+    """
+
+    def __init__(
+        self,
+        t: TimeDelta,
+        epoch: Time,
+        statistic: Callable[[Dict[str, Any]], np.ndarray],
+        kernel: str = ".",
+        settings: Optional[Dict[str, Any]] = None,
+        **propagate_kwargs,
+    ) -> None:
+        super().__init__(statistic)
+        self.t = t
+        self.epoch = epoch
+        self.kernel = kernel
+        self.settings = settings
+        self.propagate_kwargs = propagate_kwargs
+
+    def propagate(self, states: np.ndarray) -> Dict[str, Any]:
+        reb = Rebound(kernel=self.kernel, settings=self.settings)
+        particles_states, massive_states = reb.propagate(
+            self.t, states, self.epoch, **self.propagate_kwargs
+        )
+        return dict(
+            t=self.t,
+            epoch=self.epoch,
+            particles_states=particles_states,
+            massive_states=massive_states,
+            rebound=reb,
+            particle_events=reb.events,
+        )
+
+
+class PreEncounterLikelihood:
+    """D-criterion log-likelihood of the pre-encounter orbits of meteoroid states.
+
+    Every state, e.g. an ITRS state vector of an observed meteor, is
+    propagated backwards with `propagate_pre_encounter` until it is further
+    than `exit_distance` from the Earth. The heliocentric state at that point
+    is compared with the `target` orbit, e.g. a parent body candidate, and
+    the log-likelihood is `-0.5*(D/scale)**2`.
+
+    The massive body states at the epoch are read from the kernel once
+    (`DynamicsCache`) and the pre-encounter state of every particle is
+    memoised in an LRU cache keyed by the initial state rounded to
+    `resolution`, so only new proposals are propagated. With a process pool
+    from `Sampler.pool` each worker keeps its own cache for the whole run,
+    the cache of the likelihood in the calling process stays empty. Threads
+    share the cache.
+
+    :param epoch: Epoch of the states
+    :param target: (6,) heliocentric HCRS state [m, m/s] of the target orbit
+    :param kernel: Ephemeris kernel path
+    :param criterion: "D_SH" or "D_V"
+    :param scale: Criterion value at which the log-likelihood is -1/2
+    :param in_frame: Frame of the states
+    :param exit_distance: Distance [AU] from the Earth where the
+        pre-encounter orbit is taken
+    :param dt: Time step [s] of the backwards propagation
+    :param max_t: Maximum backwards propagation time [s]
+    :param settings: Extra `Rebound` settings
+    :param dynamics: Shared `DynamicsCache`, one is created if not given
+    :param cache_size: Maximum number of memoised particles
+    :param resolution: Optional scalar or (6,) rounding of the cache keys
+    :param weights: Optional extra D_V weights
+    """
+
+    def __init__(
+        self,
+        epoch: Time,
+        target: np.ndarray,
+        kernel: str = ".",
+        criterion: str = "D_SH",
+        scale: float = 0.1,
+        in_frame: str = "ITRS",
+        exit_distance: float = 0.01,
+        dt: float = 10.0,
+        max_t: float = 10 * 24 * 3600.0,
+        settings: Optional[Dict[str, Any]] = None,
+        dynamics: Optional[DynamicsCache] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        resolution: Optional[float | np.ndarray] = None,
+        weights: Optional[np.ndarray] = None,
+    ) -> None:
+        if criterion not in ("D_SH", "D_V"):
+            raise ValueError(f"Criterion {criterion!r} not supported, use 'D_SH' or 'D_V'")
+        self.epoch = epoch
+        self.criterion = criterion
+        self.scale = scale
+        self.in_frame = in_frame
+        self.exit_distance = exit_distance
+        self.dt = dt
+        self.max_t = max_t
+        self.settings = dict(tqdm=False) if settings is None else dict(settings)
+        self.kernel = kernel
+        self.dynamics = DynamicsCache(kernel, self.settings) if dynamics is None else dynamics
+        self.cache = LRUCache(cache_size)
+        self.resolution = resolution
+        self.weights = weights
+        self.target = np.asarray(target, dtype=np.float64).reshape(6, 1, 1)
+        self._target_features = self._features(self.target)
+
+    def _features(self, states: np.ndarray) -> np.ndarray:
+        return _features(states, self.criterion, MU_SUN_AU, pyorb.AU)
+
+    def _propagate(self, states: np.ndarray) -> np.ndarray:
+        """(6, n) heliocentric states at the exit distance, NaN if the particle was lost"""
+        particle_states, massive_states, _, prop = propagate_pre_encounter(
+            states,
+            self.epoch,
+            in_frame=self.in_frame,
+            out_frame="HCRS",
+            kernel=self.kernel,
+            termination_check=distance_termination(self.exit_distance),
+            dt=self.dt,
+            max_t=self.max_t,
+            settings=self.settings,
+            massive_states=self.dynamics.massive_states(self.epoch),
+        )
+        if particle_states.ndim == 2:
+            particle_states = particle_states[:, :, None]
+
+        # Each particle is taken when it first passes the exit distance
+        earth = massive_states[:3, :particle_states.shape[1], prop._earth_ind]
+        distance = np.linalg.norm(particle_states[:3] - earth[:, :, None], axis=0)
+        with np.errstate(invalid="ignore"):
+            outside = distance > self.exit_distance * pyorb.AU
+        index = np.where(np.any(outside, axis=0), np.argmax(outside, axis=0), distance.shape[0] - 1)
+        return particle_states[:, index, np.arange(particle_states.shape[2])]
+
+    def pre_encounter_states(self, states: np.ndarray) -> np.ndarray:
+        """(6, n) heliocentric pre-encounter states, only uncached states are propagated"""
+        states = np.asarray(states, dtype=np.float64)
+        keys = state_keys(states, self.resolution)
+        out = np.empty(states.shape, dtype=np.float64)
+
+        missing: Dict[bytes, List[int]] = {}
+        for ind, key in enumerate(keys):
+            cached = self.cache.get(key)
+            if cached is None:
+                missing.setdefault(key, []).append(ind)
+            else:
+                out[:, ind] = cached
+
+        if missing:
+            first = np.array([columns[0] for columns in missing.values()], dtype=np.int64)
+            propagated = self._propagate(states[:, first])
+            for col, (key, columns) in enumerate(missing.items()):
+                self.cache[key] = propagated[:, col].copy()
+                out[:, columns] = propagated[:, col, None]
+        return out
+
+    def D(self, states: np.ndarray) -> np.ndarray:
+        """(n,) criterion values of the pre-encounter orbits against the target"""
+        helio = self.pre_encounter_states(states)
+        features = self._features(helio[:, None, :])
+        if self.criterion == "D_SH":
+            return D_SH_elements(*features, *self._target_features)
+        return D_V_invariants(features, self._target_features, weights=self.weights)
+
+    def __call__(self, states: np.ndarray) -> np.ndarray:
+        D = self.D(states)
+        log_likelihood = -0.5 * (D / self.scale) ** 2
+        return np.where(np.isfinite(log_likelihood), log_likelihood, -np.inf)
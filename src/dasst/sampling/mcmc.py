@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+"""
+Ensemble MCMC
+=============
+
+Affine invariant ensemble sampler of Goodman & Weare (2010), Commun. Appl.
+Math. Comput. Sci. 5:65-80, with the parallel "stretch move" of
+Foreman-Mackey et al. (2013), PASP 125:306. The walkers are split in two
+halves and all walkers of a half are proposed at once, so every step costs
+two batched likelihood evaluations regardless of the number of walkers.
+"""
+
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+
+from .base import Sampler, SamplerResult
+
+
+class EnsembleMCMC(Sampler):
+    """Affine invariant ensemble MCMC with batched stretch moves.
+
+    See `Sampler` for the likelihood, prior and pool arguments.
+
+    :param stretch: Scale parameter `a` of the stretch move distribution
+    """
+
+    def __init__(self, *args, stretch: float = 2.0, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        if stretch <= 1:
+            raise ValueError(f"Stretch scale must be larger than 1, got {stretch}")
+        self.stretch = stretch
+
+    def _half_step(self, states, log_prior, log_likelihood, active, other, pool):
+        dim = states.shape[0]
+        a = self.stretch
+        z = ((a - 1) * self.rng.random(active.size) + 1) ** 2 / a
+        partner = other[self.rng.integers(0, other.size, size=active.size)]
+        proposal = states[:, partner] + z * (states[:, active] - states[:, partner])
+
+        prop_prior, prop_likelihood = self.evaluate(proposal, pool=pool)
+        with np.errstate(invalid="ignore"):
+            log_ratio = (
+                (dim - 1) * np.log(z)
+                + prop_prior + prop_likelihood
+                - log_prior[active] - log_likelihood[active]
+            )
+        accept = np.log(self.rng.random(active.size)) < log_ratio
+
+        moved = active[accept]
+        states[:, moved] = proposal[:, accept]
+        log_prior[moved] = prop_prior[accept]
+        log_likelihood[moved] = prop_likelihood[accept]
+        return moved
+
+    def run(self, initial: np.ndarray, steps: int, pool: Optional[object] = None) -> SamplerResult:
+        """Run the walkers for a number of steps.
+
+        :param initial: (D, W) initial walker states, W even and at least 2 D,
+            all with finite posterior
+        :param steps: Number of ensemble steps
+        :param pool: Optional executor to reuse, otherwise one is created from
+            the sampler settings for the run
+        :return: Chain of (D, steps, W) samples with per walker acceptance fractions
+        """
+        if pool is None and self.workers > 1:
+            with self.pool() as pool:
+                return self.run(initial, steps, pool=pool)
+
+        states = np.array(initial, dtype=np.float64)
+        dim, walkers = states.shape
+        if walkers % 2 != 0 or walkers < 2 * dim:
+            raise ValueError(
+                f"Need an even number of walkers of at least {2 * dim}, got {walkers}"
+            )
+
+        chain = np.empty((dim, steps, walkers), dtype=np.float64)
+        chain_prior = np.empty((steps, walkers), dtype=np.float64)
+        chain_likelihood = np.empty((steps, walkers), dtype=np.float64)
+        accepted = np.zeros((walkers,), dtype=np.int64)
+        halves = (np.arange(0, walkers // 2), np.arange(walkers // 2, walkers))
+
+        log_prior, log_likelihood = self.evaluate(states, pool=pool)
+        if not np.all(np.isfinite(log_prior + log_likelihood)):
+            raise ValueError("All initial walker states must have a finite posterior")
+
+        for step in range(steps):
+            for active, other in (halves, halves[::-1]):
+                moved = self._half_step(states, log_prior, log_likelihood, active, other, pool)
+                accepted[moved] += 1
+            chain[:, step, :] = states
+            chain_prior[step] = log_prior
+            chain_likelihood[step] = log_likelihood
+
+        return SamplerResult(
+            samples=chain,
+            log_likelihood=chain_likelihood,
+            log_prior=chain_prior,
+            acceptance=accepted / max(steps, 1),
+            meta=dict(sampler="EnsembleMCMC", stretch=self.stretch, steps=steps),
+        )
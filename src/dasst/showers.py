@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+"""
+Meteor shower aggregation
+=========================
+
+Aggregates encounter tables (see `dasst.events.encounter_table`) into
+solar-longitude activity profiles, flux densities, zenithal hourly rates and
+radiant maps. Encounters are added in chunks and only the histograms are
+kept, so arbitrarily large encounter sets can be streamed through, e.g. with
+`dasst.events.iter_encounter_tables`.
+
+Radiants follow the same convention as `dasst.orbit_determination.rebound_od`:
+the radiant is the direction opposite to the geocentric velocity, expressed as
+longitude and latitude in the chosen geocentric frame.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from astropy.time import Time
+import astropy.coordinates as coords
+import spacecoords.celestial as cel
+
+from .constants import YEAR
+from .coordinates import radiant_angles
+
+
+SOLAR_LONGITUDE_BINS = np.linspace(0, 360, 361)
+"""Default solar-longitude bin edges [deg]"""
+
+RADIANT_BINS = (np.linspace(0, 360, 361), np.linspace(-90, 90, 181))
+"""Default radiant (longitude, latitude) bin edges [deg]"""
+
+SPEED_BINS = np.linspace(0, 75e3, 151)
+"""Default geocentric speed bin edges [m/s]"""
+
+
+def solar_longitude(times: Time, frame: str = "GeocentricMeanEcliptic") -> np.ndarray:
+    """Geocentric ecliptic longitude of the Sun [deg] in [0, 360)"""
+    sun = coords.get_sun(times).transform_to(getattr(coords, frame)())
+    return np.mod(sun.lon.deg, 360.0)
+
+
+def zhr_from_flux(flux: np.ndarray, population_index: float = 2.5) -> np.ndarray:
+    """Zenithal hourly rate from a flux density of meteoroids per km^2 per hour.
+
+    Uses the relation of Koschack and Rendtel (1990), WGN 18:2 44-58, between
+    the flux of meteoroids producing meteors brighter than +6.5 mag and the ZHR
+    observed by a standard observer, valid for population indices above 1.3.
+    """
+    r = population_index
+    if r <= 1.3:
+        raise ValueError(f"Population index must be larger than 1.3, got {r}")
+    return np.asarray(flux) * 37200.0 / ((13.1 * r - 16.5) * (r - 1.3) ** 0.748)
+
+
+class ShowerAggregator:
+    """Chunked aggregation of encounters into shower statistics.
+
+    All histograms are weighted, by default every encounter has weight one.
+    Particle weights, e.g. the number of meteoroids a simulated particle
+    represents according to an ejection model, can be given per particle hash
+    with `particle_weights` or per encounter row when calling `add`.
+
+    :param radius: Encounter radius [m] the table was recorded with, the flux
+        is the weight passing through a disc of this radius
+    :param solar_longitude_bins: Bin edges [deg] of the activity profile
+    :param radiant_bins: (longitude, latitude) bin edges [deg] of the radiant map
+    :param speed_bins: Bin edges [m/s] of the geocentric speed distribution
+    :param frame: Geocentric frame of the radiants and the solar longitude
+    :param sun_centered: Radiant longitudes relative to the solar longitude
+    :param particle_weights: Optional (hashes, weights) arrays
+    """
+
+    def __init__(
+        self,
+        radius: float,
+        solar_longitude_bins: np.ndarray = SOLAR_LONGITUDE_BINS,
+        radiant_bins: Tuple[np.ndarray, np.ndarray] = RADIANT_BINS,
+        speed_bins: np.ndarray = SPEED_BINS,
+        frame: str = "GeocentricMeanEcliptic",
+        sun_centered: bool = False,
+        particle_weights: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ):
+        self.radius = float(radius)
+        self.frame = frame
+        self.sun_centered = sun_centered
+        self.solar_longitude_bins = np.array(solar_longitude_bins, dtype=np.float64)
+        self.radiant_bins = tuple(np.array(b, dtype=np.float64) for b in radiant_bins)
+        self.speed_bins = np.array(speed_bins, dtype=np.float64)
+
+        self._weight_hashes = None
+        self._weight_values = None
+        if particle_weights is not None:
+            hashes, weights = (np.asarray(x) for x in particle_weights)
+            order = np.argsort(hashes)
+            self._weight_hashes = hashes[order].astype(np.int64)
+            self._weight_values = weights[order].astype(np.float64)
+
+        self.profile = np.zeros((self.solar_longitude_bins.size - 1,), dtype=np.float64)
+        self.radiants = np.zeros(
+            (self.radiant_bins[0].size - 1, self.radiant_bins[1].size - 1), dtype=np.float64
+        )
+        self.speeds = np.zeros((self.speed_bins.size - 1,), dtype=np.float64)
+        self.count = 0
+        self.total_weight = 0.0
+
+    def _lookup_weights(self, hashes: np.ndarray) -> np.ndarray:
+        if self._weight_hashes.size == 0:
+            raise ValueError(f"No particle weight for hashes {np.unique(hashes)}")
+        pos = np.searchsorted(self._weight_hashes, hashes)
+        pos = np.clip(pos, 0, self._weight_hashes.size - 1)
+        missing = self._weight_hashes[pos] != hashes
+        if np.any(missing):
+            raise ValueError(f"No particle weight for hashes {np.unique(hashes[missing])}")
+        return self._weight_values[pos]
+
+    def add(self, table: Dict[str, Any], weights: Optional[np.ndarray] = None) -> None:
+        """Add a chunk of encounters.
+
+        :param table: Encounter table with `particle_hash`, `epoch_isot` and the
+            (6, N) geocentric `state`, see `dasst.events.encounter_table`
+        :param weights: Optional (N,) weights of the encounters, multiplied
+            with the particle weights if both are given
+        """
+        state = np.asarray(table["state"], dtype=np.float64)
+        num = state.shape[1]
+        if num == 0:
+            return
+
+        w = np.ones((num,), dtype=np.float64)
+        if self._weight_hashes is not None:
+            w *= self._lookup_weights(np.asarray(table["particle_hash"], dtype=np.int64))
+        if weights is not None:
+            w *= np.asarray(weights, dtype=np.float64)
+
+        times = Time(np.asarray(table["epoch_isot"]), format="isot", scale="utc")
+        lam_sun = solar_longitude(times, self.frame)
+        frame_state = cel.convert(times, state, in_frame="GCRS", out_frame=self.frame)
+        lon, lat = radiant_angles(frame_state[3:, :])
+        if self.sun_centered:
+            lon = lon - lam_sun
+        lon = np.mod(lon, 360.0)
+        speed = np.linalg.norm(state[3:, :], axis=0)
+
+        self.profile += np.histogram(lam_sun, bins=self.solar_longitude_bins, weights=w)[0]
+        self.radiants += np.histogram2d(lon, lat, bins=self.radiant_bins, weights=w)[0]
+        self.speeds += np.histogram(speed, bins=self.speed_bins, weights=w)[0]
+        self.count += num
+        self.total_weight += float(np.sum(w))
+
+    def add_all(self, tables: Iterable[Dict[str, Any]]) -> "ShowerAggregator":
+        """Add every encounter table of an iterable, returns self"""
+        for table in tables:
+            self.add(table)
+        return self
+
+    def flux(self, years: float = 1.0) -> np.ndarray:
+        """Flux density [per km^2 per hour] in each solar-longitude bin.
+
+        :param years: Number of passages of the Earth through the solar
+            longitude range covered by the encounters, e.g. the number of
+            simulated years
+        """
+        width = np.diff(self.solar_longitude_bins)
+        duration_h = width / 360.0 * YEAR / 3600.0 * years
+        area_km2 = np.pi * (self.radius / 1e3) ** 2
+        return self.profile / (area_km2 * duration_h)
+
+    def zhr(self, population_index: float = 2.5, years: float = 1.0) -> np.ndarray:
+        """Zenithal hourly rate in each solar-longitude bin, see `zhr_from_flux`"""
+        return zhr_from_flux(self.flux(years=years), population_index=population_index)
+
+    def radiant_density(self, smoothing: Optional[float] = None) -> np.ndarray:
+        """Radiant density per square degree on the radiant bins.
+
+        :param smoothing: Optional standard deviation [deg] of a Gaussian
+            kernel applied to the binned map (a binned kernel density
+            estimate), wrapping around in longitude
+        """
+        lon_bins, lat_bins = self.radiant_bins
+        counts = self.radiants
+        if smoothing is not None:
+            from scipy.ndimage import gaussian_filter
+
+            sigma = (
+                smoothing / np.mean(np.diff(lon_bins)),
+                smoothing / np.mean(np.diff(lat_bins)),
+            )
+            counts = gaussian_filter(counts, sigma=sigma, mode=("wrap", "nearest"))
+
+        # Solid angle of each bin in square degrees
+        lat_rad = np.radians(lat_bins)
+        area = np.outer(
+            np.diff(lon_bins),
+            np.degrees(np.diff(np.sin(lat_rad))),
+        )
+        total = np.sum(counts)
+        if total == 0:
+            return np.zeros_like(counts)
+        return counts / (total * area)
+
+    def summary(self) -> Dict[str, Any]:
+        """Histograms and bin edges as a dictionary"""
+        return dict(
+            count=self.count,
+            total_weight=self.total_weight,
+            solar_longitude_bins=self.solar_longitude_bins,
+            profile=self.profile,
+            radiant_bins=self.radiant_bins,
+            radiants=self.radiants,
+            speed_bins=self.speed_bins,
+            speeds=self.speeds,
+        )
+
+
+def aggregate_encounters(
+    tables: Iterable[Dict[str, Any]], radius: float, **kwargs
+) -> ShowerAggregator:
+    """Aggregate encounter tables, see `ShowerAggregator` for the keyword arguments."""
+    return ShowerAggregator(radius, **kwargs).add_all(tables)
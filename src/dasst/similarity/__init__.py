@@ -1 +1,10 @@
+"""Orbit similarity criteria"""
 
+from . import d_criteria
+from . import ca_criteria
+from .d_criteria import D_SH, D_V, OrbitInvariants
+from .pairwise import pairwise_threshold, pairwise_nearest, register_criterion
+from .index import OrbitIndex
+from .clustering import StreamClustering, single_linkage
+from .optimization import minimize_D
+from .trajectories import D_trajectory, iter_D_trajectory
@@ -4,6 +4,8 @@ they are likely of cometary or asteroidal origin.
 
 """
 
+from pathlib import Path
+
 import numpy as np
 import pyorb
 
@@ -85,3 +87,99 @@ def T_jupiter_i(a, e, i):
         np.radians(i)
     )
     return np.logical_or(Tj < 0.58, i > 75)
+
+
+"""Bit of each criterion in the bitmask returned by `classify`, a set bit
+means the criterion classifies the orbit as cometary
+"""
+CRITERIA_BITS = dict(K_i=1, P_i=2, Q_i=4, E_i=8, T_jupiter_i=16)
+
+"""Number of orbits classified per block, small enough for the intermediates
+to stay in cache
+"""
+CLASSIFY_BLOCK = 65536
+
+
+def _classify_block(a, e, i, out):
+    """Evaluate all criteria on one block of orbits into `out`"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        Q = a * (1 + e)
+        mask = (np.log(Q / (1 - e)) - 1 > 0).view(np.uint8) * np.uint8(CRITERIA_BITS["K_i"])
+        mask |= (a ** 1.5 * e > 2.5).view(np.uint8) * np.uint8(CRITERIA_BITS["P_i"])
+        mask |= (Q > 4.6).view(np.uint8) * np.uint8(CRITERIA_BITS["Q_i"])
+        mask |= (-(GAUSS_GRAV_K**2) / (2 * a) > -5.28e-5).view(np.uint8) * np.uint8(
+            CRITERIA_BITS["E_i"]
+        )
+        Tj = 1 / a + 2 * SEMI_MAJOR_JUP ** (-1.5) * np.sqrt(a * (1 - e**2)) * np.cos(
+            np.radians(i)
+        )
+        mask |= (Tj < 0.58).view(np.uint8) * np.uint8(CRITERIA_BITS["T_jupiter_i"])
+
+    # All criteria classify highly inclined orbits as cometary
+    mask[i > 75] = sum(CRITERIA_BITS.values())
+    out[:] = mask
+
+
+def classify(a, e, i, out=None, block_size=CLASSIFY_BLOCK):
+    """Evaluate the K-i, P-i, Q-i, E-i and T-i criteria [1] in one pass.
+
+    ASSUMES UNITS IN AU and DEGREES
+
+    The result is a packed bitmask per orbit, see `CRITERIA_BITS`, e.g.
+    `classify(a, e, i) & CRITERIA_BITS["Q_i"]` is the same as `Q_i(a, e, i)`.
+
+    _[1] Jopek, T. J., and Williams, I. P. (2013). Stream and sporadic meteoroids
+        associated with near-Earth objects.
+        Mon. Not. R. Astron. Soc. 430, 2377-2389.
+        doi:10.1093/mnras/stt057
+
+    :param a numpy.ndarray: Semi-major axis
+    :param e numpy.ndarray: Eccentricity
+    :param i numpy.ndarray: Inclination
+    :param out numpy.ndarray: Optional uint8 output array
+    :param block_size int: Number of orbits evaluated at a time
+    :return: uint8 bitmask with the same shape as the inputs
+    """
+    a, e, i = np.broadcast_arrays(
+        np.asarray(a, dtype=np.float64),
+        np.asarray(e, dtype=np.float64),
+        np.asarray(i, dtype=np.float64),
+    )
+    if out is None:
+        out = np.empty(a.shape, dtype=np.uint8)
+    # Reshaping a non-contiguous output would copy it, those are filled from a buffer
+    contiguous = out.flags.c_contiguous
+    flat = out.reshape(-1) if contiguous else np.empty((out.size,), dtype=np.uint8)
+    a, e, i = a.reshape(-1), e.reshape(-1), i.reshape(-1)
+    for start in range(0, flat.size, block_size):
+        end = min(start + block_size, flat.size)
+        _classify_block(a[start:end], e[start:end], i[start:end], flat[start:end])
+    if not contiguous:
+        out[...] = flat.reshape(out.shape)
+    return out
+
+
+def classify_catalogue(elements, out=None, chunk_size=1_000_000):
+    """Classify a columnar (a, e, i) catalogue chunk by chunk.
+
+    The catalogue can be a (3, N) array, a memory-mapped array or the path to
+    a `.npy` file, which is then memory-mapped, so only one chunk of the
+    catalogue is read into memory at a time.
+
+    :param elements: (3, N) rows of a [AU], e and i [deg]
+    :param out: Optional (N,) uint8 output array, e.g. a writable memory map
+    :param chunk_size int: Number of orbits read per chunk
+    :return: (N,) uint8 bitmask, see `classify`
+    """
+    if isinstance(elements, (str, Path)):
+        elements = np.load(elements, mmap_mode="r")
+    if elements.shape[0] < 3:
+        raise ValueError(f"Catalogue needs (a, e, i) rows, got shape {elements.shape}")
+    num = elements.shape[1]
+    if out is None:
+        out = np.empty((num,), dtype=np.uint8)
+    for start in range(0, num, chunk_size):
+        end = min(start + chunk_size, num)
+        chunk = np.asarray(elements[:3, start:end], dtype=np.float64)
+        classify(chunk[0], chunk[1], chunk[2], out=out[start:end])
+    return out
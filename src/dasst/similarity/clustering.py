@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""
+Stream detection by D-criterion clustering
+==========================================
+
+Single-linkage (break-point) clustering of orbits: two orbits belong to the
+same cluster if they are connected by a chain of orbit pairs that all have a
+criterion value below the cutoff. Neighbour pairs are found with
+`OrbitIndex` and clusters are merged with a disjoint-set (union-find)
+structure, so new orbits can be added incrementally without reclustering the
+orbits that are already in the archive.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .index import OrbitIndex
+from .pairwise import CRITERIA
+
+
+class DisjointSet:
+    """Array based union-find with batched (vectorised) union and find."""
+
+    def __init__(self, n: int = 0):
+        self.parent = np.arange(n, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.parent.size
+
+    def extend(self, n: int) -> np.ndarray:
+        """Add `n` singleton sets, returns their element indices."""
+        start = self.parent.size
+        self.parent = np.concatenate([self.parent, np.arange(start, start + n, dtype=np.int64)])
+        return np.arange(start, start + n, dtype=np.int64)
+
+    def find(self, x: Optional[np.ndarray] = None) -> np.ndarray:
+        """Root of each element (all elements if `x` is None), with path compression."""
+        x = np.arange(self.parent.size) if x is None else np.asarray(x, dtype=np.int64)
+        root = self.parent[x]
+        while True:
+            up = self.parent[root]
+            if np.array_equal(up, root):
+                break
+            root = up
+        self.parent[x] = root
+        return root
+
+    def union(self, a: np.ndarray, b: np.ndarray) -> None:
+        """Merge the sets of each pair (a[k], b[k])."""
+        ra = self.find(a)
+        rb = self.find(b)
+        diff = ra != rb
+        if not np.any(diff):
+            return
+        ra, rb = ra[diff], rb[diff]
+
+        # Components of the graph between the involved roots, each component
+        # is attached to its smallest root
+        roots, inv = np.unique(np.concatenate([ra, rb]), return_inverse=True)
+        n = roots.size
+        graph = coo_matrix(
+            (np.ones(ra.size, dtype=np.int8), (inv[:ra.size], inv[ra.size:])), shape=(n, n)
+        )
+        _, comp = connected_components(graph, directed=False)
+        rep = np.full(comp.max() + 1, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(rep, comp, roots)
+        self.parent[roots] = rep[comp]
+
+
+class StreamClustering:
+    """Incremental single-linkage clustering of orbits with a D-criterion.
+
+    Orbits are added in batches with `add`. Each batch is searched against all
+    previously added orbits and against itself, and the resulting pairs are
+    merged into the existing clusters. Previous batches are kept as separate
+    index segments so adding orbits never rebuilds the whole archive index;
+    `compact` merges the segments into one.
+
+    :param cutoff: Break-point criterion value, pairs below it are linked
+    :param criterion: "D_SH" or "D_V"
+    :param weights: Optional extra D_V weights
+    """
+
+    def __init__(self, cutoff: float, criterion: str = "D_SH", weights=None):
+        self.cutoff = float(cutoff)
+        self.criterion = criterion
+        self.weights = weights
+        self.sets = DisjointSet()
+        self.segments: List[OrbitIndex] = []
+        self.offsets: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.sets)
+
+    def _index(self, features: np.ndarray) -> OrbitIndex:
+        return OrbitIndex(features, criterion=self.criterion, weights=self.weights)
+
+    def add(self, orbits) -> np.ndarray:
+        """Add a batch of orbits and link them into the clusters.
+
+        :return: Global indices assigned to the new orbits
+        """
+        features = CRITERIA[self.criterion].prepare(orbits)
+        new = self.sets.extend(features.shape[1])
+        if new.size == 0:
+            return new
+
+        batch = self._index(features)
+        pairs_a, pairs_b = [], []
+        for offset, segment in zip(self.offsets, self.segments):
+            iq, ic, _ = segment.query_radius(features, self.cutoff)
+            pairs_a.append(new[iq])
+            pairs_b.append(ic + offset)
+
+        iq, ic, _ = batch.query_radius(features, self.cutoff)
+        pairs_a.append(new[iq])
+        pairs_b.append(new[ic])
+
+        self.sets.union(np.concatenate(pairs_a), np.concatenate(pairs_b))
+        self.segments.append(batch)
+        self.offsets.append(int(new[0]))
+        return new
+
+    def compact(self) -> None:
+        """Merge all index segments into one, clusters are unchanged."""
+        if len(self.segments) < 2:
+            return
+        features = np.concatenate([seg.features for seg in self.segments], axis=1)
+        self.segments = [self._index(features)]
+        self.offsets = [0]
+
+    @property
+    def labels(self) -> np.ndarray:
+        """Cluster label of every orbit, the smallest index in its cluster."""
+        return self.sets.find()
+
+    def clusters(self, min_size: int = 2) -> Dict[int, np.ndarray]:
+        """Orbit indices of every cluster with at least `min_size` members."""
+        labels = self.labels
+        uniq, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind="stable")
+        groups = np.split(order, np.cumsum(counts)[:-1])
+        return {
+            int(label): members
+            for label, members, count in zip(uniq, groups, counts)
+            if count >= min_size
+        }
+
+
+def single_linkage(orbits, cutoff: float, criterion: str = "D_SH", weights=None) -> np.ndarray:
+    """Single-linkage cluster labels of a set of orbits, see `StreamClustering`."""
+    clustering = StreamClustering(cutoff, criterion=criterion, weights=weights)
+    clustering.add(orbits)
+    return clustering.labels
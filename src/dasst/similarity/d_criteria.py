@@ -1,94 +1,191 @@
 #!/usr/bin/env python
 
 """Implementation of standard D-criteria"""
+from __future__ import annotations
+from pathlib import Path
+from dataclasses import dataclass
+
 import numpy as np
 
 
-def D_SH(orb_a, orb_b):
-    """Southworth and Hawkings, 1963
+def D_SH_elements(a_a, e_a, i_a, omega_a, Omega_a, a_b, e_b, i_b, omega_b, Omega_b):
+    """Southworth and Hawkings, 1963, on orbital element arrays
 
-    :param orb_a pyorb.Orbit: First input orbit into criterion calculation
-    :param orb_b pyorb.Orbit: Second input orbit into criterion calculation
-    :return: Criterion value
+    All inputs are broadcast against each other, e.g. passing elements of
+    shape (N, 1) and (1, M) gives the (N, M) criterion values. Angles are
+    in radians.
 
-    #TODO: make degrees vs radians safe function
-    #TODO: make sure correct units are always used (distance in AU?)
+    :return: Criterion value
     """
 
-    Iabsin = (2 * np.sin((orb_b.i - orb_a.i) * 0.5)) ** 2 + np.sin(orb_a.i) * np.sin(
-        orb_b.i
-    ) * (2 * np.sin((orb_b.Omega - orb_a.Omega) * 0.5)) ** 2
-    I_ab = np.arcsin(0.5 * np.sqrt(Iabsin)) * 2
+    Iabsin = (2 * np.sin((i_b - i_a) * 0.5)) ** 2 + np.sin(i_a) * np.sin(
+        i_b
+    ) * (2 * np.sin((Omega_b - Omega_a) * 0.5)) ** 2
+    I_ab = np.arcsin(np.clip(0.5 * np.sqrt(Iabsin), 0.0, 1.0)) * 2
     PI_ab = (
-        orb_b.omega
-        - orb_a.omega
+        omega_b
+        - omega_a
         + 2
         * np.arcsin(
-            np.cos((orb_b.i - orb_a.i) * 0.5)
-            * np.sin((orb_b.Omega - orb_a.Omega) * 0.5)
-            / np.cos(I_ab * 0.5)
+            np.clip(
+                np.cos((i_b + i_a) * 0.5)
+                * np.sin((Omega_b - Omega_a) * 0.5)
+                / np.cos(I_ab * 0.5),
+                -1.0,
+                1.0,
+            )
         )
     )
 
     D = 0.0
-    D += (orb_b.e - orb_a.e) ** 2
-    D += (orb_b.a * (1 - orb_b.e) - orb_a.a * (1 - orb_a.e)) ** 2
+    D += (e_b - e_a) ** 2
+    D += (a_b * (1 - e_b) - a_a * (1 - e_a)) ** 2
     D += (2 * np.sin(I_ab * 0.5)) ** 2
-    D += ((orb_b.e + orb_a.e) * np.sin(PI_ab * 0.5)) ** 2
+    D += ((e_b + e_a) * np.sin(PI_ab * 0.5)) ** 2
 
     return D
 
 
-def D_V(orb_a, orb_b, weights=None):
-    """Jopek, Rudawska, Bartczak, 2008
+def D_SH(orb_a, orb_b):
+    """Southworth and Hawkings, 1963
 
     :param orb_a pyorb.Orbit: First input orbit into criterion calculation
     :param orb_b pyorb.Orbit: Second input orbit into criterion calculation
     :return: Criterion value
 
-    #TODO: make sure correct units
+    #TODO: make degrees vs radians safe function
+    #TODO: make sure correct units are always used (distance in AU?)
     """
+    return D_SH_elements(
+        orb_a.a, orb_a.e, orb_a.i, orb_a.omega, orb_a.Omega,
+        orb_b.a, orb_b.e, orb_b.i, orb_b.omega, orb_b.Omega,
+    )
 
-    mu_a = orb_a.G * (orb_a.M0 + orb_a.m)
-    mu_b = orb_b.G * (orb_b.M0 + orb_b.m)
+
+def orbit_invariants(cartesian, mu):
+    """Orbital invariants used by the D_V criterion
+
+    :param cartesian numpy.ndarray: (6, N) cartesian states
+    :param mu float: Standard gravitational parameter(s) of the orbits
+    :return: (7, N) array of area vector (3), Laplace-Runge-Lenz vector (3)
+        and orbital energy
+    """
+    cartesian = np.asarray(cartesian, dtype=np.float64)
+    if cartesian.ndim == 1:
+        cartesian = cartesian.reshape(6, 1)
 
     # area vector
-    c_a = np.cross(orb_a.cartesian[:3, ...], orb_a.cartesian[3:, ...], axis=0)
-    c_b = np.cross(orb_b.cartesian[:3, ...], orb_b.cartesian[3:, ...], axis=0)
+    c = np.cross(cartesian[:3, ...], cartesian[3:, ...], axis=0)
 
     # Laplace-Runge-Lenz vector
-    ra_norm = np.linalg.norm(orb_a.cartesian[3:, ...], axis=0)
-    lrl_a = (
-        np.cross(orb_a.cartesian[3:, ...], c_a, axis=0) / mu_a
-        - orb_a.cartesian[3:, ...] / ra_norm
-    )
-
-    rb_norm = np.linalg.norm(orb_b.cartesian[3:, ...], axis=0)
-    lrl_b = (
-        np.cross(orb_b.cartesian[3:, ...], c_b, axis=0) / mu_b
-        - orb_b.cartesian[3:, ...] / rb_norm
-    )
+    r_norm = np.linalg.norm(cartesian[:3, ...], axis=0)
+    lrl = np.cross(cartesian[3:, ...], c, axis=0) / mu - cartesian[:3, ...] / r_norm
 
     # Orbital energy
-    E_a = 0.5 * np.linalg.norm(orb_a.cartesian[3:, ...], axis=0) ** 2 - mu_a / ra_norm
-    E_b = 0.5 * np.linalg.norm(orb_b.cartesian[3:, ...], axis=0) ** 2 - mu_b / rb_norm
+    E = 0.5 * np.linalg.norm(cartesian[3:, ...], axis=0) ** 2 - mu / r_norm
+
+    invariants = np.empty((7, cartesian.shape[1]), dtype=np.float64)
+    invariants[:3, ...] = c
+    invariants[3:6, ...] = lrl
+    invariants[6, ...] = E
+    return invariants
 
-    Oa = np.empty((7, orb_a.num), dtype=np.float64)
-    Oa[:3, ...] = c_a
-    Oa[3:6, ...] = lrl_a
-    Oa[6, ...] = E_a
 
-    Ob = np.empty((7, orb_b.num), dtype=np.float64)
-    Ob[:3, ...] = c_b
-    Ob[3:6, ...] = lrl_b
-    Ob[6, ...] = E_b
+@dataclass
+class OrbitInvariants:
+    """Precomputed (7, N) orbital invariants for the D_V criterion.
 
+    Computing the invariants is the main cost of `D_V`, when one side of an
+    association is a fixed catalogue they can be computed once, stored
+    (optionally as float32) and memory-mapped by later jobs.
+    """
+    invariants: np.ndarray
+
+    def __post_init__(self):
+        if self.invariants.ndim != 2 or self.invariants.shape[0] != 7:
+            raise ValueError(f"Invariants must be (7, N), got {self.invariants.shape}")
+
+    @classmethod
+    def from_cartesian(cls, cartesian, mu, dtype=np.float64) -> "OrbitInvariants":
+        return cls(orbit_invariants(cartesian, mu).astype(dtype, copy=False))
+
+    @classmethod
+    def from_orbit(cls, orb, dtype=np.float64) -> "OrbitInvariants":
+        mu = orb.G * (orb.M0 + orb.m)
+        return cls.from_cartesian(orb.cartesian, mu, dtype=dtype)
+
+    @property
+    def num(self) -> int:
+        return self.invariants.shape[1]
+
+    def __len__(self) -> int:
+        return self.num
+
+    def __getitem__(self, key) -> "OrbitInvariants":
+        if isinstance(key, (int, np.integer)):
+            key = slice(key, key + 1) if key != -1 else slice(-1, None)
+        return OrbitInvariants(self.invariants[:, key])
+
+    def save(self, path: str | Path) -> None:
+        """Save as a `.npy` file that `load` can memory-map."""
+        np.save(path, np.ascontiguousarray(self.invariants))
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "OrbitInvariants":
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    @classmethod
+    def cached(cls, path: str | Path, orb, dtype=np.float64) -> "OrbitInvariants":
+        """Load the invariants from `path` or compute them from `orb` and save them there."""
+        path = Path(path)
+        if path.exists():
+            invariants = cls.load(path)
+            if invariants.num != orb.num:
+                raise ValueError(
+                    f"Cached invariants in {path} are for {invariants.num} orbits, "
+                    f"got {orb.num}"
+                )
+            return invariants
+        invariants = cls.from_orbit(orb, dtype=dtype)
+        invariants.save(path)
+        return invariants
+
+
+def _as_invariants(orb) -> np.ndarray:
+    if isinstance(orb, OrbitInvariants):
+        return orb.invariants
+    mu = orb.G * (orb.M0 + orb.m)
+    return orbit_invariants(orb.cartesian, mu)
+
+
+def D_V_invariants(Oa, Ob, weights=None):
+    """Jopek, Rudawska, Bartczak, 2008, on precomputed orbital invariants
+
+    The invariant arrays have 7 rows (see `orbit_invariants`) and trailing
+    dimensions that are broadcast against each other, e.g. (7, N, 1) and
+    (7, 1, M) give the (N, M) criterion values.
+
+    :return: Criterion value
+    """
     D = (Oa - Ob) ** 2
     D[2, ...] *= 1.5
     D[6, ...] *= 2
     if weights is not None:
-        D = D * weights[:, None]
+        weights = np.asarray(weights, dtype=np.float64)
+        D = D * weights.reshape((7,) + (1,) * (D.ndim - 1))
 
     D = np.sqrt(np.sum(D, axis=0))
 
     return D
+
+
+def D_V(orb_a, orb_b, weights=None):
+    """Jopek, Rudawska, Bartczak, 2008
+
+    :param orb_a pyorb.Orbit | OrbitInvariants: First input orbit into criterion calculation
+    :param orb_b pyorb.Orbit | OrbitInvariants: Second input orbit into criterion calculation
+    :return: Criterion value
+
+    #TODO: make sure correct units
+    """
+    return D_V_invariants(_as_invariants(orb_a), _as_invariants(orb_b), weights=weights)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+"""
+Spatial index for D-criterion neighbour searches
+=================================================
+
+Orbits are embedded into a vector space and stored in a KD-tree so that
+radius and k-nearest searches against a large catalogue cost O(log N) per
+query orbit instead of a full scan.
+
+- D_V is a weighted Euclidean distance between orbital invariants, so
+  scaling the invariants by the square root of the weights gives an
+  embedding where the Euclidean distance *is* D_V.
+- D_SH (as returned by `D_SH`, i.e. the sum of squares) is bounded from
+  below by the squared Euclidean distance between (e, q, n) where n is the
+  orbit plane normal, since the first three terms of the criterion are
+  exactly that distance and the last term is non-negative. The tree is used
+  as a conservative prefilter and the exact criterion is evaluated on the
+  remaining candidates.
+"""
+
+from __future__ import annotations
+import pickle
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .d_criteria import D_SH_elements
+from .pairwise import CRITERIA, pairwise_nearest
+
+
+D_V_WEIGHTS = np.array([1.0, 1.0, 1.5, 1.0, 1.0, 1.0, 2.0])
+"""Fixed per-invariant weights used in `D_V_invariants`"""
+
+
+def embed_D_SH(elements: np.ndarray) -> np.ndarray:
+    """(N, 5) embedding (e, q, n_x, n_y, n_z) of (a, e, i, omega, Omega) elements
+    where the squared distance is a lower bound of D_SH."""
+    a, e, i, _, Omega = elements[:5]
+    emb = np.empty((elements.shape[1], 5), dtype=np.float64)
+    emb[:, 0] = e
+    emb[:, 1] = a * (1 - e)
+    emb[:, 2] = np.sin(i) * np.sin(Omega)
+    emb[:, 3] = -np.sin(i) * np.cos(Omega)
+    emb[:, 4] = np.cos(i)
+    return emb
+
+
+def embed_D_V(invariants: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """(N, 7) embedding of orbital invariants where the Euclidean distance is D_V."""
+    scale = D_V_WEIGHTS.copy()
+    if weights is not None:
+        scale = scale * np.asarray(weights, dtype=np.float64)
+    return (invariants * np.sqrt(scale)[:, None]).T.copy()
+
+
+class OrbitIndex:
+    """KD-tree index over a catalogue of orbits for a D-criterion.
+
+    :param orbits: Catalogue orbits, a `pyorb.Orbit` or the criterion feature
+        array (see `dasst.similarity.pairwise.CRITERIA`)
+    :param criterion: "D_SH" or "D_V"
+    :param weights: Optional extra D_V weights (7,)
+    :param leafsize: Leaf size of the KD-tree
+    """
+
+    SUPPORTED = ("D_SH", "D_V")
+
+    def __init__(self, orbits, criterion: str = "D_SH", weights=None, leafsize: int = 32):
+        if criterion not in self.SUPPORTED:
+            raise ValueError(f"Criterion {criterion!r} not supported, use one of {self.SUPPORTED}")
+        self.criterion = criterion
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        self.features = CRITERIA[criterion].prepare(orbits)
+        self.tree = cKDTree(self._embed(self.features), leafsize=leafsize)
+
+    def __len__(self) -> int:
+        return self.features.shape[1]
+
+    def _embed(self, features: np.ndarray) -> np.ndarray:
+        if self.criterion == "D_SH":
+            return embed_D_SH(features)
+        return embed_D_V(features, self.weights)
+
+    def _exact(self, fq: np.ndarray, index_q: np.ndarray, index_c: np.ndarray) -> np.ndarray:
+        """Exact criterion values for query/catalogue pairs"""
+        return D_SH_elements(*fq[:, index_q], *self.features[:5, index_c])
+
+    def query_radius(self, orbits, cutoff: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """All query/catalogue pairs with criterion value below `cutoff`.
+
+        :return: Index into the query orbits, index into the catalogue and
+            criterion value of each pair, sorted by query index
+        """
+        fq = CRITERIA[self.criterion].prepare(orbits)
+        emb = self._embed(fq)
+
+        radius = np.sqrt(cutoff) if self.criterion == "D_SH" else cutoff
+        pairs = cKDTree(emb).sparse_distance_matrix(self.tree, radius, output_type="ndarray")
+        index_q = pairs["i"].astype(np.int64)
+        index_c = pairs["j"].astype(np.int64)
+
+        if self.criterion == "D_SH":
+            values = self._exact(fq, index_q, index_c)
+        else:
+            values = pairs["v"].astype(np.float64)
+
+        keep = values < cutoff
+        index_q, index_c, values = index_q[keep], index_c[keep], values[keep]
+        order = np.lexsort((index_c, index_q))
+        return index_q[order], index_c[order], values[order]
+
+    def query_nearest(self, orbits, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """The `k` catalogue orbits with the smallest criterion value per query orbit.
+
+        :return: (N, k) catalogue indices and (N, k) criterion values sorted by
+            increasing value. Missing neighbours have index -1 and value inf.
+        """
+        if k < 1:
+            raise ValueError(f"k must be positive, got {k}")
+        fq = CRITERIA[self.criterion].prepare(orbits)
+        emb = self._embed(fq)
+        n_q = emb.shape[0]
+        k_tree = min(k, len(self))
+
+        dist, ind = self.tree.query(emb, k=k_tree)
+        dist = dist.reshape(n_q, k_tree)
+        ind = ind.reshape(n_q, k_tree)
+
+        index = np.full((n_q, k), -1, dtype=np.int64)
+        values = np.full((n_q, k), np.inf, dtype=np.float64)
+
+        if self.criterion == "D_V":
+            found = np.isfinite(dist)
+            index[:, :k_tree] = np.where(found, ind, -1)
+            values[:, :k_tree] = dist
+            return index, values
+
+        # The k embedding neighbours give an upper bound on the k-th smallest
+        # D_SH, every orbit with a lower bound below it is a candidate.
+        rows = np.repeat(np.arange(n_q), k_tree)
+        exact = self._exact(fq, rows, ind.reshape(-1)).reshape(n_q, k_tree)
+        bound = np.max(exact, axis=1)
+
+        # A non-finite bound would make every catalogue orbit a candidate,
+        # those queries are evaluated with the tiled kernel instead
+        brute = ~np.isfinite(bound)
+        if np.any(brute):
+            index[brute], values[brute] = pairwise_nearest(
+                fq[:, brute], self.features, k=k, criterion="D_SH",
+            )
+
+        tree_q = np.flatnonzero(~brute)
+        candidates = self.tree.query_ball_point(emb[tree_q], np.sqrt(bound[tree_q]))
+        counts = np.fromiter((len(c) for c in candidates), dtype=np.int64, count=tree_q.size)
+        index_q = np.repeat(tree_q, counts)
+        index_c = np.fromiter(
+            (j for c in candidates for j in c), dtype=np.int64, count=int(counts.sum())
+        )
+
+        D = self._exact(fq, index_q, index_c)
+        order = np.lexsort((D, index_q))
+        index_q, index_c, D = index_q[order], index_c[order], D[order]
+
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        rank = np.arange(index_q.size) - np.repeat(starts, counts)
+        keep = rank < k
+        index[index_q[keep], rank[keep]] = index_c[keep]
+        values[index_q[keep], rank[keep]] = D[keep]
+        return index, values
+
+    def save(self, path: str | Path) -> None:
+        """Persist the index, including the built tree."""
+        with open(path, "wb") as fh:
+            pickle.dump(self, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "OrbitIndex":
+        with open(path, "rb") as fh:
+            index = pickle.load(fh)
+        if not isinstance(index, cls):
+            raise TypeError(f"{path} does not contain an {cls.__name__}")
+        return index
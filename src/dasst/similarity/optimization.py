@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+"""
+Batched minimum-D optimisation
+==============================
+
+For parent body searches the criterion between an uncertain orbit (e.g. a
+meteoroid orbit with error bars) and each catalogue object is minimised over
+the free elements within their bounds. Instead of running one scalar
+optimiser per catalogue object, all pairs are optimised simultaneously with
+projected Adam steps on arrays using analytic gradients.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def D_SH_value_and_grad(fixed: np.ndarray, free: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Southworth and Hawkings criterion (as returned by `D_SH`) and its
+    analytic gradient with respect to the elements of the free orbit.
+
+    :param fixed: (5, N) elements (a, e, i, omega, Omega) of the fixed orbits
+    :param free: (5, N) elements (a, e, i, omega, Omega) of the free orbits
+    :return: (N,) criterion values and (5, N) gradient
+    """
+    a_a, e_a, i_a, omega_a, Omega_a = fixed
+    a_b, e_b, i_b, omega_b, Omega_b = free
+
+    d_i = i_b - i_a
+    s_i = i_b + i_a
+    d_Omega = Omega_b - Omega_a
+    sin_half_i = np.sin(0.5 * d_i)
+    sin_half_s = np.sin(0.5 * s_i)
+    cos_half_s = np.cos(0.5 * s_i)
+    sin_half_O = np.sin(0.5 * d_Omega)
+    cos_half_O = np.cos(0.5 * d_Omega)
+
+    # Plane term, equal to (2 sin(I_ab / 2))^2
+    S = (2 * sin_half_i) ** 2 + np.sin(i_a) * np.sin(i_b) * (2 * sin_half_O) ** 2
+    dS_di = 2 * np.sin(d_i) + np.sin(i_a) * np.cos(i_b) * (2 * sin_half_O) ** 2
+    dS_dO = np.sin(i_a) * np.sin(i_b) * 2 * np.sin(d_Omega)
+
+    # Longitude of perihelion term, u = sin(pi_ab / 2 - (omega_b - omega_a) / 2)
+    # lies in [-1, 1] and is clipped against rounding like in `D_SH_elements`
+    c = np.sqrt(np.clip(1 - 0.25 * S, 1e-15, None))  # cos(I_ab / 2)
+    u = np.clip(cos_half_s * sin_half_O / c, -1.0, 1.0)
+    du_di = -0.5 * sin_half_s * sin_half_O / c + cos_half_s * sin_half_O * dS_di / (8 * c**3)
+    du_dO = 0.5 * cos_half_s * cos_half_O / c + cos_half_s * sin_half_O * dS_dO / (8 * c**3)
+    darcsin = 2 / np.sqrt(np.clip(1 - u**2, 1e-15, None))
+
+    PI = omega_b - omega_a + 2 * np.arcsin(u)
+    e_sum = e_a + e_b
+    sin_half_PI = np.sin(0.5 * PI)
+    dT4_dPI = 0.5 * e_sum**2 * np.sin(PI)
+
+    d_e = e_b - e_a
+    d_q = a_b * (1 - e_b) - a_a * (1 - e_a)
+
+    D = d_e**2 + d_q**2 + S + (e_sum * sin_half_PI) ** 2
+
+    grad = np.empty((5,) + np.shape(D), dtype=np.float64)
+    grad[0] = 2 * d_q * (1 - e_b)
+    grad[1] = 2 * d_e - 2 * d_q * a_b + 2 * e_sum * sin_half_PI**2
+    grad[2] = dS_di + dT4_dPI * darcsin * du_di
+    grad[3] = dT4_dPI
+    grad[4] = dS_dO + dT4_dPI * darcsin * du_dO
+    return D, grad
+
+
+GRADIENTS: Dict[str, Callable[[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]] = {
+    "D_SH": D_SH_value_and_grad,
+}
+"""Criteria with analytic gradients usable by `minimize_D`"""
+
+
+def minimize_D(
+    fixed: np.ndarray,
+    x0: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    criterion: str = "D_SH",
+    n_starts: int = 1,
+    seed: Optional[int] = None,
+    max_iter: int = 500,
+    step: float = 0.05,
+    final_step: float = 1e-4,
+    tol: float = 1e-12,
+    beta1: float = 0.9,
+    beta2: float = 0.999,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimise a criterion for many orbit pairs simultaneously.
+
+    Each pair is optimised independently with projected Adam steps: the free
+    elements are updated with bias-corrected moment estimates of the analytic
+    gradient and clipped to their bounds after every step. The step size
+    decays geometrically from `step` to `final_step` (fractions of the bound
+    widths) over `max_iter` iterations.
+
+    The criteria are not convex in the angles, so additional starting points
+    drawn uniformly within the bounds can be added with `n_starts`; all starts
+    of all pairs are optimised in the same batch and the best is returned.
+
+    :param fixed: (5, N) elements (a, e, i, omega, Omega) of the fixed orbits
+    :param x0: (5,) or (5, N) initial free elements
+    :param lower: (5,) or (5, N) lower bounds of the free elements
+    :param upper: (5,) or (5, N) upper bounds of the free elements
+    :param criterion: Name of a criterion in `GRADIENTS`
+    :param n_starts: Number of starting points per pair, the first is `x0`
+    :param seed: Seed for the additional starting points
+    :param max_iter: Maximum number of iterations
+    :param tol: Stop when no pair has improved by more than this over the
+        last iteration, checked once the step size has decayed by a factor 10
+    :return: (5, N) optimal free elements and (N,) minimum criterion values
+    """
+    if criterion not in GRADIENTS:
+        raise ValueError(
+            f"No gradient for criterion {criterion!r}, choose from {sorted(GRADIENTS)}"
+        )
+    if n_starts < 1:
+        raise ValueError(f"n_starts must be positive, got {n_starts}")
+    value_and_grad = GRADIENTS[criterion]
+
+    fixed = np.asarray(fixed, dtype=np.float64)
+    if fixed.ndim == 1:
+        fixed = fixed.reshape(-1, 1)
+    fixed = fixed[:5, :]
+    num = fixed.shape[1]
+
+    def _expand(values):
+        return np.broadcast_to(np.asarray(values, dtype=np.float64).reshape(5, -1), (5, num))
+
+    lower = _expand(lower)
+    upper = _expand(upper)
+    if np.any(upper < lower):
+        raise ValueError("Upper bounds must be larger than or equal to lower bounds.")
+    x = np.clip(_expand(x0), lower, upper)
+
+    # Starting points are laid out as (5, n_starts * N) with the pairs fastest
+    if n_starts > 1:
+        rng = np.random.default_rng(seed)
+        extra = rng.uniform(
+            np.tile(lower, n_starts - 1), np.tile(upper, n_starts - 1),
+        )
+        x = np.concatenate([x, extra], axis=1)
+        fixed = np.tile(fixed, n_starts)
+        lower = np.tile(lower, n_starts)
+        upper = np.tile(upper, n_starts)
+
+    width = upper - lower
+    decay = (final_step / step) ** (1.0 / max(max_iter, 1))
+    lr = step
+    m = np.zeros(x.shape)
+    v = np.zeros(x.shape)
+
+    D, grad = value_and_grad(fixed, x)
+    best_x = x.copy()
+    best_D = D.copy()
+
+    for it in range(1, max_iter + 1):
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad**2
+        m_hat = m / (1 - beta1**it)
+        v_hat = v / (1 - beta2**it)
+        x = np.clip(x - lr * width * m_hat / (np.sqrt(v_hat) + 1e-12), lower, upper)
+        lr *= decay
+
+        D, grad = value_and_grad(fixed, x)
+        improved = D < best_D
+        gain = np.max(best_D[improved] - D[improved], initial=0.0)
+        best_x[:, improved] = x[:, improved]
+        best_D[improved] = D[improved]
+
+        if lr < 0.1 * step and gain < tol:
+            break
+
+    if n_starts > 1:
+        best = np.argmin(best_D.reshape(n_starts, num), axis=0)
+        cols = best * num + np.arange(num)
+        best_x, best_D = best_x[:, cols], best_D[cols]
+    return best_x, best_D
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+"""
+All-pairs evaluation of D-criteria
+==================================
+
+Evaluates a D-criterion between every orbit in set A and every orbit in set B
+without ever forming the dense (N, M) matrix. The pairs are evaluated over
+tiles of bounded size, distributed over a thread (or process) pool, and either
+the pairs below a cutoff or the k nearest orbits in B for each orbit in A are
+kept.
+
+Criteria are registered in `CRITERIA` as a pair of functions: `prepare` turns
+the input orbits into a (F, N) feature array and `kernel` evaluates the
+criterion between (F, n, 1) and (F, 1, m) feature blocks. With a process
+pool the kernel is pickled to the workers, so it has to be a module level
+function (not a lambda or a locally defined function).
+"""
+
+from __future__ import annotations
+import os
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .d_criteria import D_SH_elements, D_V_invariants, orbit_invariants, OrbitInvariants
+
+
+DEFAULT_TILE_SIZE = 2048
+"""Default number of orbits per tile side, a tile holds tile_size**2 values"""
+
+
+@dataclass
+class Criterion:
+    """A D-criterion that can be evaluated on blocks of orbit features"""
+    name: str
+    prepare: Callable[..., np.ndarray]
+    kernel: Callable[..., np.ndarray]
+
+
+CRITERIA: Dict[str, Criterion] = {}
+"""Registered criteria for the pairwise engine"""
+
+
+def register_criterion(name: str, prepare: Callable, kernel: Callable) -> None:
+    """Register a criterion for use with `pairwise_threshold` and `pairwise_nearest`."""
+    CRITERIA[name] = Criterion(name=name, prepare=prepare, kernel=kernel)
+
+
+def _prepare_D_SH(orbits) -> np.ndarray:
+    if hasattr(orbits, "kepler"):
+        return np.stack([
+            np.atleast_1d(orbits.a), np.atleast_1d(orbits.e), np.atleast_1d(orbits.i),
+            np.atleast_1d(orbits.omega), np.atleast_1d(orbits.Omega),
+        ]).astype(np.float64)
+    elements = np.asarray(orbits, dtype=np.float64)
+    if elements.ndim == 1:
+        elements = elements.reshape(-1, 1)
+    if elements.shape[0] < 5:
+        raise ValueError(
+            f"D_SH needs (a, e, i, omega, Omega) rows, got shape {elements.shape}"
+        )
+    return elements[:5, :]
+
+
+def _kernel_D_SH(fa, fb) -> np.ndarray:
+    return D_SH_elements(*fa, *fb)
+
+
+def _prepare_D_V(orbits) -> np.ndarray:
+    if isinstance(orbits, OrbitInvariants):
+        return orbits.invariants
+    if hasattr(orbits, "cartesian"):
+        mu = orbits.G * (orbits.M0 + orbits.m)
+        return orbit_invariants(orbits.cartesian, mu)
+    invariants = np.asarray(orbits)
+    if invariants.ndim == 1:
+        invariants = invariants.reshape(-1, 1)
+    if invariants.shape[0] != 7:
+        raise ValueError(f"D_V needs (7, N) orbital invariants, got shape {invariants.shape}")
+    return invariants
+
+
+def _kernel_D_V(fa, fb, weights=None) -> np.ndarray:
+    return D_V_invariants(fa, fb, weights=weights)
+
+
+register_criterion("D_SH", _prepare_D_SH, _kernel_D_SH)
+register_criterion("D_V", _prepare_D_V, _kernel_D_V)
+
+
+def _get_criterion(criterion: str | Criterion) -> Criterion:
+    if isinstance(criterion, Criterion):
+        return criterion
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion {criterion!r}, choose from {sorted(CRITERIA)}")
+    return CRITERIA[criterion]
+
+
+def _blocks(n: int, size: int):
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+def _tile(kernel, fa, fb, kernel_kwargs) -> np.ndarray:
+    D = kernel(fa[:, :, None], fb[:, None, :], **kernel_kwargs)
+    return np.broadcast_to(D, (fa.shape[1], fb.shape[1]))
+
+
+def _threshold_rows(kernel, fa, fb, row0, cutoff, tile_size, kernel_kwargs):
+    index_a = [np.empty((0,), dtype=np.int64)]
+    index_b = [np.empty((0,), dtype=np.int64)]
+    values = [np.empty((0,), dtype=np.float64)]
+    for b0, b1 in _blocks(fb.shape[1], tile_size):
+        D = _tile(kernel, fa, fb[:, b0:b1], kernel_kwargs)
+        ia, ib = np.nonzero(D < cutoff)
+        index_a.append(ia + row0)
+        index_b.append(ib + b0)
+        values.append(D[ia, ib])
+    index_a, index_b, values = (np.concatenate(x) for x in (index_a, index_b, values))
+    order = np.lexsort((index_b, index_a))
+    return index_a[order], index_b[order], values[order]
+
+
+def _nearest_rows(kernel, fa, fb, k, tile_size, kernel_kwargs):
+    n = fa.shape[1]
+    best_D = np.full((n, 0), np.inf, dtype=np.float64)
+    best_ind = np.empty((n, 0), dtype=np.int64)
+    for b0, b1 in _blocks(fb.shape[1], tile_size):
+        D = _tile(kernel, fa, fb[:, b0:b1], kernel_kwargs)
+        cand_D = np.concatenate([best_D, D], axis=1)
+        cand_ind = np.concatenate(
+            [best_ind, np.broadcast_to(np.arange(b0, b1, dtype=np.int64), D.shape)], axis=1
+        )
+        if cand_D.shape[1] > k:
+            keep = np.argpartition(cand_D, k - 1, axis=1)[:, :k]
+            cand_D = np.take_along_axis(cand_D, keep, axis=1)
+            cand_ind = np.take_along_axis(cand_ind, keep, axis=1)
+        best_D, best_ind = cand_D, cand_ind
+
+    order = np.argsort(best_D, axis=1, kind="stable")
+    best_D = np.take_along_axis(best_D, order, axis=1)
+    best_ind = np.take_along_axis(best_ind, order, axis=1)
+    best_ind[np.isinf(best_D)] = -1
+    return best_ind, best_D
+
+
+_WORKER_SHARED = None
+"""(kernel, fb, kernel_kwargs) sent once to each process pool worker"""
+
+
+def _init_worker(kernel, fb, kernel_kwargs):
+    global _WORKER_SHARED
+    _WORKER_SHARED = (kernel, fb, kernel_kwargs)
+
+
+def _run_rows(rows, fa, shared, *args):
+    kernel, fb, kernel_kwargs = _WORKER_SHARED if shared is None else shared
+    return rows(kernel, fa, fb, *args, kernel_kwargs)
+
+
+def _executor(workers: Optional[int], processes: bool, kernel, fb, kernel_kwargs):
+    """Pool and the shared arguments to pass to `_run_rows`, process workers
+    receive the B features once when started instead of once per row block."""
+    workers = workers or os.cpu_count() or 1
+    shared = (kernel, fb, kernel_kwargs)
+    if processes:
+        pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=shared,
+        )
+        return pool, None
+    return ThreadPoolExecutor(max_workers=workers), shared
+
+
+def pairwise_threshold(
+    orbits_a,
+    orbits_b,
+    cutoff: float,
+    criterion: str | Criterion = "D_SH",
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    **kernel_kwargs,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All pairs of orbits with criterion value below `cutoff`.
+
+    :param orbits_a: First orbit set, a `pyorb.Orbit` or a feature array of the
+        criterion (see `CRITERIA`), e.g. (a, e, i, omega, Omega) rows for D_SH
+    :param orbits_b: Second orbit set, same format as `orbits_a`
+    :param cutoff: Pairs with a criterion value below this are kept
+    :param criterion: Name of a registered criterion or a `Criterion`
+    :param tile_size: Number of orbits per tile side, bounds the memory use
+    :param workers: Number of pool workers, defaults to the number of CPUs
+    :param processes: Use a process pool instead of a thread pool, a custom
+        `Criterion` then needs a picklable (module level) kernel
+    :return: Index into A, index into B and criterion value of each pair,
+        sorted by index into A and then by index into B
+    """
+    crit = _get_criterion(criterion)
+    fa = crit.prepare(orbits_a)
+    fb = crit.prepare(orbits_b)
+
+    blocks = _blocks(fa.shape[1], tile_size)
+    index_a, index_b, values = [], [], []
+    pool, shared = _executor(workers, processes, crit.kernel, fb, kernel_kwargs)
+    with pool:
+        futures = [
+            pool.submit(
+                _run_rows, _threshold_rows, fa[:, a0:a1], shared, a0, cutoff, tile_size,
+            )
+            for a0, a1 in blocks
+        ]
+        for future in futures:
+            ia, ib, vals = future.result()
+            index_a.append(ia)
+            index_b.append(ib)
+            values.append(vals)
+
+    if not values:
+        return (
+            np.empty((0,), dtype=np.int64),
+            np.empty((0,), dtype=np.int64),
+            np.empty((0,), dtype=np.float64),
+        )
+    return np.concatenate(index_a), np.concatenate(index_b), np.concatenate(values)
+
+
+def pairwise_nearest(
+    orbits_a,
+    orbits_b,
+    k: int = 1,
+    criterion: str | Criterion = "D_SH",
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: Optional[int] = None,
+    processes: bool = False,
+    **kernel_kwargs,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The `k` orbits in B with the smallest criterion value for each orbit in A.
+
+    Parameters are the same as for `pairwise_threshold`.
+
+    :return: (N_a, k) indices into B and (N_a, k) criterion values, sorted
+        by increasing value. Missing neighbours have index -1 and value inf.
+    """
+    if k < 1:
+        raise ValueError(f"k must be positive, got {k}")
+    crit = _get_criterion(criterion)
+    fa = crit.prepare(orbits_a)
+    fb = crit.prepare(orbits_b)
+
+    index = np.full((fa.shape[1], k), -1, dtype=np.int64)
+    values = np.full((fa.shape[1], k), np.inf, dtype=np.float64)
+    pool, shared = _executor(workers, processes, crit.kernel, fb, kernel_kwargs)
+    with pool:
+        futures = {
+            (a0, a1): pool.submit(_run_rows, _nearest_rows, fa[:, a0:a1], shared, k, tile_size)
+            for a0, a1 in _blocks(fa.shape[1], tile_size)
+        }
+        for (a0, a1), future in futures.items():
+            ind, vals = future.result()
+            index[a0:a1, :ind.shape[1]] = ind
+            values[a0:a1, :vals.shape[1]] = vals
+
+    return index, values
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""
+D-criteria along propagated trajectories
+========================================
+
+Evaluates a D-criterion between pairs of particles at every epoch of two
+(6, T, N) state tensors, e.g. the population states returned by
+`Simulation.run`. The states are processed in blocks of epochs and only the
+particles that take part in a pair are converted, so the orbital elements of
+the full trajectories are never materialised.
+
+The states are assumed to be in an inertial heliocentric frame in SI units
+(m, m/s), the same units as the propagator output. The criteria are evaluated
+in AU and AU/s to match the conventions used with `pyorb.Orbit` elsewhere.
+"""
+
+from __future__ import annotations
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pyorb
+
+from .d_criteria import D_SH_elements, D_V_invariants, orbit_invariants
+
+
+DEFAULT_EPOCH_BLOCK = 256
+"""Default number of epochs converted per block"""
+
+MU_SUN_AU = pyorb.get_G(length="AU", mass="kg", time="s") * pyorb.M_sol
+"""Standard gravitational parameter of the Sun in AU^3/s^2"""
+
+
+def _pair_indices(states_a, states_b, pairs) -> Tuple[np.ndarray, np.ndarray]:
+    if pairs is None:
+        if states_a.shape[2] != states_b.shape[2]:
+            raise ValueError(
+                "Without explicit pairs both trajectories need the same number of "
+                f"particles, got {states_a.shape[2]} and {states_b.shape[2]}"
+            )
+        index = np.arange(states_a.shape[2], dtype=np.int64)
+        return index, index
+    index_a, index_b = (np.asarray(ind, dtype=np.int64) for ind in pairs)
+    if index_a.shape != index_b.shape:
+        raise ValueError("Pair index arrays must have the same shape.")
+    return index_a, index_b
+
+
+def _features(states: np.ndarray, criterion: str, mu: float, length_unit: float) -> np.ndarray:
+    """(F, T*n) criterion features of a (6, T, n) block of states"""
+    cart = np.asarray(states, dtype=np.float64).reshape(6, -1) / length_unit
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if criterion == "D_SH":
+            return pyorb.cart_to_kep(cart, mu=mu, degrees=False)[:5]
+        return orbit_invariants(cart, mu)
+
+
+def iter_D_trajectory(
+    states_a: np.ndarray,
+    states_b: np.ndarray,
+    pairs: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    criterion: str = "D_SH",
+    epoch_block: int = DEFAULT_EPOCH_BLOCK,
+    mu: float = MU_SUN_AU,
+    length_unit: float = pyorb.AU,
+    weights: Optional[np.ndarray] = None,
+) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """Criterion time series of particle pairs, one block of epochs at a time.
+
+    :param states_a: (6, T, N_a) states of the first set of particles
+    :param states_b: (6, T, N_b) states of the second set of particles
+    :param pairs: Index arrays (index_a, index_b) of the P pairs to evaluate,
+        defaults to the element-wise pairs of two equally sized sets
+    :param criterion: "D_SH" or "D_V"
+    :param epoch_block: Number of epochs per block
+    :param mu: Standard gravitational parameter in length_unit^3/s^2
+    :param length_unit: Length unit of the criterion in meters
+    :param weights: Optional extra D_V weights
+    :return: Iterator of (start, end, D) where D is the (end - start, P)
+        criterion values of the epochs start:end
+    """
+    if criterion not in ("D_SH", "D_V"):
+        raise ValueError(f"Criterion {criterion!r} not supported, use 'D_SH' or 'D_V'")
+    if states_a.shape[1] != states_b.shape[1]:
+        raise ValueError(
+            f"Trajectories have different number of epochs: {states_a.shape[1]} "
+            f"and {states_b.shape[1]}"
+        )
+    index_a, index_b = _pair_indices(states_a, states_b, pairs)
+
+    # Convert each participating particle once per epoch
+    uniq_a, inv_a = np.unique(index_a, return_inverse=True)
+    uniq_b, inv_b = np.unique(index_b, return_inverse=True)
+
+    num_t = states_a.shape[1]
+    for start in range(0, num_t, epoch_block):
+        end = min(start + epoch_block, num_t)
+        size = end - start
+        fa = _features(states_a[:, start:end, :][:, :, uniq_a], criterion, mu, length_unit)
+        fb = _features(states_b[:, start:end, :][:, :, uniq_b], criterion, mu, length_unit)
+        fa = fa.reshape(-1, size, uniq_a.size)[:, :, inv_a]
+        fb = fb.reshape(-1, size, uniq_b.size)[:, :, inv_b]
+
+        if criterion == "D_SH":
+            D = D_SH_elements(*fa, *fb)
+        else:
+            D = D_V_invariants(fa, fb, weights=weights)
+        yield start, end, D
+
+
+def D_trajectory(
+    states_a: np.ndarray,
+    states_b: np.ndarray,
+    pairs: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    criterion: str = "D_SH",
+    epoch_block: int = DEFAULT_EPOCH_BLOCK,
+    **kwargs,
+) -> np.ndarray:
+    """Criterion time series of particle pairs along two trajectories.
+
+    See `iter_D_trajectory` for the parameters.
+
+    :return: (T, P) criterion value of every pair at every epoch
+    """
+    index_a, _ = _pair_indices(states_a, states_b, pairs)
+    D = np.empty((states_a.shape[1], index_a.size), dtype=np.float64)
+    for start, end, block in iter_D_trajectory(
+        states_a, states_b, pairs=pairs, criterion=criterion, epoch_block=epoch_block, **kwargs,
+    ):
+        D[start:end] = block
+    return D
@@ -1,13 +1,18 @@
 #!/usr/bin/env python
+import time
 import tomllib
 import numpy as np
 from pathlib import Path
 from dasst.propagators import Rebound
 from astropy.time import Time, TimeDelta
 from dataclasses import dataclass, field
-from dasst.populations import PopulationConfig, realise_population
+from dasst.populations import PopulationConfig, PopulationSource, PopulationIndex
+from dasst.populations import realise_population
+from dasst.encounters import node_crossings, body_index
 from dasst.types import NDArray_6xN
-from typing import Dict, Any, Optional, List, Tuple
+from dasst.profiling import collect_execution_times, execution_timer
+from dasst.profiling.metrics import run_metrics
+from typing import Dict, Any, Optional, List, Tuple, Iterator
 
 
 def _propagation_stuff(stuff):
@@ -47,13 +52,51 @@ class SimConfig:
     # Additional tracking logic
     tracking: Dict[str, Any] = field(default_factory=dict)
 
+    # Output timeline segments, a uniform grid every time_step if empty.
+    # Each segment is either dict(start=, end=, dt=) in seconds,
+    # dict(times=[...]) in seconds or dict(epochs=[...]) as isot strings.
+    timeline: List[Dict[str, Any]] = field(default_factory=list)
+
+    # Extra output while particles are close to a body,
+    # dict(body="Earth", distance=meters, time_step=seconds)
+    dense_output: Dict[str, Any] = field(default_factory=dict)
+
     @property
     def epoch(self) -> Time:
         return Time(self.simulation_epoch, format="isot", scale="utc")
 
+    def _segment_times(self, segment: Dict[str, Any]) -> np.ndarray:
+        unknown = set(segment) - {"start", "end", "dt", "times", "epochs"}
+        if unknown:
+            raise ValueError(f"Unknown timeline segment keys: {sorted(unknown)}")
+
+        if "times" in segment:
+            return np.asarray(segment["times"], dtype=float).reshape(-1)
+
+        if "epochs" in segment:
+            epochs = Time(list(segment["epochs"]), format="isot", scale="utc")
+            return (epochs - self.epoch).sec.reshape(-1)
+
+        if "dt" not in segment:
+            raise ValueError("Timeline segment needs one of 'dt', 'times' or 'epochs'.")
+
+        start = float(segment.get("start", 0.0))
+        end = float(segment.get("end", self.simulation_time))
+        dt = float(segment["dt"])
+        if dt <= 0:
+            raise ValueError(f"Timeline segment dt must be positive, got {dt}")
+        n_steps = int(np.floor((end - start) / dt + 1e-9)) + 1
+        return start + np.arange(max(n_steps, 0), dtype=float) * dt
+
     def make_timeline(self) -> TimeDelta:
-        n_steps = int(np.floor(self.simulation_time / self.time_step)) + 1
-        t_vals = np.arange(0.0, n_steps * self.time_step, self.time_step, dtype=float)
+        if not self.timeline:
+            n_steps = int(np.floor(self.simulation_time / self.time_step)) + 1
+            t_vals = np.arange(0.0, n_steps * self.time_step, self.time_step, dtype=float)
+            return TimeDelta(t_vals, format="sec")
+
+        t_vals = np.unique(
+            np.concatenate([self._segment_times(segment) for segment in self.timeline])
+        )
         return TimeDelta(t_vals, format="sec")
 
 
@@ -127,6 +170,19 @@ class Simulation:
         tracking = sim_config.get("rebound_tracking", {})
         config.tracking = tracking
 
+        # Output timeline
+        timeline = sim_config.get("timeline", [])
+        if isinstance(timeline, dict):
+            timeline = [timeline]
+        config.timeline = list(timeline)
+
+        dense_output = sim_config.get("dense_output", {})
+        if dense_output:
+            missing = {"distance", "time_step"} - set(dense_output)
+            if missing:
+                raise ValueError(f"[simulation.dense_output] is missing {sorted(missing)}")
+        config.dense_output = dense_output
+
         # Bodies
         bodies = data.get("bodies", {})
         bodies_massive = bodies.get("massive", {})
@@ -183,6 +239,9 @@ class Simulation:
 
         settings.update(config.tracking)
 
+        if config.dense_output:
+            settings["dense_output"] = config.dense_output
+
         if use_reboundx and config.reboundx:
             print("ReboundX on!")
             settings["reboundx"] = config.reboundx
@@ -192,9 +251,10 @@ class Simulation:
     def propagate(
         self,
         states: NDArray_6xN,
-        frame: str,
+        frame: str | np.ndarray,
         use_rebound: bool,
         birth_times: Optional[np.ndarray] = None,
+        particle_hashes: Optional[np.ndarray] = None,
     ) -> Dict[str, Any]:
 
         config = self.config
@@ -203,9 +263,12 @@ class Simulation:
 
         n_particles = states.shape[1] if states.ndim > 1 else 1
 
-        particle_hashes = Rebound.TEST_HASH_INIT + np.arange(
-            n_particles, dtype=np.int64
-        )
+        if particle_hashes is None:
+            particle_hashes = Rebound.TEST_HASH_INIT + np.arange(
+                n_particles, dtype=np.int64
+            )
+        else:
+            particle_hashes = np.asarray(particle_hashes, dtype=np.int64)
 
         if birth_times is None:
             birth_times = np.zeros(n_particles, dtype=float)
@@ -224,6 +287,18 @@ class Simulation:
         if np.any(birth_times < 0.0):
             raise ValueError(f"Negative birth times are not allowed.")
 
+        # A frame per particle, all groups are converted and integrated together
+        if isinstance(frame, str):
+            in_frames = None
+        else:
+            in_frames = np.asarray(frame)
+            if in_frames.shape != (n_particles,):
+                raise ValueError(
+                    f"Frames must be a string or have shape ({n_particles},), "
+                    f"got {in_frames.shape}"
+                )
+            frame = self.config.in_frame
+
         reb = self.create_simulation(use_reboundx=use_rebound, in_frame=frame)
 
         particles_states, massive_states = reb.propagate(
@@ -232,6 +307,7 @@ class Simulation:
             epoch,
             birth_times=birth_times,
             particle_hashes=particle_hashes,
+            in_frames=in_frames,
         )
 
         if particles_states.ndim == 2:
@@ -246,8 +322,61 @@ class Simulation:
             particle_hashes=particle_hashes,
             rebound=reb,
             particle_events=reb.events,
+            dense_output=reb.dense_output,
+            metrics=reb.metrics,
         )
 
+    def population_sources(
+        self,
+        populations: List[PopulationConfig],
+        chunk_size: Optional[int] = None,
+    ) -> List[PopulationSource]:
+        """
+        Create lazy chunked sources for the populations. Each population gets
+        its own RNG stream spawned from the simulation seed so the realised
+        particles do not depend on the order or number of populations before it.
+        """
+        seeds = np.random.SeedSequence(self.config.seed).spawn(len(populations))
+        return [
+            PopulationSource(pop_config, seed=seed, chunk_size=chunk_size)
+            for pop_config, seed in zip(populations, seeds)
+        ]
+
+    def run_chunks(
+        self,
+        populations: List[PopulationConfig],
+        chunk_size: Optional[int] = None,
+        use_rebound: bool = True,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Propagate populations one chunk at a time without ever materialising
+        the full populations. Test particles do not interact, so every chunk is
+        integrated in its own simulation against the same massive bodies.
+
+        Yields the result of `propagate` for each chunk, extended with the
+        population name and the range of local particle indices in the chunk.
+        Particle hashes are unique over all chunks of all populations.
+        """
+        if not populations:
+            raise ValueError("No populations provided.")
+
+        hash_offset = Rebound.TEST_HASH_INIT
+        for source in self.population_sources(populations, chunk_size=chunk_size):
+            for index in range(source.n_chunks):
+                start, end = source.chunk_bounds(index)
+                states, birth_times = source.chunk(index)
+                ret = self.propagate(
+                    states=np.asarray(states, dtype=np.float64),
+                    frame=source.config.frame,
+                    use_rebound=use_rebound,
+                    birth_times=birth_times,
+                    particle_hashes=hash_offset + np.arange(start, end, dtype=np.int64),
+                )
+                ret["population"] = source.config.name
+                ret["local_index"] = (start, end)
+                yield ret
+            hash_offset += source.n_particles
+
     def run(
         self,
         populations: Optional[List[PopulationConfig]] = None,
@@ -256,6 +385,46 @@ class Simulation:
         use_rebound: bool = True,
         birth_times: Optional[np.ndarray] = None,
     ) -> Dict[str, Any]:
+        """
+        Propagate populations, or states given directly, in one simulation.
+
+        The result has a `profile` entry with the execution time records
+        (`dasst.profiling.TimeRecord`) of the instrumented stages of this run
+        and a `metrics` entry (`dasst.profiling.RunMetrics`) with the stage
+        breakdown, throughput and peak memory of the whole run.
+        """
+        with collect_execution_times() as profile:
+            start = time.perf_counter()
+            with execution_timer("simulation.run"):
+                ret = self._run(
+                    populations=populations,
+                    states=states,
+                    frame=frame,
+                    use_rebound=use_rebound,
+                    birth_times=birth_times,
+                )
+            wall_time = time.perf_counter() - start
+
+        propagation = ret["metrics"]
+        ret["profile"] = profile
+        ret["metrics"] = run_metrics(
+            profile,
+            wall_time,
+            n_particles=propagation.n_particles,
+            n_outputs=propagation.n_outputs,
+            integrator_steps=propagation.integrator_steps,
+            **propagation.meta,
+        )
+        return ret
+
+    def _run(
+        self,
+        populations: Optional[List[PopulationConfig]] = None,
+        states: Optional[NDArray_6xN] = None,
+        frame: Optional[str] = None,
+        use_rebound: bool = True,
+        birth_times: Optional[np.ndarray] = None,
+    ) -> Dict[str, Any]:
 
         if populations is not None:
             all_states_list: List[NDArray_6xN] = []
@@ -264,9 +433,10 @@ class Simulation:
             start = 0
 
             for pop_config in populations:
-                pop_states, pop_birth_times, _ = realise_population(
-                    pop_config, self.rng
-                )
+                with execution_timer("simulation.realise_population"):
+                    pop_states, pop_birth_times, _ = realise_population(
+                        pop_config, self.rng
+                    )
 
                 n = pop_states.shape[1]
                 end = start + n
@@ -283,14 +453,16 @@ class Simulation:
             all_states = np.concatenate(all_states_list, axis=1)  # (6,N_total)
             all_birth_times = np.concatenate(all_birth_times_list, axis=0)
 
-            # TODO They probably dont all have the same input frame
-            # input_frame = populations[0].frame
+            # Populations with different input frames are grouped per frame
+            # during the conversion to the internal frame
             frames = {pop_config.frame for pop_config in populations}
-            if len(frames) != 1:
-                raise NotImplementedError(
-                    f"Multiple population input frames not yet supported: {sorted(frames)}"
-                )
-            input_frame = next(iter(frames))
+            if len(frames) == 1:
+                input_frame = next(iter(frames))
+            else:
+                input_frame = np.empty((all_states.shape[1],), dtype=object)
+                for pop_config in populations:
+                    start, end = offsets[pop_config.name]
+                    input_frame[start:end] = pop_config.frame
 
             ret = self.propagate(
                 states=all_states,
@@ -309,7 +481,6 @@ class Simulation:
             populations_birth_times: Dict[str, np.ndarray] = {}
             particle_hashes = ret["particle_hashes"]
             populations_hashes: Dict[str, np.ndarray] = {}
-            particle_lookup: Dict[int, Dict[str, Any]] = {}
 
             for pop_config in populations:
                 name = pop_config.name
@@ -318,13 +489,22 @@ class Simulation:
                 populations_birth_times[name] = all_birth_times[start:end]
                 populations_hashes[name] = particle_hashes[start:end]
 
-                for local_index, global_index in enumerate(range(start, end)):
-                    h = int(particle_hashes[global_index])
-                    particle_lookup[h] = dict(
-                        population=name,
-                        local_index=local_index,
-                        global_index=global_index,
-                    )
+            dense_output = ret["dense_output"]
+            if dense_output is not None:
+                dense_output = dict(
+                    t=dense_output["t"],
+                    massive_states=dense_output["massive_states"],
+                    populations={
+                        name: dense_output["states"][:, :, start:end]
+                        for name, (start, end) in offsets.items()
+                    },
+                )
+
+            particle_lookup = PopulationIndex.from_sizes(
+                names=[pop_config.name for pop_config in populations],
+                sizes=[end - start for start, end in offsets.values()],
+                hashes=particle_hashes,
+            )
 
             return dict(
                 t=t,
@@ -335,6 +515,8 @@ class Simulation:
                 particle_hashes=populations_hashes,
                 particle_lookup=particle_lookup,
                 particle_events=ret["particle_events"],
+                dense_output=dense_output,
+                metrics=ret["metrics"],
             )
 
         if states is None:
@@ -350,6 +532,30 @@ class Simulation:
             use_rebound=use_rebound,
         )
 
+    def node_crossings(
+        self, result: Dict[str, Any], body: str = "Earth", **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Find the crossings of the orbital plane of a massive body, with the
+        MOID, distance and relative velocity at each crossing, in the output
+        of `run`, `propagate` or a chunk of `run_chunks`. The output frame
+        must be heliocentric, e.g. HCRS. Keyword arguments are passed to
+        `dasst.encounters.node_crossings`.
+
+        Returns one crossing table per population for population runs,
+        otherwise a single table.
+        """
+        massive_objects = self.config.massive_objects or Rebound.DEFAULT_MASSIVE
+        body_states = result["massive_states"][:, :, body_index(body, massive_objects)]
+        t = result["t"].sec
+
+        if "populations" in result:
+            return {
+                name: node_crossings(t, states, body_states, **kwargs)
+                for name, states in result["populations"].items()
+            }
+        return node_crossings(t, result["particles_states"], body_states, **kwargs)
+
 
 ## -- use case below
 
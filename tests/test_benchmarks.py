@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def run_suite(self, *args, check=True):
+        return subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", *args],
+            cwd=ROOT, capture_output=True, text=True, check=check,
+        )
+
+    def test_list(self):
+        names = self.run_suite("--list").stdout.splitlines()
+        for name in ("TimePropagate", "TimeFrameConversion", "TimeReboundOD", "TimePairwise",
+                     "TimeIceTemperature", "TimeRealisePopulation"):
+            self.assertTrue(any(name in line for line in names), name)
+
+    def test_history(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = Path(tmp) / "history.jsonl"
+            args = ("--quick", "--filter", "IceTemperature", "--history", str(history))
+            self.run_suite(*args)
+            with open(history) as fh:
+                results = [json.loads(line) for line in fh]
+            self.assertEqual(len(results), 1)
+            self.assertIn("commit", results[0])
+            self.assertGreater(results[0]["median"], 0)
+
+            # A much faster result of an earlier commit makes the run a regression
+            with open(history, "w") as fh:
+                fh.write(json.dumps(dict(results[0], commit="previous", median=1e-12)) + "\n")
+            proc = self.run_suite(*args, "--no-history", check=False)
+        self.assertEqual(proc.returncode, 1)
+        self.assertIn("REGRESSION", proc.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy as np
+import numpy.testing as nt
+from scipy.stats import gaussian_kde
+from scipy.optimize import approx_fprime
+
+from dasst.distributions import KernelDensityEstimation, MISE_kernel_optimization
+from dasst.distributions import Resampling, alias_table
+from dasst.distributions import scott_bandwidth, silverman_bandwidth
+from dasst.distributions import kernel_density_estimation as kde_module
+
+
+class TestKernelDensityEstimation(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.samples = rng.multivariate_normal([0, 1], [[1.0, 0.3], [0.3, 0.5]], size=3000).T
+        self.query = rng.multivariate_normal([0, 1], [[1.0, 0.3], [0.3, 0.5]], size=500).T
+        self.reference = gaussian_kde(self.samples)
+        self.bandwidth = self.reference.covariance
+
+    def test_direct(self):
+        kde = KernelDensityEstimation(self.samples, self.bandwidth)
+        nt.assert_allclose(kde.pdf(self.query, method="direct"), self.reference(self.query))
+
+    def test_fast_methods(self):
+        kde = KernelDensityEstimation(self.samples, self.bandwidth, cutoff=6.0)
+        exact = kde.pdf(self.query, method="direct")
+        nt.assert_allclose(kde.pdf(self.query, method="tree"), exact, rtol=1e-6, atol=1e-10)
+        nt.assert_allclose(kde.pdf(self.query, method="fft"), exact, atol=1e-3 * exact.max())
+
+    def test_axis_and_weights(self):
+        weights = np.linspace(1, 2, self.samples.shape[1])
+        ref = gaussian_kde(self.samples, weights=weights)
+        kde = KernelDensityEstimation(self.samples.T, ref.covariance, axis=0, weights=weights)
+        nt.assert_allclose(kde.pdf(self.query.T), ref(self.query), rtol=1e-6)
+
+    def test_one_dimensional(self):
+        kde = KernelDensityEstimation(np.array([[0.0, 1.0]]), np.eye(1) * 0.2, axis=1)
+        x = np.linspace(-2, 2, 11)
+        expected = 0.5 * (
+            np.exp(-0.5 * x**2 / 0.2) + np.exp(-0.5 * (x - 1) ** 2 / 0.2)
+        ) / np.sqrt(2 * np.pi * 0.2)
+        nt.assert_allclose(kde.pdf(x), expected)
+
+    def test_sample(self):
+        kde = KernelDensityEstimation(self.samples, self.bandwidth, rng=np.random.default_rng(1))
+        resamples = kde.sample(20000)
+        self.assertEqual(resamples.shape, (2, 20000))
+        expected_cov = np.cov(self.samples, bias=True) + self.bandwidth
+        nt.assert_allclose(np.cov(resamples), expected_cov, atol=0.03)
+
+
+class TestBandwidthSelection(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.samples = rng.multivariate_normal([0, 1], [[1.0, 0.3], [0.3, 0.5]], size=4000).T
+        self.weights = rng.uniform(0.5, 1.5, size=4000)
+
+    def test_rules_of_thumb(self):
+        ref = gaussian_kde(self.samples, weights=self.weights)
+        nt.assert_allclose(scott_bandwidth(self.samples, self.weights), ref.covariance)
+        ref.set_bandwidth("silverman")
+        nt.assert_allclose(silverman_bandwidth(self.samples, self.weights), ref.covariance)
+
+        kde = KernelDensityEstimation(self.samples, "scott", weights=self.weights)
+        nt.assert_allclose(kde.bandwidth, scott_bandwidth(self.samples, self.weights))
+
+    def test_full_gradient(self):
+        rng = np.random.default_rng(2)
+        white = rng.standard_normal((3, 150))
+        weights = rng.uniform(1, 2, 150)
+        weights /= np.sum(weights)
+        i, j = np.triu_indices(150, 1)
+        coef_2h, coef_h = kde_module._pair_coefficients(weights, i, j)
+        args = (white[:, i] - white[:, j], np.sum(weights**2), coef_2h, coef_h)
+
+        theta = rng.normal(-1.0, 0.3, size=6)
+        _, grad = kde_module._lscv_full_cost(theta, *args)
+        numerical = approx_fprime(theta, lambda x: kde_module._lscv_full_cost(x, *args)[0], 1e-7)
+        nt.assert_allclose(grad, numerical, rtol=1e-4, atol=1e-8)
+
+    def test_optimization(self):
+        silverman = silverman_bandwidth(self.samples)
+        for parametrization in ["scale", "full"]:
+            kde = KernelDensityEstimation(self.samples, "scott")
+            bandwidth = MISE_kernel_optimization(
+                kde, parametrization=parametrization, subsample=1500, rng=np.random.default_rng(3),
+            )
+            nt.assert_allclose(kde.bandwidth, bandwidth)
+            self.assertTrue(np.all(np.linalg.eigvalsh(bandwidth) > 0))
+            # Gaussian data, the optimum is close to the normal reference rule
+            nt.assert_allclose(np.diag(bandwidth), np.diag(silverman), rtol=0.5)
+
+
+class TestResampling(unittest.TestCase):
+    def setUp(self):
+        self.samples = np.arange(30, dtype=np.float64).reshape(3, 10)
+        self.weights = np.array([0.0, 5.0, 1.0, 1.0, 0.5, 0.0, 20.0, 1.0, 2.0, 0.1])
+
+    def test_alias_table(self):
+        rng = np.random.default_rng(0)
+        for weights in [self.weights, rng.pareto(0.5, size=1000), np.r_[1e6, np.ones(1000)]]:
+            probability, alias = alias_table(weights)
+            self.assertTrue(np.all((probability >= 0) & (probability <= 1)))
+            mass = probability.copy()
+            np.add.at(mass, alias, 1 - probability)
+            nt.assert_allclose(mass / weights.size, weights / np.sum(weights), atol=1e-12)
+
+    def test_weighted_frequencies(self):
+        dist = Resampling(self.samples, weights=self.weights, seed=1)
+        resamples = dist.sample(200000)
+        self.assertEqual(resamples.shape, (3, 200000))
+        index = resamples[0].astype(np.int64)
+        nt.assert_array_equal(resamples, self.samples[:, index])
+        frequency = np.bincount(index, minlength=10) / index.size
+        nt.assert_allclose(frequency, self.weights / np.sum(self.weights), atol=5e-3)
+        self.assertEqual(frequency[0], 0)
+
+    def test_axis(self):
+        dist = Resampling(self.samples.T, axis=0, seed=2)
+        resamples = dist.sample(50)
+        self.assertEqual(resamples.shape, (50, 3))
+        self.assertTrue(np.all(np.isin(resamples[:, 0], self.samples[0])))
+
+    def test_chunks(self):
+        dist = Resampling(self.samples, weights=self.weights, seed=3, chunk_size=7)
+        self.assertEqual(dist.n_chunks(30), 5)
+        chunks = list(dist.chunks(30))
+        self.assertEqual([c.shape[1] for c in chunks], [7, 7, 7, 7, 2])
+
+        other = Resampling(self.samples, weights=self.weights, seed=3, chunk_size=7)
+        for index in reversed(range(5)):
+            nt.assert_array_equal(other.chunk(30, index), chunks[index])
+        different = Resampling(self.samples, weights=self.weights, seed=4, chunk_size=7)
+        self.assertFalse(np.array_equal(different.chunk(30, 0), chunks[0]))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+import unittest
+import numpy as np
+import numpy.testing as nt
+import pyorb
+
+from dasst.encounters import moid, node_crossings, NodeCrossingDetector, MU_SUN
+
+
+def circular_states(t, radius, inclination, Omega, phase=0.0):
+    """(6, T, 1) states on a circular orbit with argument of latitude phase at t=0"""
+    n = np.sqrt(MU_SUN / radius**3)
+    u = phase + n * t
+    P = np.array([np.cos(Omega), np.sin(Omega), 0.0])
+    Q = np.array([
+        -np.sin(Omega) * np.cos(inclination),
+        np.cos(Omega) * np.cos(inclination),
+        np.sin(inclination),
+    ])
+    pos = radius * (np.cos(u)[None, :] * P[:, None] + np.sin(u)[None, :] * Q[:, None])
+    vel = radius * n * (-np.sin(u)[None, :] * P[:, None] + np.cos(u)[None, :] * Q[:, None])
+    return np.concatenate([pos, vel], axis=0)[:, :, None]
+
+
+class TestMoid(unittest.TestCase):
+    def test_circular(self):
+        elements_a = np.array([
+            [1.5, 1.0, 1.2],
+            [0.0, 0.0, 0.0],
+            [0.0, 1.0, 0.3],
+            [0.0, 0.5, 0.0],
+            [0.0, 2.0, 1.0],
+        ])
+        distance, _, _ = moid(elements_a, np.array([1.0, 0.0, 0.0, 0.0, 0.0]))
+        nt.assert_allclose(distance, [0.5, 0.0, 0.2], atol=1e-10)
+
+    def test_brute_force(self):
+        rng = np.random.default_rng(1)
+        num = 40
+        elements_a = np.stack([
+            rng.uniform(0.8, 3.0, num), rng.uniform(0.0, 0.95, num),
+            rng.uniform(0.0, np.pi, num), rng.uniform(0.0, 2 * np.pi, num),
+            rng.uniform(0.0, 2 * np.pi, num),
+        ])
+        elements_b = np.array([1.0, 0.0167, 0.0, 1.8, 0.0])
+        distance, f_a, f_b = moid(elements_a, elements_b, chunk_size=16)
+
+        f = np.linspace(-np.pi, np.pi, 720, endpoint=False)
+
+        def curve(el, anom):
+            orb = pyorb.Orbit(M0=1.0, G=1.0, num=anom.size, degrees=False, type="true")
+            orb.kepler = np.concatenate([np.repeat(el[:5, None], anom.size, axis=1), anom[None]])
+            return orb.r
+
+        for k in range(num):
+            ra = curve(elements_a[:, k], f)
+            rb = curve(elements_b, f)
+            brute = np.sqrt(np.min(np.sum((ra[:, :, None] - rb[:, None, :]) ** 2, axis=0)))
+            self.assertLessEqual(distance[k], brute + 1e-10)
+            closest = curve(elements_a[:, k], f_a[k:k + 1]) - curve(elements_b, f_b[k:k + 1])
+            nt.assert_allclose(np.linalg.norm(closest), distance[k], rtol=1e-8)
+
+
+class TestNodeCrossings(unittest.TestCase):
+    def setUp(self):
+        self.t = np.linspace(0, 3 * 365.25 * 86400.0, 400)
+        self.earth = circular_states(self.t, pyorb.AU, 0.0, 0.0)[:, :, 0]
+        self.radius = 1.2 * pyorb.AU
+        self.states = np.concatenate([
+            circular_states(self.t, self.radius, 0.4, 1.0, phase=0.3),
+            circular_states(self.t, pyorb.AU, 0.0, 0.0, phase=0.5),
+        ], axis=2)
+
+    def test_crossings(self):
+        result = node_crossings(self.t, self.states, self.earth, epoch_block=37)
+
+        # The coplanar particle never crosses the plane
+        self.assertTrue(np.all(result["index"] == 0))
+
+        # Nodes at argument of latitude 0 and pi
+        n = np.sqrt(MU_SUN / self.radius**3)
+        expected = (np.arange(1, 10) * np.pi - 0.3) / n
+        expected = expected[expected < self.t[-1]]
+        nt.assert_allclose(result["t"], expected, rtol=1e-6)
+        nt.assert_array_equal(result["ascending"], np.arange(expected.size) % 2 == 1)
+        nt.assert_allclose(result["moid"], 0.2 * pyorb.AU, rtol=1e-5)
+
+        speed = np.linalg.norm(result["velocity"], axis=0)
+        self.assertTrue(np.all(speed > 0))
+        self.assertTrue(np.all(result["distance"] >= result["moid"] * (1 - 1e-8)))
+
+    def test_streaming(self):
+        detector = NodeCrossingDetector()
+        for start in range(0, self.t.size, 50):
+            end = start + 50
+            detector.update(self.t[start:end], self.states[:, start:end], self.earth[:, start:end])
+        whole = node_crossings(self.t, self.states, self.earth)
+        nt.assert_allclose(detector.result()["t"], whole["t"])
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+import unittest
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import numpy.testing as nt
+
+from dasst.events import ParticleEvent
+from dasst.persistence import (
+    FileSystemBinary,
+    GZipBinary,
+    ChunkedBinary,
+    ChunkedArray,
+    ChunkedArrayConverter,
+    Codec,
+    Converter,
+    ChainConverter,
+    NumpyConverter,
+    PickleConverter,
+    register_converter,
+    save_events,
+    iter_events,
+    save_results,
+    load_results,
+)
+
+
+class Interval:
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+
+
+class IntervalConverter(Converter):
+    def as_bytes(self, obj):
+        return np.array([obj.start, obj.stop], dtype=np.float64).tobytes()
+
+    def from_bytes(self, bytes_data):
+        return Interval(*np.frombuffer(bytes_data, dtype=np.float64))
+
+
+register_converter(Interval, IntervalConverter)
+
+
+def make_events(n):
+    return [
+        ParticleEvent(
+            sim_time_sec=float(i),
+            epoch_isot="2020-01-01T00:00:00.000",
+            event="encounter" if i % 2 else "escape",
+            reason="test",
+            particle_hash=100 + i,
+            other_hash=1 if i % 2 else None,
+            other_name="Earth" if i % 2 else None,
+            distance=1e6 * i if i % 2 else None,
+        )
+        for i in range(n)
+    ]
+
+
+class TestConverters(unittest.TestCase):
+    def test_numpy_layouts(self):
+        converter = NumpyConverter()
+        base = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+        arrays = [base, np.asfortranarray(base), base[:, ::2, 1:], np.array(3)]
+        arrays.append(np.array([1, "a"], dtype=object))
+        for array in arrays:
+            loaded = converter.from_bytes(bytearray(converter.as_bytes(array)))
+            self.assertEqual(loaded.dtype, array.dtype)
+            nt.assert_array_equal(loaded, array)
+
+    def test_chain(self):
+        converter = ChainConverter([NumpyConverter(), PickleConverter(), IntervalConverter()])
+        data = converter.as_bytes([np.ones((2, 2)), {"a": 1}, Interval(0.5, 2.0)])
+        array, obj, interval = converter.from_bytes(data)
+        nt.assert_array_equal(array, np.ones((2, 2)))
+        self.assertEqual(obj, {"a": 1})
+        self.assertEqual((interval.start, interval.stop), (0.5, 2.0))
+
+
+class TestStorage(unittest.TestCase):
+    storage_cls = FileSystemBinary
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "records.bin"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_save_load(self):
+        storage = self.storage_cls(self.path)
+        objects = [np.arange(10.0), {"x": np.eye(3), "name": "test"}, Interval(1, 2), [1, 2, 3]]
+        for index, obj in enumerate(objects):
+            self.assertEqual(storage.save(obj), index)
+
+        self.assertEqual(len(storage), 4)
+        self.assertEqual(storage.load(), [1, 2, 3])
+        array, record = storage.load([0, 1])
+        nt.assert_array_equal(array, np.arange(10.0))
+        nt.assert_array_equal(record["x"], np.eye(3))
+        self.assertEqual(record["name"], "test")
+        self.assertEqual(storage.load(2).stop, 2)
+        with self.assertRaises(IndexError):
+            storage.load(4)
+
+    def test_append(self):
+        storage = self.storage_cls(self.path)
+        storage.save(np.zeros(3))
+        storage = self.storage_cls(self.path)
+        storage.save(np.ones(3))
+        self.assertEqual(len(storage), 2)
+        nt.assert_array_equal(np.stack(list(storage)), [np.zeros(3), np.ones(3)])
+
+        storage = self.storage_cls(self.path, append=False)
+        self.assertEqual(len(storage), 0)
+
+    def test_rebuild_index(self):
+        storage = self.storage_cls(self.path)
+        for index in range(3):
+            storage.save(np.full(5, index))
+        storage.index_path.unlink()
+        with open(self.path, "ab") as fh:
+            fh.write(b"\x1f\x8b\x08" + b"\x00" * 20)
+
+        with self.assertLogs("dasst.persistence.storage", level="WARNING"):
+            storage = self.storage_cls(self.path)
+        self.assertEqual(len(storage), 3)
+        nt.assert_array_equal(storage.load(), np.full(5, 2))
+        self.assertEqual(storage.save(np.arange(2)), 3)
+        nt.assert_array_equal(self.storage_cls(self.path).load(), np.arange(2))
+
+
+class TestGZipStorage(TestStorage):
+    storage_cls = GZipBinary
+
+    def test_compressed(self):
+        storage = GZipBinary(self.path)
+        storage.save(np.zeros(100_000))
+        self.assertLess(self.path.stat().st_size, 10_000)
+
+
+class TestChunkedStorage(TestStorage):
+    storage_cls = ChunkedBinary
+
+
+class TestCodecs(unittest.TestCase):
+    def setUp(self):
+        t = np.linspace(0, 10, 200)[None, :, None]
+        phase = np.random.default_rng(0).uniform(0, 2 * np.pi, size=(6, 1, 300))
+        self.states = 1.5e11 * np.cos(t * 0.1 + phase)
+
+    def test_round_trip(self):
+        converter = ChunkedArrayConverter()
+        codecs = [Codec(), Codec("none", shuffle=False), Codec("lzma", level=1, delta_axis=1)]
+        arrays = [self.states, np.arange(10, dtype=">i4"), np.array(2.5), np.zeros((3, 0))]
+        for codec in codecs:
+            for array in arrays:
+                data = converter.as_bytes(ChunkedArray(array, codec, chunk_bytes=10_000, workers=2))
+                loaded = converter.from_bytes(bytearray(data))
+                self.assertEqual(loaded.dtype, array.dtype)
+                nt.assert_array_equal(loaded, array)
+
+    def test_chunks(self):
+        chunked = ChunkedArray(self.states, chunk_bytes=6 * 200 * 8 * 64)
+        bounds = chunked.chunk_bounds()
+        self.assertEqual(len(bounds), 5)
+        self.assertEqual(bounds[-1], (256, 300))
+
+    def test_delta_compresses(self):
+        converter = ChunkedArrayConverter()
+        plain = converter.as_bytes(ChunkedArray(self.states, Codec(shuffle=False)))
+        delta = converter.as_bytes(ChunkedArray(self.states, Codec(delta_axis=1)))
+        self.assertLess(len(delta), len(plain))
+
+    def test_storage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = ChunkedBinary(
+                Path(tmp) / "states.bin", Codec(delta_axis=1), chunk_bytes=50_000
+            )
+            storage.save(dict(states=self.states, names=np.array(["a", None], dtype=object), n=3))
+            loaded = ChunkedBinary(Path(tmp) / "states.bin").load()
+        nt.assert_array_equal(loaded["states"], self.states)
+        self.assertEqual(loaded["names"].tolist(), ["a", None])
+        self.assertEqual(loaded["n"], 3)
+
+
+class TestResultPersistence(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = GZipBinary(Path(self.tmp.name) / "results.gz")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_events(self):
+        events = make_events(25)
+        self.assertEqual(save_events(self.storage, events, chunk_size=10), [0, 1, 2])
+        self.assertEqual(list(iter_events(self.storage)), events)
+
+    def test_results(self):
+        results = [
+            dict(
+                particles_states=np.random.default_rng(i).normal(size=(6, 4, 3)),
+                rebound=object(),
+                particle_events=make_events(i + 1),
+                population="test",
+                local_index=(3 * i, 3 * i + 3),
+            )
+            for i in range(2)
+        ]
+        passed = list(save_results(self.storage, iter(results)))
+        self.assertEqual(len(passed), 2)
+        for result, loaded in zip(results, load_results(self.storage)):
+            self.assertNotIn("rebound", loaded)
+            nt.assert_array_equal(loaded["particles_states"], result["particles_states"])
+            self.assertEqual(loaded["particle_events"], result["particle_events"])
+            self.assertEqual(loaded["local_index"], result["local_index"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+import tempfile
+import unittest
+import numpy as np
+import numpy.testing as nt
+from pathlib import Path
+
+from dasst.populations import PopulationConfig, PopulationSource, chunk_seed
+from dasst.populations import PopulationFiles, save_population_directory, shard_bounds
+from dasst.populations import realise_population, PopulationIndex
+from dasst.events import ParticleEvent
+
+
+def _normal_config(n_particles=25, chunk_size=10):
+    return PopulationConfig(
+        name="test",
+        frame="HCRS",
+        mode="batch",
+        source="distribution",
+        dist_type="normal",
+        n_particles=n_particles,
+        mu=np.zeros(6),
+        cov=np.eye(6),
+        chunk_size=chunk_size,
+    )
+
+
+class TestPopulationSource(unittest.TestCase):
+    def test_chunk_shapes(self):
+        source = PopulationSource(_normal_config(), seed=42)
+        self.assertEqual(source.n_chunks, 3)
+        sizes = []
+        for states, birth_times in source:
+            self.assertEqual(states.shape[0], 6)
+            self.assertEqual(birth_times.shape, (states.shape[1],))
+            sizes.append(states.shape[1])
+        self.assertEqual(sizes, [10, 10, 5])
+
+    def test_reproducible_random_access(self):
+        source = PopulationSource(_normal_config(), seed=42)
+        all_chunks = [states for states, _ in source]
+        other = PopulationSource(_normal_config(), seed=42)
+        nt.assert_array_equal(other.chunk(2)[0], all_chunks[2])
+        nt.assert_array_equal(other.chunk(0)[0], all_chunks[0])
+        self.assertFalse(np.allclose(all_chunks[0], all_chunks[1][:, :10]))
+
+    def test_chunk_seed_matches_spawn(self):
+        seed = np.random.SeedSequence(7)
+        children = np.random.SeedSequence(7).spawn(3)
+        for index, child in enumerate(children):
+            a = np.random.default_rng(chunk_seed(seed, index)).random(4)
+            b = np.random.default_rng(child).random(4)
+            nt.assert_array_equal(a, b)
+
+    def test_file_source_memory_mapped(self):
+        states = np.arange(6 * 12, dtype=np.float64).reshape(6, 12)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "states.npy"
+            np.save(path, states)
+            cfg = PopulationConfig(
+                name="file",
+                frame="HCRS",
+                mode="batch",
+                source="file",
+                states_file=str(path),
+                chunk_size=5,
+            )
+            source = PopulationSource(cfg)
+            chunk_states, _ = source.chunk(1)
+            self.assertIsInstance(chunk_states, np.memmap)
+            nt.assert_array_equal(chunk_states, states[:, 5:10])
+            del chunk_states, source
+
+    def test_batch_birth_times_checked(self):
+        cfg = _normal_config(n_particles=4, chunk_size=2)
+        cfg.birth_times = np.array([0.0, 0.0, 1.0, 1.0])
+        source = PopulationSource(cfg)
+        source.chunk(0)
+        with self.assertRaises(ValueError):
+            source.chunk(1)
+
+
+class TestPopulationFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "pop"
+        self.states = np.random.default_rng(1).normal(size=(6, 23))
+        self.birth_times = np.linspace(0, 10, 23)
+        save_population_directory(
+            self.path, self.states, self.birth_times, frame="GCRS", part_size=10,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_manifest(self):
+        files = PopulationFiles(self.path)
+        self.assertEqual(files.n_parts, 3)
+        self.assertEqual(files.n_particles, 23)
+        self.assertEqual(files.frame, "GCRS")
+        self.assertTrue(files.has_birth_times)
+
+    def test_reads(self):
+        files = PopulationFiles(self.path)
+        view = files.read_states(2, 8)
+        self.assertIsInstance(view, np.memmap)
+        nt.assert_array_equal(view, self.states[:, 2:8])
+        nt.assert_array_equal(files.read_states(5, 21), self.states[:, 5:21])
+        nt.assert_array_equal(files.read_birth_times(9, 11), self.birth_times[9:11])
+        self.assertEqual(files.read_states(4, 4).shape, (6, 0))
+
+    def test_shards_cover_population(self):
+        files = PopulationFiles(self.path)
+        blocks = [files.shard(rank, 4)[0] for rank in range(4)]
+        nt.assert_array_equal(np.concatenate(blocks, axis=1), self.states)
+        self.assertEqual(shard_bounds(10, 3, 4), (8, 10))
+
+    def test_realise_population(self):
+        cfg = PopulationConfig(
+            name="dir", frame="GCRS", mode="stream", source="file",
+            states_file=str(self.path),
+        )
+        states, birth_times, _ = realise_population(cfg, np.random.default_rng())
+        nt.assert_array_equal(states, self.states)
+        nt.assert_array_equal(birth_times, self.birth_times)
+
+        source = PopulationSource(cfg, chunk_size=7)
+        nt.assert_array_equal(source.chunk(1)[1], self.birth_times[7:14])
+        self.assertEqual(list(source.shard_chunks(1, 2)), [2, 3])
+
+
+class TestPopulationIndex(unittest.TestCase):
+    def setUp(self):
+        self.hashes = 1_000_000 + np.arange(7, dtype=np.int64)
+        self.index = PopulationIndex.from_sizes(["a", "b"], [3, 4], self.hashes)
+
+    def test_lookup(self):
+        pop_ids, local, glob = self.index.lookup(self.hashes[[6, 0, 3]])
+        nt.assert_array_equal(pop_ids, [1, 0, 1])
+        nt.assert_array_equal(local, [3, 0, 0])
+        nt.assert_array_equal(glob, [6, 0, 3])
+        self.assertEqual(
+            self.index[1_000_004], dict(population="b", local_index=1, global_index=4)
+        )
+
+    def test_unknown_hashes(self):
+        pop_ids, local, glob = self.index.lookup(np.array([5, 1_000_001, 2_000_000]))
+        nt.assert_array_equal(glob, [-1, 1, -1])
+        self.assertEqual(list(self.index.population_names([5, 1_000_001])), [None, "a"])
+        self.assertNotIn(5, self.index)
+        with self.assertRaises(KeyError):
+            self.index[5]
+
+    def test_unsorted_hashes(self):
+        hashes = np.array([30, 10, 20, 5])
+        index = PopulationIndex.from_sizes(["a", "b"], [2, 2], hashes)
+        nt.assert_array_equal(index.find([5, 30, 11]), [3, 0, -1])
+        nt.assert_array_equal(index.members("b"), [2, 3])
+
+    def test_join_events(self):
+        events = [
+            ParticleEvent(0.0, "", "escape", "", particle_hash=1_000_005),
+            ParticleEvent(0.0, "", "collision", "", particle_hash=1_000_001),
+        ]
+        joined = self.index.join_events(events)
+        nt.assert_array_equal(joined["population_id"], [1, 0])
+        nt.assert_array_equal(joined["local_index"], [2, 1])
+
+    def test_empty_index(self):
+        empty = np.array([], dtype=np.int64)
+        index = PopulationIndex(empty, empty, empty, [])
+        pop_ids, local, glob = index.lookup(np.array([5, 6]))
+        nt.assert_array_equal(pop_ids, [-1, -1])
+        nt.assert_array_equal(local, [-1, -1])
+        nt.assert_array_equal(glob, [-1, -1])
+        self.assertEqual(list(index.population_names([5])), [None])
+        joined = index.join_events([ParticleEvent(0.0, "", "escape", "", particle_hash=5)])
+        nt.assert_array_equal(joined["population_id"], [-1])
+        self.assertNotIn(5, index)
+        with self.assertRaises(KeyError):
+            index[5]
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+import time
+import logging
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from astropy.time import Time, TimeDelta
+
+from dasst.profiling import (
+    EXECUTION_TIMES,
+    MEMORY_SNAPSHOTS,
+    ProfileMemory,
+    record_execution_time,
+    record_memory_usage,
+    execution_timer,
+    collect_execution_times,
+    set_profiling,
+    format_time_record,
+    format_snapshot,
+    function_log_call,
+    read_metrics_jsonl,
+)
+from dasst.profiling.debugger import try_wrapper
+from dasst.propagators import Rebound
+from dasst.constants import AU, DAY
+
+
+@record_execution_time("test_profiling.sleep")
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+@record_memory_usage("test_profiling.allocate")
+def allocate(size):
+    return np.ones(size)
+
+
+class Allocator(ProfileMemory):
+    def allocate(self, size):
+        self.data = np.ones(size)
+
+
+def make_rebound(**settings):
+    base = dict(
+        massive_objects=["Sun", "Earth"],
+        massive_masses=[1.98855e30, 5.97219e24],
+        time_step=3600.0,
+        tqdm=False,
+    )
+    base.update(settings)
+    return Rebound(kernel=".", settings=base)
+
+
+def massive_states():
+    states = np.zeros((6, 2), dtype=np.float64)
+    states[0, 1] = AU
+    states[4, 1] = 29.78e3
+    return states
+
+
+class PropagationCase(unittest.TestCase):
+    def setUp(self):
+        self.epoch = Time("2025-01-01T00:00:00", scale="utc")
+        self.t = TimeDelta(np.arange(0, 5 * DAY, DAY), format="sec")
+        self.states = np.zeros((6, 2), dtype=np.float64)
+        self.states[0, :] = [1.2 * AU, 1.5 * AU]
+        self.states[4, :] = [2.7e4, 2.4e4]
+
+
+class TestExecutionTimes(PropagationCase):
+    def tearDown(self):
+        set_profiling(True)
+
+    def test_records(self):
+        with collect_execution_times() as records:
+            sleep(0.01)
+            sleep(0.02)
+            with execution_timer("test_profiling.block"):
+                sleep(0.0)
+        self.assertEqual(set(records), {"test_profiling.sleep", "test_profiling.block"})
+        self.assertEqual(records["test_profiling.sleep"].calls, 3)
+        self.assertGreaterEqual(records["test_profiling.sleep"].total, 0.03)
+        self.assertGreaterEqual(records["test_profiling.sleep"].max, 0.02)
+        self.assertGreaterEqual(EXECUTION_TIMES["test_profiling.sleep"].calls, 3)
+        self.assertIn("test_profiling.block", format_time_record(records))
+
+    def test_disabled(self):
+        set_profiling(False)
+        with collect_execution_times() as records:
+            sleep(0.0)
+            with execution_timer("test_profiling.block"):
+                pass
+            allocate(10)
+        self.assertEqual(records, {})
+        self.assertNotIn("test_profiling.allocate", MEMORY_SNAPSHOTS)
+
+    def test_rebound_stages(self):
+        with collect_execution_times() as records:
+            make_rebound().propagate(
+                self.t, self.states, self.epoch, massive_states=massive_states()
+            )
+        stages = ("setup_sim", "convert_input", "integrate", "integrate_loop", "convert_output")
+        for stage in stages:
+            self.assertIn(f"rebound.{stage}", records)
+        self.assertEqual(records["rebound.put_simulation_state"].calls, len(self.t))
+
+
+class TestRunMetrics(PropagationCase):
+    def test_rebound_metrics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "metrics.jsonl"
+            reb = make_rebound(metrics_log_path=path)
+            for _ in range(2):
+                reb.propagate(self.t, self.states, self.epoch, massive_states=massive_states())
+            logged = read_metrics_jsonl(path)
+
+        metrics = reb.metrics
+        self.assertEqual((metrics.n_particles, metrics.n_outputs), (2, len(self.t)))
+        self.assertGreater(metrics.integrator_steps, 0)
+        self.assertGreater(metrics.particle_steps_per_second, 0)
+        self.assertGreater(metrics.stages["integrate"], 0)
+        self.assertLessEqual(sum(metrics.stages.values()), metrics.wall_time)
+        self.assertGreater(metrics.peak_rss, 0)
+        self.assertEqual(len(logged), 2)
+        self.assertEqual(logged[-1], metrics)
+
+
+class TestMemoryUsage(unittest.TestCase):
+    def test_record(self):
+        allocate(100_000)
+        diff, peak = MEMORY_SNAPSHOTS["test_profiling.allocate"][-1]
+        self.assertGreaterEqual(peak, 800_000)
+        self.assertIn("Total change", format_snapshot(diff))
+
+    def test_mixin(self):
+        obj = Allocator()
+        obj.start_profiling()
+        obj.allocate(100_000)
+        diff = obj.stop_profiling()
+        self.assertGreaterEqual(sum(stat.size_diff for stat in diff), 800_000)
+        self.assertGreaterEqual(obj.memory_peak, 800_000)
+
+
+class TestLogging(unittest.TestCase):
+    def test_function_log_call(self):
+        logger = logging.getLogger("dasst.test_profiling")
+
+        @function_log_call("{0|num} iterations of {name}", logger, level="always")
+        def run(num, name="test"):
+            return num
+
+        with self.assertLogs(logger, level="DEBUG") as logs:
+            run(5)
+            run(num=3, name="other")
+        self.assertIn("5 iterations of test: started", logs.output[0])
+        self.assertIn("3 iterations of other: started", logs.output[2])
+
+    def test_try_wrapper(self):
+        logger = logging.getLogger("dasst.test_profiling")
+
+        @try_wrapper(logger=logger, default=-1)
+        def add(a):
+            return a + 5
+
+        self.assertEqual(add(1), 6)
+        with self.assertLogs(logger, level="ERROR") as logs:
+            self.assertEqual(add("c"), -1)
+        self.assertIn("TypeError", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
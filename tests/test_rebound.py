@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import numpy.testing as nt
+from astropy.time import Time, TimeDelta
+
+from dasst.propagators import Rebound
+from dasst.constants import AU, DAY
+from dasst.events import encounter_table, read_events_jsonl
+
+
+def make_rebound(**settings):
+    base = dict(
+        massive_objects=["Sun", "Earth"],
+        massive_masses=[1.98855e30, 5.97219e24],
+        time_step=3600.0,
+        tqdm=False,
+    )
+    base.update(settings)
+    return Rebound(kernel=".", settings=base)
+
+
+def massive_states():
+    """Sun and Earth on a circular orbit, avoids the need for a JPL kernel"""
+    states = np.zeros((6, 2), dtype=np.float64)
+    states[0, 1] = AU
+    states[4, 1] = 29.78e3
+    return states
+
+
+class TestRebound(unittest.TestCase):
+    def setUp(self):
+        self.epoch = Time("2025-01-01T00:00:00", format="isot", scale="utc")
+        self.t = TimeDelta(np.arange(0, 10 * DAY, DAY), format="sec")
+        self.states = np.zeros((6, 4), dtype=np.float64)
+        self.states[0, :] = [1.2 * AU, 1e9, 1.5 * AU, 2e9]
+        self.states[4, :] = [2.7e4, 1e3, 2.4e4, 1.2e3]
+
+    def test_mixed_frames(self):
+        frames = np.array(["HCRS", "GCRS", "HCRS", "GCRS"], dtype=object)
+        mixed, _ = make_rebound().propagate(
+            self.t, self.states, self.epoch,
+            massive_states=massive_states(), in_frames=frames,
+        )
+        helio, _ = make_rebound(in_frame="HCRS").propagate(
+            self.t, self.states[:, [0, 2]], self.epoch, massive_states=massive_states(),
+        )
+        geo, _ = make_rebound(in_frame="GCRS").propagate(
+            self.t, self.states[:, [1, 3]], self.epoch, massive_states=massive_states(),
+        )
+        nt.assert_allclose(mixed[:, :, [0, 2]], helio, rtol=1e-9)
+        nt.assert_allclose(mixed[:, :, [1, 3]], geo, rtol=1e-9)
+
+    def test_in_frames_shape_checked(self):
+        with self.assertRaises(ValueError):
+            make_rebound().propagate(
+                self.t, self.states, self.epoch,
+                massive_states=massive_states(), in_frames=["HCRS"],
+            )
+
+    def test_dense_output(self):
+        dense = dict(body="Earth", distance=0.01 * AU, time_step=3600.0)
+        reb = make_rebound(dense_output=dense)
+        states = np.zeros((6, 2), dtype=np.float64)
+        states[:, 0] = self.states[:, 1]  # close to Earth
+        states[:, 1] = self.states[:, 0]  # far from Earth
+        frames = np.array(["GCRS", "HCRS"], dtype=object)
+        regular, _ = reb.propagate(
+            self.t, states, self.epoch, massive_states=massive_states(), in_frames=frames,
+        )
+        out = reb.dense_output
+        self.assertIsNotNone(out)
+        self.assertEqual(out["states"].shape[1], len(out["t"]))
+        self.assertEqual(out["states"].shape[2], 2)
+        self.assertTrue(np.all(np.diff(out["t"].sec) > 0))
+        # Dense epochs interleave with the regular ones and continue the same orbit
+        ind = np.argmin(np.abs(out["t"].sec - 0.5 * DAY))
+        self.assertAlmostEqual(out["t"].sec[ind], 0.5 * DAY)
+        mid = 0.5 * (regular[:3, 0, 1] + regular[:3, 1, 1])
+        self.assertLess(np.linalg.norm(out["states"][:3, ind, 1] - mid) / AU, 1e-3)
+
+        reb = make_rebound(dense_output=dense)
+        reb.propagate(self.t, states[:, 1:], self.epoch, massive_states=massive_states())
+        self.assertIsNone(reb.dense_output)
+
+    def test_backwards_round_trip(self):
+        t = TimeDelta([0.0, -DAY], format="sec")
+        back, massive = make_rebound().propagate(
+            t, self.states[:, 0], self.epoch, massive_states=massive_states(),
+        )
+        nt.assert_allclose(back[:, 0], self.states[:, 0])
+        self.assertLess(back[1, 1], 0)
+
+        forward, _ = make_rebound().propagate(
+            -t, back[:, 1], self.epoch + t[1], massive_states=massive[:, 1, :],
+        )
+        nt.assert_allclose(forward[:3, 1], self.states[:3, 0], atol=1.0)
+
+    def test_termination_check_per_output(self):
+        checked = []
+
+        class Checked(Rebound):
+            def termination_check(self, t, step_index, massive_states, particle_states):
+                filled = np.all(np.isfinite(particle_states[:, step_index]))
+                checked.append((int(step_index), bool(filled)))
+                return step_index == 5
+
+        reb = Checked(kernel=".", settings=make_rebound(termination_check=True).settings)
+        states, _ = reb.propagate(
+            self.t, self.states, self.epoch, massive_states=massive_states(),
+        )
+        # Birth events share the first epoch but only outputs are checked
+        self.assertEqual(checked, [(ti, True) for ti in range(6)])
+        self.assertTrue(np.all(np.isfinite(states[:, :6])))
+        self.assertTrue(np.all(np.isnan(states[:, 6:])))
+
+
+class TestEncounters(unittest.TestCase):
+    def setUp(self):
+        self.epoch = Time("2025-01-01T00:00:00", format="isot", scale="utc")
+        # Earth flyby with an impact parameter of 2e7 m and a far away particle
+        self.states = np.zeros((6, 2), dtype=np.float64)
+        self.states[:, 0] = [-1e9, 2e7, 0.0, 2e4, 0.0, 0.0]
+        self.states[:, 1] = [1.3 * AU, 0.0, 0.0, 0.0, 2.6e4, 0.0]
+        self.frames = np.array(["GCRS", "HCRS"], dtype=object)
+
+        # Two-body perigee distance of the flyby
+        mu = 6.674e-11 * 5.97219e24
+        r = np.linalg.norm(self.states[:3, 0])
+        v = np.linalg.norm(self.states[3:, 0])
+        h = np.linalg.norm(np.cross(self.states[:3, 0], self.states[3:, 0]))
+        energy = 0.5 * v**2 - mu / r
+        e = np.sqrt(1 + 2 * energy * h**2 / mu**2)
+        self.perigee = -mu / (2 * energy) * (1 - e)
+
+    def propagate(self, t, states, radius):
+        reb = make_rebound(encounter=dict(body="Earth", radius=radius))
+        reb.propagate(
+            TimeDelta(t, format="sec"), states, self.epoch,
+            massive_states=massive_states(), in_frames=self.frames,
+        )
+        return encounter_table(reb.events)
+
+    def test_closest_approach(self):
+        table = self.propagate(np.arange(0, 3 * DAY, 0.25 * DAY), self.states, 1e8)
+        nt.assert_array_equal(table["particle_hash"], [Rebound.TEST_HASH_INIT])
+        nt.assert_array_equal(table["body"], ["Earth"])
+        nt.assert_allclose(table["distance"], self.perigee, rtol=1e-3)
+        nt.assert_allclose(np.linalg.norm(table["state"][:3], axis=0), table["distance"])
+        # Velocity is perpendicular to the position at closest approach
+        radial = np.sum(table["state"][:3] * table["state"][3:], axis=0)
+        self.assertLess(abs(radial[0]) / (table["distance"][0] * 2e4), 1e-6)
+        self.assertAlmostEqual(table["sim_time_sec"][0] / 1e9 * 2e4, 1.0, places=2)
+
+        table = self.propagate(np.arange(0, 3 * DAY, 0.25 * DAY), self.states, 1e7)
+        self.assertEqual(table["distance"].size, 0)
+
+    def test_backwards(self):
+        states = self.states.copy()
+        states[0, 0] = 1e9
+        table = self.propagate(np.arange(-3 * DAY, DAY, 0.25 * DAY), states, 1e8)
+        nt.assert_allclose(table["distance"], self.perigee, rtol=1e-3)
+        self.assertLess(table["sim_time_sec"][0], 0)
+        self.assertGreater(table["state"][3, 0], 0)
+
+    def test_mixed_sign_events(self):
+        # One flyby before and one after the epoch
+        states = np.concatenate([self.states, self.states[:, :1]], axis=1)
+        states[0, 0] = 1e9
+        frames = np.array(["GCRS", "HCRS", "GCRS"], dtype=object)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "events.jsonl"
+            reb = make_rebound(
+                encounter=dict(body="Earth", radius=1e8), event_log_path=str(path),
+            )
+            reb.propagate(
+                TimeDelta(np.arange(-3 * DAY, 3 * DAY, 0.25 * DAY), format="sec"),
+                states, self.epoch, massive_states=massive_states(), in_frames=frames,
+            )
+            logged = read_events_jsonl(path)
+        table = encounter_table(reb.events)
+        self.assertEqual(len(logged), len(reb.events))
+        nt.assert_array_equal(
+            np.sort(table["particle_hash"]), Rebound.TEST_HASH_INIT + np.array([0, 2])
+        )
+        nt.assert_allclose(table["distance"], self.perigee, rtol=1e-3)
+        t = table["sim_time_sec"][np.argsort(table["particle_hash"])]
+        nt.assert_allclose(t, [-1e9 / 2e4, 1e9 / 2e4], rtol=1e-2)
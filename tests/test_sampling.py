@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+import os
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import numpy.testing as nt
+from astropy.time import Time, TimeDelta
+
+from dasst.sampling import EnsembleMCMC, DirectMonteCarlo, ReboundLikelihood, MinimumDistance
+from dasst.sampling import PreEncounterLikelihood, DynamicsCache, LRUCache
+from dasst.distributions import KernelDensityEstimation
+from dasst.propagators import Rebound
+from dasst.constants import AU, DAY
+
+MEAN = np.array([1.0, -2.0])
+COV = np.array([[1.0, 0.6], [0.6, 2.0]])
+
+
+def gaussian_log_likelihood(states):
+    diff = states - MEAN[:, None]
+    return -0.5 * np.sum(diff * np.linalg.solve(COV, diff), axis=0)
+
+
+def positive_prior(states):
+    return np.where(states[0] > 0, 0.0, -np.inf)
+
+
+def positive_log_likelihood(states):
+    if np.any(states[0] <= 0):
+        raise ValueError("Outside of the prior")
+    return gaussian_log_likelihood(states)
+
+
+class LoggedPreEncounterLikelihood(PreEncounterLikelihood):
+    """Appends the process id and cache statistics after every evaluation to `log_path`"""
+
+    def __init__(self, *args, log_path, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.log_path = log_path
+
+    def pre_encounter_states(self, states):
+        helio = super().pre_encounter_states(states)
+        with open(self.log_path, "a") as fh:
+            fh.write(f"{os.getpid()} {self.cache.hits} {self.cache.misses}\n")
+        return helio
+
+
+class TestEnsembleMCMC(unittest.TestCase):
+    def setUp(self):
+        self.initial = np.random.default_rng(0).normal(size=(2, 32)) * 0.1 + 1.0
+
+    def test_gaussian(self):
+        sampler = EnsembleMCMC(gaussian_log_likelihood, seed=1)
+        result = sampler.run(self.initial, 1500)
+        self.assertEqual(result.samples.shape, (2, 1500, 32))
+        self.assertTrue(np.all((result.acceptance > 0.2) & (result.acceptance < 0.9)))
+
+        samples = result.flat(burn=300)
+        nt.assert_allclose(np.mean(samples, axis=1), MEAN, atol=0.1)
+        nt.assert_allclose(np.cov(samples), COV, atol=0.2)
+        nt.assert_allclose(result.log_posterior[-1], gaussian_log_likelihood(result.samples[:, -1]))
+
+    def test_prior(self):
+        sampler = EnsembleMCMC(positive_log_likelihood, log_prior=positive_prior, seed=2)
+        result = sampler.run(self.initial, 100)
+        self.assertTrue(np.all(result.samples[0] > 0))
+
+    def test_process_pool(self):
+        serial = EnsembleMCMC(gaussian_log_likelihood, seed=3).run(self.initial, 20)
+        pooled = EnsembleMCMC(gaussian_log_likelihood, seed=3, workers=2).run(self.initial, 20)
+        nt.assert_array_equal(serial.samples, pooled.samples)
+
+    def test_walkers_checked(self):
+        with self.assertRaises(ValueError):
+            EnsembleMCMC(gaussian_log_likelihood).run(self.initial[:, :3], 10)
+
+
+class TestDirectMonteCarlo(unittest.TestCase):
+    def setUp(self):
+        self.proposal = KernelDensityEstimation(
+            np.zeros((2, 1)), np.eye(2) * 9.0, rng=np.random.default_rng(4),
+        )
+
+    def test_importance_weights(self):
+        sampler = DirectMonteCarlo(
+            gaussian_log_likelihood, self.proposal, log_prior=lambda x: np.zeros(x.shape[1]),
+            batch_size=7000, seed=5,
+        )
+        result = sampler.run(50000)
+        self.assertEqual(result.samples.shape, (2, 50000))
+        nt.assert_allclose(np.sum(result.weights), 1.0)
+        mean = result.samples @ result.weights
+        nt.assert_allclose(mean, MEAN, atol=0.05)
+        self.assertGreater(result.meta["effective_sample_size"], 1000)
+
+    def test_prior_needs_pdf(self):
+        class Proposal:
+            def sample(self, n):
+                return np.zeros((2, n))
+
+        with self.assertRaises(ValueError):
+            DirectMonteCarlo(gaussian_log_likelihood, Proposal(), log_prior=positive_prior)
+
+
+class TestPropagationLikelihood(unittest.TestCase):
+    def setUp(self):
+        settings = dict(
+            massive_objects=["Sun", "Earth"],
+            massive_masses=[1.98855e30, 5.97219e24],
+            time_step=3600.0,
+            tqdm=False,
+        )
+        massive_states = np.zeros((6, 2), dtype=np.float64)
+        massive_states[0, 1] = AU
+        massive_states[4, 1] = 29.78e3
+        self.likelihood = ReboundLikelihood(
+            TimeDelta(np.arange(0, 5 * DAY, DAY), format="sec"),
+            Time("2025-01-01T00:00:00", format="isot", scale="utc"),
+            MinimumDistance("Earth", scale=0.1 * AU),
+            settings=settings,
+            massive_states=massive_states,
+        )
+        self.states = np.zeros((6, 4), dtype=np.float64)
+        self.states[0, :] = [1.1 * AU, 1.2 * AU, 0.9 * AU, 1.3 * AU]
+        self.states[4, :] = [2.8e4, 2.7e4, 3.1e4, 2.6e4]
+
+    def test_minimum_distance(self):
+        values = self.likelihood(self.states)
+        reb = Rebound(kernel=".", settings=self.likelihood.settings)
+        states, massive = reb.propagate(
+            self.likelihood.t, self.states, self.likelihood.epoch,
+            massive_states=self.likelihood.propagate_kwargs["massive_states"],
+        )
+        distance = np.min(np.linalg.norm(states[:3] - massive[:3, :, 1, None], axis=0), axis=0)
+        nt.assert_allclose(values, -0.5 * (distance / (0.1 * AU)) ** 2)
+
+    def test_batches_in_pool(self):
+        sampler = EnsembleMCMC(self.likelihood, workers=2)
+        with sampler.pool() as pool:
+            _, pooled = sampler.evaluate(self.states, pool=pool)
+        nt.assert_allclose(pooled, self.likelihood(self.states), rtol=1e-10)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)
+        cache["c"] = 3
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats(), dict(size=2, hits=1, misses=1))
+
+    def test_threads(self):
+        cache = LRUCache(8)
+
+        def work(seed):
+            rng = np.random.default_rng(seed)
+            for key in rng.integers(0, 16, size=5000):
+                if cache.get(int(key)) is None:
+                    cache[int(key)] = key
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for future in [pool.submit(work, seed) for seed in range(4)]:
+                future.result()
+        self.assertLessEqual(len(cache), 8)
+        self.assertEqual(cache.hits + cache.misses, 20000)
+
+    def test_pickle(self):
+        cache = LRUCache(2)
+        cache["a"] = 1
+        copy = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(copy.get("a"), 1)
+        copy["b"] = 2
+
+
+class TestPreEncounterLikelihood(unittest.TestCase):
+    def setUp(self):
+        self.epoch = Time("2025-01-01T00:00:00", format="isot", scale="utc")
+        settings = dict(
+            massive_objects=["Sun", "Earth"],
+            massive_masses=[1.98855e30, 5.97219e24],
+            tqdm=False,
+        )
+        massive_states = np.zeros((6, 2), dtype=np.float64)
+        massive_states[0, 1] = AU
+        massive_states[4, 1] = 29.78e3
+        self.dynamics = DynamicsCache(".", settings)
+        self.dynamics.add(self.epoch, massive_states)
+
+        self.states = np.zeros((6, 3), dtype=np.float64)
+        self.states[0, :] = AU + 7e6
+        self.states[3, :] = [2e4, 1.5e4, 2e4]
+        self.states[4, :] = 29.78e3 + np.array([5e3, 1e4, 5e3])
+        self.states[:, 2] += 1.0
+
+        self.kwargs = dict(
+            kernel=".", in_frame="HCRS", dt=600.0, max_t=5 * DAY,
+            settings=settings, dynamics=self.dynamics,
+        )
+
+    def test_memoised(self):
+        likelihood = PreEncounterLikelihood(self.epoch, np.zeros(6), **self.kwargs)
+        helio = likelihood.pre_encounter_states(self.states)
+        self.assertEqual(likelihood.cache.stats(), dict(size=3, hits=0, misses=3))
+
+        again = likelihood.pre_encounter_states(self.states[:, ::-1])
+        nt.assert_array_equal(again, helio[:, ::-1])
+        self.assertEqual(likelihood.cache.hits, 3)
+
+        # Pre-encounter states are just outside the exit distance
+        earth_distance = np.linalg.norm(helio[:3] - np.array([AU, 0, 0])[:, None], axis=0)
+        self.assertTrue(np.all(earth_distance > 0.01 * AU))
+
+        coarse = PreEncounterLikelihood(self.epoch, np.zeros(6), resolution=100.0, **self.kwargs)
+        coarse.pre_encounter_states(self.states)
+        self.assertEqual(len(coarse.cache), 2)
+
+    def test_criteria(self):
+        helio = PreEncounterLikelihood(self.epoch, np.zeros(6), **self.kwargs).pre_encounter_states(
+            self.states[:, :1]
+        )
+        for criterion in ["D_SH", "D_V"]:
+            likelihood = PreEncounterLikelihood(
+                self.epoch, helio[:, 0], criterion=criterion, **self.kwargs
+            )
+            values = likelihood(self.states)
+            nt.assert_allclose(values[0], 0.0, atol=1e-12)
+            self.assertTrue(np.all(values[1:] < 0))
+
+    def test_worker_caches(self):
+        # All proposals share one cache cell, so every worker propagates once
+        # and then only hits its cache for the rest of the run
+        reference = PreEncounterLikelihood(self.epoch, np.zeros(6), **self.kwargs)
+        target = reference.pre_encounter_states(self.states[:, 1:2])
+        rng = np.random.default_rng(7)
+        initial = self.states[:, :1] + rng.normal(scale=1.0, size=(6, 12))
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = Path(tmp) / "cache.log"
+            likelihood = LoggedPreEncounterLikelihood(
+                self.epoch, target[:, 0], resolution=1e12, log_path=log_path, **self.kwargs
+            )
+            EnsembleMCMC(likelihood, workers=2, seed=8).run(initial, 4)
+            with open(log_path) as fh:
+                log = np.array([line.split() for line in fh], dtype=np.int64)
+        self.assertEqual(likelihood.cache.stats(), dict(size=0, hits=0, misses=0))
+        self.assertGreater(log.shape[0], 2)
+        for pid in np.unique(log[:, 0]):
+            hits = log[log[:, 0] == pid, 1]
+            self.assertTrue(np.all(np.diff(hits) > 0))
+        self.assertGreater(np.max(log[:, 1]), 0)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import numpy.testing as nt
+from astropy.time import Time, TimeDelta
+import spacecoords.celestial as cel
+
+from dasst.events import (
+    ParticleEvent, write_events_jsonl, iter_encounter_tables, encounter_table,
+)
+from dasst.showers import ShowerAggregator, solar_longitude, zhr_from_flux
+from dasst.coordinates import radiant_angles
+
+
+def make_events(epoch, radiant, speed, num, rng):
+    """Encounter events from one radiant (ecliptic lon, lat) in GCRS coordinates"""
+    times = epoch + TimeDelta(rng.uniform(0, 86400.0, num), format="sec")
+    lon, lat = np.radians(radiant)
+    direction = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    ecl = np.zeros((6, num))
+    ecl[:3] = rng.normal(scale=1e6, size=(3, num))
+    ecl[3:] = -speed * direction[:, None]
+    gcrs = cel.convert(times, ecl, in_frame="GeocentricMeanEcliptic", out_frame="GCRS")
+    return [
+        ParticleEvent(
+            sim_time_sec=0.0, epoch_isot=times[k].isot, event="encounter",
+            reason="close_approach_Earth", particle_hash=1000 + k, other_name="Earth",
+            x=gcrs[0, k], y=gcrs[1, k], z=gcrs[2, k],
+            vx=gcrs[3, k], vy=gcrs[4, k], vz=gcrs[5, k],
+            distance=float(np.linalg.norm(gcrs[:3, k])),
+        )
+        for k in range(num)
+    ]
+
+
+class TestShowers(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.epoch = Time("2025-12-14T00:00:00", format="isot", scale="utc")
+        self.events = make_events(self.epoch, (112.5, 10.5), 34.25e3, 50, rng)
+        self.events.append(ParticleEvent(0.0, self.epoch.isot, "collision", "test", 1))
+
+    def test_radiant_convention(self):
+        nt.assert_allclose(radiant_angles(np.array([[0.0], [-1.0], [0.0]]))[:, 0], [90.0, 0.0])
+
+    def test_aggregation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "events.jsonl"
+            write_events_jsonl(self.events, path)
+            tables = list(iter_encounter_tables(path, chunk_size=20))
+        self.assertEqual([t["state"].shape[1] for t in tables], [20, 20, 10])
+
+        agg = ShowerAggregator(radius=1e7).add_all(tables)
+        self.assertEqual(agg.count, 50)
+        self.assertEqual(np.sum(agg.radiants), 50)
+        peak = np.unravel_index(np.argmax(agg.radiants), agg.radiants.shape)
+        self.assertEqual(peak, (112, 100))
+        self.assertEqual(np.argmax(agg.speeds), 68)
+
+        lam = solar_longitude(self.epoch)
+        self.assertTrue(np.all(np.nonzero(agg.profile)[0] >= int(lam)))
+        self.assertAlmostEqual(lam, 262.3, places=0)
+
+        flux = agg.flux()
+        duration_h = 1.0 / 360.0 * 365.25 * 24
+        nt.assert_allclose(np.sum(flux), 50 / (np.pi * 1e4**2 * duration_h))
+        nt.assert_allclose(agg.zhr(), zhr_from_flux(flux))
+
+        density = agg.radiant_density(smoothing=2.0)
+        lat = np.radians(np.linspace(-90, 90, 181))
+        area = np.outer(np.ones(360), np.degrees(np.diff(np.sin(lat))))
+        nt.assert_allclose(np.sum(density * area), 1.0)
+
+    def test_particle_weights(self):
+        table = encounter_table(self.events)
+        hashes = table["particle_hash"]
+        agg = ShowerAggregator(radius=1e7, particle_weights=(hashes, np.full(hashes.shape, 2.0)))
+        agg.add(table, weights=np.full(hashes.shape, 0.5))
+        self.assertAlmostEqual(agg.total_weight, 50.0)
+        with self.assertRaises(ValueError):
+            agg.add(dict(table, particle_hash=hashes + 1))
+
+        empty = ShowerAggregator(radius=1e7, particle_weights=(np.empty(0), np.empty(0)))
+        with self.assertRaises(ValueError):
+            empty.add(table)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+import numpy.testing as nt
+import pyorb
+
+from dasst.similarity import d_criteria, ca_criteria
+from dasst.similarity import pairwise_threshold, pairwise_nearest
+from dasst.similarity import OrbitIndex, OrbitInvariants
+from dasst.similarity.index import embed_D_SH
+from dasst.similarity import StreamClustering, single_linkage
+from dasst.similarity.clustering import DisjointSet
+from dasst.similarity import minimize_D
+from dasst.similarity.optimization import D_SH_value_and_grad
+from dasst.similarity import D_trajectory, iter_D_trajectory
+
+
+def random_elements(rng, n):
+    """(a, e, i, omega, Omega, anom) in AU and radians"""
+    return np.stack([
+        rng.uniform(0.8, 3.0, n),
+        rng.uniform(0.0, 0.9, n),
+        rng.uniform(0.0, np.pi, n),
+        rng.uniform(0.0, 2 * np.pi, n),
+        rng.uniform(0.0, 2 * np.pi, n),
+        rng.uniform(0.0, 2 * np.pi, n),
+    ])
+
+
+def make_orbits(kepler):
+    orb = pyorb.Orbit(
+        M0=pyorb.M_sol,
+        G=pyorb.get_G(length="AU", mass="kg", time="s"),
+        direct_update=True,
+        auto_update=True,
+        degrees=False,
+        num=kepler.shape[1],
+    )
+    orb.kepler = kepler
+    return orb
+
+
+def dense_D_SH(ka, kb):
+    return d_criteria.D_SH_elements(*ka[:5, :, None], *kb[:5, None, :])
+
+
+class TestDSH(unittest.TestCase):
+    def test_hand_computed(self):
+        # i_a = i_b = 60 deg and Omega_b - Omega_a = 60 deg give
+        # (2 sin(I_ab / 2))^2 = sin(60)^2 (2 sin(30))^2 = 3 / 4 and
+        # sin(pi_ab / 2) = cos(60) sin(30) / cos(I_ab / 2) = (1 / 4) / sqrt(13 / 16)
+        D = d_criteria.D_SH_elements(
+            1.0, 0.5, np.radians(60), 0.0, 0.0,
+            2.0, 0.6, np.radians(60), 0.0, np.radians(60),
+        )
+        expected = 0.1**2 + 0.3**2 + 3 / 4 + 1.1**2 / 13
+        self.assertAlmostEqual(D, expected, places=12)
+
+    def test_finite_and_symmetric(self):
+        rng = np.random.default_rng(1)
+        ka = random_elements(rng, 300)
+        kb = random_elements(rng, 300)
+        D = dense_D_SH(ka, kb)
+        self.assertTrue(np.isfinite(D).all())
+        nt.assert_allclose(D, dense_D_SH(kb, ka).T)
+        nt.assert_allclose(np.diagonal(dense_D_SH(ka, ka)), 0, atol=1e-12)
+
+
+class TestPairwise(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(12)
+        self.ka = random_elements(rng, 37)
+        self.kb = random_elements(rng, 53)
+        self.D = dense_D_SH(self.ka, self.kb)
+        self.assertTrue(np.isfinite(self.D).all())
+
+    def test_elementwise_consistency(self):
+        orb_a = make_orbits(self.ka[:, :10])
+        orb_b = make_orbits(self.kb[:, :10])
+        nt.assert_allclose(d_criteria.D_SH(orb_a, orb_b), np.diagonal(self.D[:10, :10]))
+
+    def test_threshold(self):
+        cutoff = np.quantile(self.D, 0.05)
+        ia, ib, vals = pairwise_threshold(self.ka, self.kb, cutoff, tile_size=8, workers=3)
+        nt.assert_array_equal(np.stack([ia, ib], axis=1), np.argwhere(self.D < cutoff))
+        nt.assert_allclose(vals, self.D[ia, ib])
+
+    def test_nearest(self):
+        ind, vals = pairwise_nearest(self.ka, self.kb, k=4, tile_size=10, workers=2)
+        expected = np.sort(self.D, axis=1)[:, :4]
+        nt.assert_allclose(vals, expected)
+        nt.assert_allclose(np.take_along_axis(self.D, ind, axis=1), expected)
+
+    def test_processes(self):
+        cutoff = np.quantile(self.D, 0.05)
+        ia, ib, vals = pairwise_threshold(
+            self.ka, self.kb, cutoff, tile_size=16, workers=2, processes=True,
+        )
+        nt.assert_array_equal(np.stack([ia, ib], axis=1), np.argwhere(self.D < cutoff))
+        ind, vals = pairwise_nearest(
+            self.ka, self.kb, k=3, tile_size=16, workers=2, processes=True,
+        )
+        nt.assert_allclose(vals, np.sort(self.D, axis=1)[:, :3])
+
+    def test_D_V(self):
+        orb_a = make_orbits(self.ka[:, :5])
+        orb_b = make_orbits(self.kb[:, :6])
+        ind, vals = pairwise_nearest(orb_a, orb_b, k=6, criterion="D_V")
+        for i in range(5):
+            single = make_orbits(np.repeat(self.ka[:, i:i + 1], 6, axis=1))
+            D = d_criteria.D_V(single, orb_b)
+            nt.assert_allclose(vals[i], np.sort(D))
+
+
+class TestOrbitIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.catalogue = random_elements(rng, 400)
+        self.query = random_elements(rng, 30)
+        self.D = dense_D_SH(self.query, self.catalogue)
+        self.assertTrue(np.isfinite(self.D).all())
+
+    def test_D_SH_lower_bound(self):
+        ea = embed_D_SH(self.query)
+        eb = embed_D_SH(self.catalogue)
+        bound = np.sum((ea[:, None, :] - eb[None, :, :]) ** 2, axis=2)
+        self.assertTrue(np.all(bound <= self.D + 1e-12))
+
+    def test_query_radius(self):
+        index = OrbitIndex(self.catalogue)
+        cutoff = np.quantile(self.D, 0.02)
+        iq, ic, vals = index.query_radius(self.query, cutoff)
+        nt.assert_array_equal(np.stack([iq, ic], axis=1), np.argwhere(self.D < cutoff))
+        nt.assert_allclose(vals, self.D[iq, ic])
+
+    def test_query_nearest(self):
+        index = OrbitIndex(self.catalogue)
+        ind, vals = index.query_nearest(self.query, k=5)
+        nt.assert_allclose(vals, np.sort(self.D, axis=1)[:, :5])
+        nt.assert_allclose(np.take_along_axis(self.D, ind, axis=1), vals)
+
+    def test_query_nearest_without_bound(self):
+        # An undefined argument of perihelion leaves the embedding finite but
+        # gives no upper bound, the query falls back to the tiled kernel
+        query = self.query[:5, :5].copy()
+        query[3, 2] = np.nan
+        index = OrbitIndex(self.catalogue)
+        ind, vals = index.query_nearest(query, k=5)
+        ref_ind, ref_vals = pairwise_nearest(query, self.catalogue, k=5)
+        nt.assert_array_equal(ind[[0, 1, 3, 4]], ref_ind[[0, 1, 3, 4]])
+        nt.assert_allclose(vals, ref_vals)
+        self.assertTrue(np.isnan(vals[2]).all())
+
+    def test_D_V_and_persistence(self):
+        orb_c = make_orbits(self.catalogue)
+        orb_q = make_orbits(self.query)
+        index = OrbitIndex(orb_c, criterion="D_V")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "catalogue.index"
+            index.save(path)
+            index = OrbitIndex.load(path)
+        ind, vals = index.query_nearest(orb_q, k=3)
+        ref_ind, ref_vals = pairwise_nearest(orb_q, orb_c, k=3, criterion="D_V")
+        nt.assert_allclose(vals, ref_vals)
+
+        cutoff = np.median(ref_vals[:, 0])
+        iq, ic, dv = index.query_radius(orb_q, cutoff)
+        ref = pairwise_threshold(orb_q, orb_c, cutoff, criterion="D_V")
+        nt.assert_array_equal(iq, ref[0])
+        nt.assert_allclose(dv, ref[2])
+
+
+def same_partition(labels_a, labels_b):
+    _, inv_a = np.unique(labels_a, return_inverse=True)
+    _, inv_b = np.unique(labels_b, return_inverse=True)
+    pairs = np.unique(np.stack([inv_a, inv_b]), axis=1)
+    return pairs.shape[1] == np.unique(inv_a).size == np.unique(inv_b).size
+
+
+class TestClustering(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(9)
+        centers = random_elements(rng, 4)
+        streams = [
+            centers[:, [c]] + rng.normal(scale=0.01, size=(6, 40)) for c in range(4)
+        ]
+        self.orbits = np.concatenate(streams + [random_elements(rng, 100)], axis=1)
+        self.orbits = self.orbits[:, rng.permutation(self.orbits.shape[1])]
+        self.cutoff = 0.01
+
+    def reference_labels(self):
+        from scipy.sparse.csgraph import connected_components
+        D = dense_D_SH(self.orbits, self.orbits)
+        _, labels = connected_components(D < self.cutoff, directed=False)
+        return labels
+
+    def test_disjoint_set(self):
+        sets = DisjointSet(6)
+        sets.union(np.array([0, 3]), np.array([1, 4]))
+        sets.union(np.array([1]), np.array([4]))
+        nt.assert_array_equal(sets.find(), [0, 0, 2, 0, 0, 5])
+
+    def test_single_linkage(self):
+        labels = single_linkage(self.orbits, self.cutoff)
+        self.assertTrue(same_partition(labels, self.reference_labels()))
+
+    def test_incremental(self):
+        clustering = StreamClustering(self.cutoff)
+        for start in range(0, self.orbits.shape[1], 45):
+            clustering.add(self.orbits[:, start:start + 45])
+        self.assertTrue(same_partition(clustering.labels, self.reference_labels()))
+        clusters = clustering.clusters(min_size=20)
+        self.assertEqual(len(clusters), 4)
+
+        clustering.compact()
+        self.assertEqual(len(clustering.segments), 1)
+        clustering.add(self.orbits[:, :3])
+        labels = clustering.labels
+        nt.assert_array_equal(labels[-3:], labels[:3])
+
+
+class TestOrbitInvariants(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.orb_a = make_orbits(random_elements(rng, 20))
+        self.orb_b = make_orbits(random_elements(rng, 20))
+
+    def test_physical_invariants(self):
+        inv = OrbitInvariants.from_orbit(self.orb_a).invariants
+        mu = self.orb_a.G * (self.orb_a.M0 + self.orb_a.m)
+        nt.assert_allclose(np.linalg.norm(inv[3:6], axis=0), self.orb_a.e, rtol=1e-8)
+        nt.assert_allclose(inv[6], -mu / (2 * self.orb_a.a), rtol=1e-8)
+
+    def test_D_V_accepts_invariants(self):
+        ref = d_criteria.D_V(self.orb_a, self.orb_b)
+        inv_b = OrbitInvariants.from_orbit(self.orb_b)
+        nt.assert_allclose(d_criteria.D_V(self.orb_a, inv_b), ref)
+        inv32 = OrbitInvariants.from_orbit(self.orb_b, dtype=np.float32)
+        self.assertEqual(inv32.invariants.dtype, np.float32)
+        nt.assert_allclose(d_criteria.D_V(self.orb_a, inv32), ref, rtol=1e-4)
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "inv.npy"
+            first = OrbitInvariants.cached(path, self.orb_b)
+            second = OrbitInvariants.cached(path, self.orb_b)
+            self.assertIsInstance(second.invariants, np.memmap)
+            nt.assert_array_equal(first.invariants, second.invariants)
+            nt.assert_array_equal(second[3].invariants, first.invariants[:, 3:4])
+            del second
+
+
+class TestMinimizeD(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.fixed = random_elements(rng, 30)[:5]
+        self.x0 = np.array([2.0, 0.5, 1.0, 3.0, 3.0])
+        self.width = np.array([0.3, 0.1, 0.2, 0.5, 0.5])
+
+    def test_gradient(self):
+        rng = np.random.default_rng(4)
+        fixed = random_elements(rng, 1000)[:5]
+        free = random_elements(rng, 1000)[:5]
+        D, grad = D_SH_value_and_grad(fixed, free)
+        ref = d_criteria.D_SH_elements(*fixed, *free)
+        self.assertTrue(np.isfinite(D).all())
+        nt.assert_allclose(D, ref)
+
+        h = 1e-6
+        for k in range(5):
+            step = np.zeros((5, 1))
+            step[k] = h
+            num = (
+                D_SH_value_and_grad(fixed, free + step)[0]
+                - D_SH_value_and_grad(fixed, free - step)[0]
+            ) / (2 * h)
+            nt.assert_allclose(grad[k], num, rtol=1e-5, atol=1e-7)
+
+    def test_minimum(self):
+        from scipy.optimize import minimize
+
+        lower, upper = self.x0 - self.width, self.x0 + self.width
+        x, D = minimize_D(self.fixed, self.x0, lower, upper, n_starts=16, seed=1)
+        self.assertEqual(x.shape, (5, 30))
+        self.assertTrue(np.all((x >= lower[:, None]) & (x <= upper[:, None])))
+        nt.assert_allclose(D_SH_value_and_grad(self.fixed, x)[0], D)
+
+        for k in range(30):
+            def fun(y):
+                D, grad = D_SH_value_and_grad(self.fixed[:, k:k + 1], y.reshape(5, 1))
+                return D[0], grad[:, 0]
+            ref = minimize(fun, self.x0, jac=True, bounds=list(zip(lower, upper)))
+            self.assertLessEqual(D[k], ref.fun + 1e-6)
+
+
+class TestTrajectories(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        self.num_t = 7
+        self.orbits_a = [make_orbits(random_elements(rng, 5)) for _ in range(self.num_t)]
+        self.orbits_b = [make_orbits(random_elements(rng, 4)) for _ in range(self.num_t)]
+        self.states_a = np.stack([orb.cartesian for orb in self.orbits_a], axis=1) * pyorb.AU
+        self.states_b = np.stack([orb.cartesian for orb in self.orbits_b], axis=1) * pyorb.AU
+        self.pairs = (np.array([0, 0, 3, 4, 4]), np.array([1, 2, 2, 0, 1]))
+
+    def test_D_SH(self):
+        D = D_trajectory(self.states_a, self.states_b, pairs=self.pairs, epoch_block=3)
+        self.assertEqual(D.shape, (self.num_t, 5))
+        for t in range(self.num_t):
+            ka = self.orbits_a[t].kepler[:, self.pairs[0]]
+            kb = self.orbits_b[t].kepler[:, self.pairs[1]]
+            ref = d_criteria.D_SH_elements(*ka[:5], *kb[:5])
+            self.assertTrue(np.isfinite(D[t]).all())
+            nt.assert_allclose(D[t], ref, rtol=1e-6, atol=1e-10)
+
+    def test_D_V_streaming(self):
+        blocks = list(iter_D_trajectory(
+            self.states_a[:, :, :4], self.states_b, criterion="D_V", epoch_block=2,
+        ))
+        self.assertEqual(
+            [(start, end) for start, end, _ in blocks], [(0, 2), (2, 4), (4, 6), (6, 7)]
+        )
+        D = np.concatenate([block for _, _, block in blocks], axis=0)
+        for t in range(self.num_t):
+            ref = d_criteria.D_V(self.orbits_a[t][:4], self.orbits_b[t])
+            nt.assert_allclose(D[t], ref, rtol=1e-6)
+
+
+class TestCaCriteria(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(8)
+        n = 1000
+        self.elements = np.stack([
+            rng.uniform(0.5, 8.0, n), rng.uniform(0.0, 0.99, n), rng.uniform(0.0, 180.0, n),
+        ])
+
+    def test_classify(self):
+        a, e, i = self.elements
+        mask = ca_criteria.classify(a, e, i, block_size=100)
+        self.assertEqual(mask.dtype, np.uint8)
+        reference = dict(
+            K_i=ca_criteria.K_i(a, e, i),
+            P_i=ca_criteria.P_i(a, e, i),
+            Q_i=ca_criteria.Q_i(a, e, i),
+            E_i=ca_criteria.E_i(a, i),
+            T_jupiter_i=ca_criteria.T_jupiter_i(a, e, i),
+        )
+        for name, bit in ca_criteria.CRITERIA_BITS.items():
+            nt.assert_array_equal((mask & bit) > 0, reference[name])
+
+    def test_catalogue(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "catalogue.npy"
+            np.save(path, self.elements)
+            mask = ca_criteria.classify_catalogue(path, chunk_size=300)
+        nt.assert_array_equal(mask, ca_criteria.classify(*self.elements))
+
+    def test_non_contiguous_out(self):
+        buffer = np.zeros((2, self.elements.shape[1]), dtype=np.uint8)
+        out = buffer[:, ::2].T
+        a, e, i = (x.reshape(-1, 2) for x in self.elements)
+        ret = ca_criteria.classify(a, e, i, out=out, block_size=64)
+        self.assertIs(ret, out)
+        nt.assert_array_equal(out, ca_criteria.classify(a, e, i))
+
+        strided = np.zeros((2 * self.elements.shape[1],), dtype=np.uint8)
+        ca_criteria.classify_catalogue(self.elements, out=strided[::2], chunk_size=300)
+        nt.assert_array_equal(strided[::2], ca_criteria.classify(*self.elements))
+        self.assertFalse(np.any(strided[1::2]))
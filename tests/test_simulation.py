@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 import tempfile
+import unittest
 import numpy as np
+import numpy.testing as nt
 import matplotlib.pyplot as plt
 from pathlib import Path
 
-from dasst.simulation import Simulation
+from dasst.simulation import Simulation, SimConfig
 from dasst.populations import PopulationConfig
 from dasst.constants import AU, YEAR
 
@@ -14,6 +16,39 @@ SIM_CONFIG = CONFIG_PATH / "sim_config.toml"
 BODIES_CONFIG = CONFIG_PATH / "bodies_config.toml"
 POP_COMET = CONFIG_PATH / "pop_comet.toml"
 
+
+class TestTimeline(unittest.TestCase):
+    def setUp(self):
+        self.config = SimConfig(
+            simulation_epoch="2025-01-01T00:00:00",
+            simulation_time=10 * 86400.0,
+            time_step=86400.0,
+            tqdm=False,
+            kernel_path=".",
+        )
+
+    def test_uniform(self):
+        t = self.config.make_timeline()
+        nt.assert_allclose(t.sec, np.arange(11) * 86400.0)
+
+    def test_segments(self):
+        self.config.timeline = [
+            dict(dt=5 * 86400.0),
+            dict(start=86400.0, end=2 * 86400.0, dt=21600.0),
+            dict(times=[123.0]),
+            dict(epochs=["2025-01-03T12:00:00"]),
+        ]
+        t = self.config.make_timeline().sec
+        expected = [0.0, 123.0, 1.0, 1.25, 1.5, 1.75, 2.0, 2.5, 5.0, 10.0]
+        expected = [x if x == 123.0 else x * 86400.0 for x in expected]
+        nt.assert_allclose(t, expected)
+
+    def test_bad_segment(self):
+        self.config.timeline = [dict(start=0.0)]
+        with self.assertRaises(ValueError):
+            self.config.make_timeline()
+
+
 def plot_full_system(result: dict, sim: Simulation):
     """
     Plot Sun + all massive bodies + comet population, with reference circles.